@@ -0,0 +1,29 @@
+import os
+from fastapi import Depends, Header, HTTPException
+from jose import JWTError
+from auth.jwt import decode_token
+
+# Comma-separated emails allowed to use the admin endpoints
+# (/moderation/*, and room settings for rooms they didn't create)
+ADMIN_EMAILS = {email.strip() for email in os.getenv("ADMIN_EMAILS", "").split(",") if email.strip()}
+
+
+def is_admin(user: dict):
+    return user["sub"] in ADMIN_EMAILS
+
+
+async def current_user(authorization: str = Header(None)):
+    # JWT payload from "Authorization: Bearer <token>"
+    if not authorization or not authorization.startswith("Bearer "):
+        raise HTTPException(status_code=401, detail="Not authenticated", headers={"WWW-Authenticate": "Bearer"})
+
+    try:
+        return decode_token(authorization[len("Bearer "):])
+    except JWTError:
+        raise HTTPException(status_code=401, detail="Invalid token", headers={"WWW-Authenticate": "Bearer"})
+
+
+async def require_admin(user: dict = Depends(current_user)):
+    if not is_admin(user):
+        raise HTTPException(status_code=403, detail="Admin only")
+    return user
@@ -1,3 +1,7 @@
+import hashlib
+import os
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from jose import jwt
 
@@ -5,6 +9,14 @@ SECRET_KEY = "secret-key-1"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES= 60
 
+# Recently verified tokens; a reconnect storm presents the same few tokens
+# over and over, and each would otherwise be re-verified. 0 disables it.
+JWT_CACHE_SIZE = int(os.getenv("JWT_CACHE_SIZE", "10000"))
+
+# sha256(token) -> (exp, payload), least recently used first
+verified = OrderedDict()
+cache_stats = {"hits": 0, "misses": 0, "expired": 0}
+
 def create_access_token(data: dict):
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -12,4 +24,28 @@ def create_access_token(data: dict):
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 def decode_token(token: str):
-    return jwt.decode(token, SECRET_KEY, algorithms= [ALGORITHM])
\ No newline at end of file
+    if not JWT_CACHE_SIZE:
+        return jwt.decode(token, SECRET_KEY, algorithms= [ALGORITHM])
+
+    key = hashlib.sha256(token.encode()).digest()
+    entry = verified.get(key)
+
+    if entry is not None:
+        exp, payload = entry
+        if exp is None or exp > time.time():
+            verified.move_to_end(key)
+            cache_stats["hits"] += 1
+            return payload
+        # expired since it was cached: let jwt.decode raise as usual
+        del verified[key]
+        cache_stats["expired"] += 1
+
+    cache_stats["misses"] += 1
+    # invalid / expired tokens raise here and are never cached
+    payload = jwt.decode(token, SECRET_KEY, algorithms= [ALGORITHM])
+
+    verified[key] = (payload.get("exp"), payload)
+    if len(verified) > JWT_CACHE_SIZE:
+        verified.popitem(last=False)
+
+    return payload
@@ -0,0 +1,73 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from passlib.context import CryptContext
+
+from cpu import available_cores
+from metrics import observe
+
+# argon2 is tens of ms of CPU per call by design. argon2-cffi releases the
+# GIL while hashing, so a thread pool keeps the event loop (and every
+# Socket.IO connection on it) responsive during login bursts.
+AUTH_HASH_WORKERS = int(os.getenv("AUTH_HASH_WORKERS", str(available_cores())))
+# Requests waiting for a worker beyond this are refused (503) instead of
+# queueing for seconds
+AUTH_HASH_MAX_QUEUE = int(os.getenv("AUTH_HASH_MAX_QUEUE", "256"))
+
+pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
+
+
+class HasherBusy(Exception):
+    pass
+
+
+class PasswordHasher:
+    """
+    pwd_context.hash / verify on a bounded thread pool. At most `workers`
+    hashes run at once; callers beyond that wait in a queue of at most
+    `max_queue`, and HasherBusy is raised once it is full.
+    """
+
+    def __init__(self, context=pwd_context, workers=AUTH_HASH_WORKERS, max_queue=AUTH_HASH_MAX_QUEUE):
+        self.context = context
+        self.workers = max(1, workers)
+        self.max_queue = max_queue
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="argon2")
+        self.slots = None   # created lazily, inside the running loop
+        self.stats = {"in_flight": 0, "queued": 0, "hashed": 0, "verified": 0, "rejected": 0}
+
+    async def _run(self, fn, *args):
+        if self.slots is None:
+            self.slots = asyncio.Semaphore(self.workers)
+
+        if self.slots.locked() and self.stats["queued"] >= self.max_queue:
+            self.stats["rejected"] += 1
+            raise HasherBusy()
+
+        started = time.perf_counter()
+        self.stats["queued"] += 1
+        try:
+            await self.slots.acquire()
+        finally:
+            self.stats["queued"] -= 1
+
+        self.stats["in_flight"] += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+        finally:
+            self.stats["in_flight"] -= 1
+            self.slots.release()
+            observe("password_hash", started)
+
+    async def hash(self, password):
+        self.stats["hashed"] += 1
+        return await self._run(self.context.hash, password)
+
+    async def verify(self, password, password_hash):
+        self.stats["verified"] += 1
+        return await self._run(self.context.verify, password, password_hash)
+
+
+password_hasher = PasswordHasher()
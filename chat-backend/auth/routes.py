@@ -1,14 +1,13 @@
 from fastapi import APIRouter, HTTPException, Depends
-from passlib.context import CryptContext
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 
 from db import get_db
 from models.user import User
 from .jwt import create_access_token
+from .passwords import password_hasher, HasherBusy
 
 router = APIRouter()
-pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
 
 # TEMP fake user db
 # users = {}
@@ -26,8 +25,15 @@ async def register(data: dict, db: AsyncSession = Depends(get_db)):
     if existing_user:
         raise HTTPException(status_code=400, detail="User already exists")
 
-    #Hash Password
-    hashed_password = pwd_context.hash(password)
+    # hand the DB connection back while waiting for a hasher thread; the
+    # commit below checks a new one out
+    await db.close()
+
+    #Hash Password (off the event loop)
+    try:
+        hashed_password = await password_hasher.hash(password)
+    except HasherBusy:
+        raise HTTPException(status_code=503, detail="Too many sign-ups, try again shortly")
 
     # Create user object
     new_user = User(
@@ -52,7 +58,19 @@ async def login(data: dict, db: AsyncSession = Depends(get_db)):
     result = await db.execute(select(User).where(User.email == email))
     user = result.scalar_one_or_none()
 
-    if not user or not pwd_context.verify(password, user.password_hash):
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+
+    # don't hold a pooled DB connection through the (queued) argon2 verify
+    await db.close()
+
+    # argon2 verify runs on the hasher's thread pool, not the event loop
+    try:
+        valid = await password_hasher.verify(password, user.password_hash)
+    except HasherBusy:
+        raise HTTPException(status_code=503, detail="Too many logins, try again shortly")
+
+    if not valid:
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
     # Create JWT
@@ -0,0 +1,122 @@
+"""
+History page latency on a large room: OFFSET vs keyset on (chat_id, created_at, id).
+
+usage (from chat-backend/):
+    python benchmarks/bench_history.py [--rows N] [--page-size P]
+
+Uses DATABASE_URL, or a throwaway SQLite file if unset
+(needs `pip install aiosqlite`). Seeds N messages into chat 1 once.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///bench_history.db")
+
+from sqlalchemy import func, insert, tuple_
+from sqlalchemy.future import select
+
+from db import engine, SessionLocal
+from migrations import upgrade
+from models.user import User
+from models.message import Message
+
+engine.echo = False
+
+CHAT_ID = 1
+
+
+async def seed(rows):
+    async with SessionLocal() as db:
+        # every message is by user 1, which Postgres' foreign key wants to exist
+        if await db.get(User, 1) is None:
+            db.add(User(id=1, email="bench@example.com", password_hash="-"))
+            await db.commit()
+
+        existing = (await db.execute(select(func.count()).select_from(Message))).scalar()
+    if existing >= rows:
+        return
+
+    print(f"Seeding {rows - existing} rows...")
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    batch = 5000
+
+    for offset in range(existing, rows, batch):
+        values = [
+            {
+                "chat_id": CHAT_ID if i % 10 else CHAT_ID + 1,   # some noise from another chat
+                "user_id": 1,
+                "content": f"message {i}",
+                "toxicity": 0.01,
+                "status": "approved",
+                "created_at": start + timedelta(milliseconds=i)
+            }
+            for i in range(offset, min(offset + batch, rows))
+        ]
+        async with SessionLocal() as db:
+            await db.execute(insert(Message), values)
+            await db.commit()
+
+
+def base_query():
+    return (
+        select(Message)
+        .where(Message.chat_id == CHAT_ID)
+        .order_by(Message.created_at.desc(), Message.id.desc())
+    )
+
+
+async def timed(label, query, repeat=5):
+    best = None
+    async with SessionLocal() as db:
+        for _ in range(repeat):
+            started = time.perf_counter()
+            rows = (await db.execute(query)).scalars().all()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+
+    print(f"{label:>32}: {best * 1000:8.2f} ms  ({len(rows)} rows)")
+    return rows
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--page-size", type=int, default=50)
+    args = parser.parse_args()
+
+    async with engine.begin() as conn:
+        await conn.run_sync(upgrade)
+
+    await seed(args.rows)
+
+    page = args.page_size
+    await timed("first page", base_query().limit(page))
+
+    for depth in (100, 1000, 10000):
+        offset = depth * page
+        rows = await timed(f"page {depth} via OFFSET", base_query().offset(offset).limit(page))
+
+        # cursor = last row of the previous page
+        async with SessionLocal() as db:
+            prev = (await db.execute(base_query().offset(offset - 1).limit(1))).scalars().first()
+        if prev is None:
+            break
+
+        keyset = base_query().where(
+            tuple_(Message.created_at, Message.id) < tuple_(prev.created_at, prev.id)
+        ).limit(page)
+        keyset_rows = await timed(f"page {depth} via keyset", keyset)
+
+        # both plans have to be timing the same page
+        assert [m.id for m in keyset_rows] == [m.id for m in rows], f"keyset page {depth} differs from OFFSET"
+
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,153 @@
+"""
+Event-loop lag during a login burst, and token verification during a
+reconnect storm.
+
+1. N concurrent POST /auth/login (argon2 verify each) against the auth
+   router, in-process, while a ticker task measures how late the event
+   loop wakes it up. "inline" verifies on the loop, as auth/routes.py did
+   before auth/passwords.py; "executor" uses the bounded thread pool.
+2. decode_token() for a storm of reconnects that share few tokens, with
+   and without the verified-token cache.
+
+usage (from chat-backend/):
+    python benchmarks/bench_login.py [--logins 500] [--reconnects 20000]
+
+Uses a throwaway SQLite file (needs `pip install aiosqlite`). Appends the
+numbers to results/login.jsonl.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+os.environ.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{tempfile.mkdtemp()}/bench_login.db")
+
+import httpx
+from fastapi import FastAPI
+from sqlalchemy import insert
+
+import auth.jwt as auth_jwt
+from auth.jwt import create_access_token, decode_token
+from auth.passwords import password_hasher, pwd_context
+from auth.routes import router
+from db import engine, SessionLocal
+from migrations import upgrade
+from models.user import User
+from results import record
+
+PASSWORD = "correct horse battery staple"
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q / 100 * len(values)))]
+
+
+async def seed(users):
+    async with engine.begin() as conn:
+        await conn.run_sync(upgrade)
+
+    # one hash for everyone: seeding shouldn't take longer than the benchmark
+    password_hash = pwd_context.hash(PASSWORD)
+    async with SessionLocal() as db:
+        await db.execute(insert(User), [
+            {"email": f"login{i}@example.com", "password_hash": password_hash} for i in range(users)
+        ])
+        await db.commit()
+
+
+async def ticker(lags, stop, interval=0.005):
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        lags.append(max(0.0, loop.time() - expected))
+
+
+async def login_burst(client, logins, offset):
+    lags, stop = [], asyncio.Event()
+    monitor = asyncio.create_task(ticker(lags, stop))
+    await asyncio.sleep(0.05)
+
+    started = time.perf_counter()
+    responses = await asyncio.gather(*[
+        client.post("/auth/login", json={"email": f"login{offset + i}@example.com", "password": PASSWORD})
+        for i in range(logins)
+    ], return_exceptions=True)
+    seconds = time.perf_counter() - started
+
+    stop.set()
+    await monitor
+
+    # with verify on the loop, requests queued for a DB connection time
+    # out (failed); the executor refuses what exceeds its queue (rejected)
+    status = [getattr(r, "status_code", None) for r in responses]
+    ok = status.count(200)
+    return {
+        "logins_per_sec": round(ok / seconds, 1),
+        "loop_lag_p50_ms": round(percentile(lags, 50) * 1000, 2),
+        "loop_lag_p99_ms": round(percentile(lags, 99) * 1000, 2),
+        "loop_lag_max_ms": round(max(lags) * 1000, 2),
+        "rejected": status.count(503),
+        "failed": len(responses) - ok - status.count(503),
+    }
+
+
+def reconnect_storm(reconnects, tokens):
+    pool = [create_access_token({"sub": f"user{i}@example.com", "user_id": i}) for i in range(tokens)]
+
+    results = {}
+    for name, size in (("uncached", 0), ("cached", 10000)):
+        auth_jwt.JWT_CACHE_SIZE = size
+        auth_jwt.verified.clear()
+        started = time.perf_counter()
+        for i in range(reconnects):
+            decode_token(pool[i % tokens])
+        results[f"decode_{name}_us"] = round((time.perf_counter() - started) / reconnects * 1e6, 2)
+    return results
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=500)
+    parser.add_argument("--reconnects", type=int, default=20000)
+    parser.add_argument("--tokens", type=int, default=500, help="distinct tokens in the storm")
+    args = parser.parse_args()
+
+    await seed(2 * args.logins)
+
+    app = FastAPI()
+    app.include_router(router, prefix="/auth")
+    transport = httpx.ASGITransport(app=app)
+
+    metrics = {}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=600) as client:
+        executor_verify = password_hasher.verify
+
+        async def inline_verify(password, password_hash):
+            return pwd_context.verify(password, password_hash)
+
+        for offset, (mode, verify) in enumerate((("inline", inline_verify), ("executor", executor_verify))):
+            password_hasher.verify = verify
+            result = await login_burst(client, args.logins, offset * args.logins)
+            print(f"{mode:<9} {args.logins} logins: {result['logins_per_sec']:7.1f}/s  loop lag"
+                  f" p50 {result['loop_lag_p50_ms']:7.2f} ms  p99 {result['loop_lag_p99_ms']:8.2f} ms"
+                  f"  max {result['loop_lag_max_ms']:8.2f} ms  rejected {result['rejected']}  failed {result['failed']}")
+            metrics.update({f"{mode}_{key}": value for key, value in result.items()})
+
+    storm = reconnect_storm(args.reconnects, args.tokens)
+    print(f"\ndecode_token, {args.reconnects} reconnects over {args.tokens} tokens: "
+          f"uncached {storm['decode_uncached_us']} us, cached {storm['decode_cached_us']} us per call")
+    metrics.update(storm)
+
+    await engine.dispose()
+    record("login", {"logins": args.logins, "workers": password_hasher.workers}, metrics)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,88 @@
+"""
+Messages/sec: one session + commit per message vs the write-behind writer.
+
+usage (from chat-backend/):
+    python benchmarks/bench_message_writes.py [--messages N] [--concurrency C]
+
+Uses DATABASE_URL, or a throwaway SQLite file if unset
+(needs `pip install aiosqlite`). The journal is off so Redis isn't needed.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///bench_messages.db")
+
+from db import engine, Base, SessionLocal
+from models.user import User
+from models.message import Message
+from chat.message_writer import MessageWriter
+
+engine.echo = False
+
+
+def make_row(i):
+    return {"chat_id": 1, "user_id": 1, "content": f"message {i}", "toxicity": 0.01, "status": "approved"}
+
+
+async def per_message(n, concurrency):
+    # the old chat_message path
+    async def save(i):
+        async with SessionLocal() as db:
+            db.add(Message(**make_row(i)))
+            await db.commit()
+
+    await run_concurrent(save, n, concurrency)
+
+
+async def write_behind(n, concurrency):
+    writer = MessageWriter(journal=False)
+    await writer.start()
+    await run_concurrent(lambda i: writer.enqueue(make_row(i)), n, concurrency)
+    await writer.stop()
+
+
+async def run_concurrent(fn, n, concurrency):
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with sem:
+            await fn(i)
+
+    await asyncio.gather(*(one(i) for i in range(n)))
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+
+    # SQLite allows one writer at a time
+    if engine.dialect.name == "sqlite" and args.concurrency > 1:
+        print("SQLite: running with --concurrency 1")
+        args.concurrency = 1
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    # every message is by user 1, which Postgres' foreign key wants to exist
+    async with SessionLocal() as db:
+        if await db.get(User, 1) is None:
+            db.add(User(id=1, email="bench@example.com", password_hash="-"))
+            await db.commit()
+
+    for name, fn in [("per-message commit", per_message), ("write-behind", write_behind)]:
+        started = time.perf_counter()
+        await fn(args.messages, args.concurrency)
+        elapsed = time.perf_counter() - started
+        print(f"{name:>20}: {args.messages / elapsed:10.0f} msg/s  ({elapsed:.2f}s)")
+
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
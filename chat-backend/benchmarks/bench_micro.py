@@ -0,0 +1,97 @@
+"""
+Micro-benchmarks for the per-message hot spots: ml-service clean_text and
+vectorize + predict (single and batched), and the chat-backend
+auto_moderate, normalize_text and pre-filter check.
+
+usage (from chat-backend/):
+    python benchmarks/bench_micro.py [--messages 2000]
+
+Appends the numbers to results/micro.jsonl and compares with the last run.
+"""
+import argparse
+import os
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+ML_DIR = os.path.join(os.path.dirname(BACKEND_DIR), "ml-service")
+
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from loadtest import load_texts
+from results import record
+from moderation.auto_moderator import auto_moderate
+from moderation.normalize import normalize_text
+from moderation.prefilter import PreFilter
+
+
+def per_call_us(fn, items, repeat=3):
+    # best of `repeat` passes, in microseconds per item
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for item in items:
+            fn(item)
+        best = min(best, time.perf_counter() - started)
+    return round(best / len(items) * 1e6, 3)
+
+
+def load_ml():
+    # the ml-service modules load their artifacts from relative paths
+    sys.path.insert(0, ML_DIR)
+    cwd = os.getcwd()
+    os.chdir(ML_DIR)
+    try:
+        import joblib
+        from fused import FusedClassifier
+        from preprocess import clean_text, clean_texts
+        return joblib.load("vectorizer.pkl"), FusedClassifier.load(), clean_text, clean_texts
+    finally:
+        os.chdir(cwd)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--batch", type=int, default=64)
+    args = parser.parse_args()
+
+    texts = load_texts(args.messages)
+    metrics = {}
+
+    vectorizer, classifier, clean_text, clean_texts = load_ml()
+
+    metrics["clean_text_us"] = per_call_us(clean_text, texts)
+
+    def predict_one(text):
+        classifier.predict_proba(vectorizer.transform([clean_text(text)]))
+
+    metrics["vectorize_predict_us"] = per_call_us(predict_one, texts[:500])
+
+    batches = [texts[i:i + args.batch] for i in range(0, len(texts), args.batch)]
+
+    def predict_batch(batch):
+        classifier.predict_proba(vectorizer.transform(clean_texts(batch)))
+
+    metrics["vectorize_predict_batched_us"] = round(
+        per_call_us(predict_batch, batches) * len(batches) / len(texts), 3
+    )
+
+    metrics["normalize_text_us"] = per_call_us(normalize_text, texts)
+
+    prefilter = PreFilter.load()
+    metrics["prefilter_check_us"] = per_call_us(prefilter.check, texts)
+
+    scores = [i / len(texts) for i in range(len(texts))]
+    metrics["auto_moderate_us"] = per_call_us(lambda t: auto_moderate(t, {}), scores)
+
+    for name, value in metrics.items():
+        print(f"  {name:<32} {value:>10} µs/message")
+
+    record("micro", {"messages": len(texts), "batch": args.batch}, metrics)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Bytes on the wire per presence churn event: full online_users broadcast
+(old) vs batched room-scoped presence_delta (new).
+
+usage (from chat-backend/):
+    python benchmarks/bench_presence.py [--users 1000 10000] [--churn 100]
+
+Uses REDIS_URL if set, otherwise fakeredis (`pip install fakeredis lupa`).
+Every user sits in "global", like real clients, so it is the worst case.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chat.presence import Presence
+
+if "REDIS_URL" in os.environ:
+    from redis_client import redis_client as redis
+else:
+    import fakeredis.aioredis
+    redis = fakeredis.aioredis.FakeRedis(decode_responses=True)
+
+
+def email(i):
+    return f"user{i}@example.com"
+
+
+async def run(users, churn):
+    await redis.flushdb()
+
+    room_size = {"global": users}
+    sent = {"bytes": 0, "events": 0}
+
+    async def emit(event, data, room=None):
+        # one copy of the payload per socket in the room
+        sent["bytes"] += len(json.dumps(data)) * room_size[room]
+        sent["events"] += 1
+
+    presence = Presence(redis=redis, tick=3600)
+    await presence.start(emit)
+
+    for i in range(users):
+        await presence.connected(email(i), ["global"])
+    presence.pending.clear()
+
+    # old: every connect/disconnect sent the whole list to everyone
+    online = [email(i) for i in range(users)]
+    old_per_event = len(json.dumps(online)) * users
+
+    # new: churn users drop and come back (other users) within one tick
+    for i in range(churn):
+        await presence.disconnected(email(i), ["global"])
+        await presence.connected(email(users + i), ["global"])
+        room_size["global"] = users
+    await presence.flush()
+    new_total = sent["bytes"]
+
+    # a single isolated churn event in its own tick
+    sent["bytes"] = 0
+    await presence.disconnected(email(users + churn - 1), ["global"])
+    await presence.flush()
+    new_single = sent["bytes"]
+
+    await presence.stop()
+
+    print(f"{users:>6} users | old: {old_per_event / 1e6:9.2f} MB per churn event"
+          f" | new: {new_single / 1e3:8.1f} KB per event,"
+          f" {new_total / churn / 1e3:8.1f} KB per event when {churn * 2} churn in one tick")
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--churn", type=int, default=100)
+    args = parser.parse_args()
+
+    for users in args.users:
+        await run(users, args.churn)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
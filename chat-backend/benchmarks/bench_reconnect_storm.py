@@ -0,0 +1,124 @@
+"""
+Room-membership lookup latency during a reconnect storm (the DB part of
+connect()): every client reconnects at once.
+
+usage (from chat-backend/):
+    python benchmarks/bench_reconnect_storm.py [--clients N] [--users U] [--rooms-per-user R]
+
+Uses DATABASE_URL / REDIS_URL if set; otherwise a throwaway SQLite file
+(needs `pip install aiosqlite`) and fakeredis (`pip install fakeredis`).
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///bench_storm.db")
+
+from sqlalchemy import func, insert
+from sqlalchemy.future import select
+
+from db import engine, SessionLocal
+from migrations import upgrade
+from models.user import User
+from models.room import Room
+from models.room_member import RoomMember
+import chat.memberships as memberships
+
+engine.echo = False
+
+if "REDIS_URL" not in os.environ:
+    import fakeredis.aioredis
+    memberships.redis_client = fakeredis.aioredis.FakeRedis(decode_responses=True, max_connections=100_000)
+
+db_queries = 0
+original_load = memberships.load_user_rooms
+
+
+async def counting_load(user_id):
+    global db_queries
+    db_queries += 1
+    return await original_load(user_id)
+
+memberships.load_user_rooms = counting_load
+
+
+async def seed(users, rooms_per_user):
+    async with SessionLocal() as db:
+        if (await db.execute(select(func.count()).select_from(User))).scalar() >= users:
+            return
+
+        print(f"Seeding {users} users x {rooms_per_user} rooms...")
+        await db.execute(insert(User), [
+            {"id": u, "email": f"user{u}@example.com", "password_hash": "x"} for u in range(1, users + 1)
+        ])
+        await db.execute(insert(Room), [
+            {"id": r, "name": f"room {r}", "is_private": False, "created_by": 1}
+            for r in range(1, users * rooms_per_user + 1)
+        ])
+        await db.execute(insert(RoomMember), [
+            {"room_id": (u - 1) * rooms_per_user + r + 1, "user_id": u}
+            for u in range(1, users + 1) for r in range(rooms_per_user)
+        ])
+        await db.commit()
+
+
+async def uncached(user_id):
+    # what connect() did before: one JOIN per socket
+    async with SessionLocal() as db:
+        result = await db.execute(
+            select(Room).join(RoomMember).where(RoomMember.user_id == user_id)
+        )
+        return result.scalars().all()
+
+
+async def storm(label, lookup, clients, users):
+    latencies = []
+
+    async def client(i):
+        started = time.perf_counter()
+        await lookup(i % users + 1)
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client(i) for i in range(clients)))
+    total = time.perf_counter() - started
+
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] * 1000
+    p99 = latencies[int(len(latencies) * 0.99)] * 1000
+    print(f"{label:>22}: p50 {p50:8.1f} ms   p99 {p99:8.1f} ms   total {total:6.2f}s")
+
+
+async def main():
+    global db_queries
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=10000)
+    parser.add_argument("--users", type=int, default=2500)
+    parser.add_argument("--rooms-per-user", type=int, default=5)
+    args = parser.parse_args()
+
+    async with engine.begin() as conn:
+        await conn.run_sync(upgrade)
+    await seed(args.users, args.rooms_per_user)
+
+    await storm("uncached (DB each)", uncached, args.clients, args.users)
+    print(f"{'':>22}  DB queries: {args.clients}")
+
+    await memberships.redis_client.flushdb()
+    db_queries = 0
+    await storm("cold cache", memberships.get_user_rooms, args.clients, args.users)
+    print(f"{'':>22}  DB queries: {db_queries}")
+
+    db_queries = 0
+    await storm("warm cache", memberships.get_user_rooms, args.clients, args.users)
+    print(f"{'':>22}  DB queries: {db_queries}")
+
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,147 @@
+"""
+Bytes and CPU per new_message fan-out with JSON vs msgpack packets, for
+rooms of 10 / 100 / 1000 members, and per message on the Redis manager
+channel.
+
+usage (from chat-backend/):
+    python benchmarks/bench_serialization.py [--sizes 10 100 1000] [--emits 200]
+
+Clients are connected to a real NegotiatingServer through its Engine.IO
+entry points; only the transport is replaced by a counter, so the CPU
+figures are Socket.IO encoding + fan-out with no socket writes. Rows:
+
+  stock       socketio.AsyncServer, JSON (before this change)
+  off         NegotiatingServer as deployed by default (msgpack clients off)
+  json        NegotiatingServer, msgpack on, every member a JSON client
+  msgpack     NegotiatingServer, msgpack on, every member a msgpack client
+  mixed       msgpack on, half and half (each format is encoded once per emit)
+
+Appends the numbers to results/serialization.jsonl.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from functools import partial
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+import msgpack
+import socketio
+from socketio import packet
+
+from results import record
+from chat.serialization import ChannelCodec, NegotiatingServer
+
+MESSAGE = {
+    "id": "5f0c2a6e9d8b4c1f8e7a6b5c4d3e2f10",
+    "user": "someone@example.com",
+    "message": "has anyone tried the new build yet? the reconnect fix looks good on my side",
+    "toxicity": 0.0132,
+    "status": "clean",
+    "moderated_text": None
+}
+
+
+async def room_of(server_class, members, msgpack_share):
+    server = server_class(async_mode="asgi")
+    sent = {"bytes": 0, "packets": 0}
+
+    async def send(eio_sid, data):
+        sent["bytes"] += len(data.encode() if isinstance(data, str) else data)
+        sent["packets"] += 1
+
+    async def send_packet(eio_sid, eio_pkt):
+        await send(eio_sid, eio_pkt.encode())
+
+    server.eio.send = send
+    server.eio.send_packet = send_packet
+
+    for i in range(members):
+        eio_sid = f"eio{i}"
+        use_msgpack = i < members * msgpack_share
+        await server._handle_eio_connect(eio_sid, {"QUERY_STRING": "serializer=msgpack" if use_msgpack else ""})
+        connect = packet.Packet(packet.CONNECT, namespace="/")
+        await server._handle_eio_message(
+            eio_sid, msgpack.packb(connect._to_dict()) if use_msgpack else connect.encode()
+        )
+        await server.enter_room(server.manager.sid_from_eio_sid(eio_sid, "/"), "room_1")
+
+    sent.update(bytes=0, packets=0)
+    return server, sent
+
+
+async def fan_out(server_class, members, msgpack_share, emits):
+    server, sent = await room_of(server_class, members, msgpack_share)
+
+    started = time.process_time()
+    for _ in range(emits):
+        await server.emit("new_message", MESSAGE, room="room_1")
+    cpu = time.process_time() - started
+
+    return {
+        "cpu_us": round(cpu / emits * 1e6, 1),
+        "bytes": sent["bytes"] // emits,
+        "packets": sent["packets"] // emits
+    }
+
+
+def channel(codec, emits):
+    # the message AsyncPubSubManager publishes for sio.emit(..., room=...)
+    message = {"method": "emit", "event": "new_message", "data": [MESSAGE], "binary": False,
+               "namespace": "/", "room": "room_1", "skip_sid": None, "callback": None,
+               "host_id": "0f1e2d3c4b5a69788796a5b4c3d2e1f0"}
+    codec = ChannelCodec(codec)
+    data = codec.dumps(message)
+    if isinstance(data, str):
+        data = data.encode()   # what redis sends and the listener receives
+
+    started = time.process_time()
+    for _ in range(emits * 10):
+        codec.loads(codec.dumps(message))
+    cpu = time.process_time() - started
+
+    return {"cpu_us": round(cpu / (emits * 10) * 1e6, 2), "bytes": len(data)}
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--emits", type=int, default=200)
+    args = parser.parse_args()
+
+    rows = [
+        ("stock", socketio.AsyncServer, 0),
+        ("off", partial(NegotiatingServer, msgpack=False), 0),
+        ("json", partial(NegotiatingServer, msgpack=True), 0),
+        ("msgpack", partial(NegotiatingServer, msgpack=True), 1),
+        ("mixed", partial(NegotiatingServer, msgpack=True), 0.5),
+    ]
+    metrics = {}
+
+    print(f"new_message fan-out, per emit ({args.emits} emits):\n")
+    print(f"{'members':>8} {'clients':<8} {'CPU µs':>9} {'bytes out':>10} {'bytes/member':>13}")
+    for members in args.sizes:
+        for name, server_class, share in rows:
+            result = await fan_out(server_class, members, share, args.emits)
+            print(f"{members:>8} {name:<8} {result['cpu_us']:>9.1f} {result['bytes']:>10} "
+                  f"{result['bytes'] / members:>13.1f}")
+            metrics[f"fanout_{members}_{name}_cpu_us"] = result["cpu_us"]
+            metrics[f"fanout_{members}_{name}_bytes"] = result["bytes"]
+        print()
+
+    print("Redis manager channel, per published emit (dumps + loads):\n")
+    for codec in ("json", "msgpack"):
+        result = channel(codec, args.emits)
+        print(f"  {codec:<8} {result['bytes']:>5} bytes  {result['cpu_us']:>6.2f} µs")
+        metrics[f"channel_{codec}_cpu_us"] = result["cpu_us"]
+        metrics[f"channel_{codec}_bytes"] = result["bytes"]
+
+    record("serialization", {"sizes": args.sizes, "emits": args.emits}, metrics)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,195 @@
+"""
+Per-node inbound pub/sub traffic with the stock AsyncRedisManager (one
+channel, every node receives every emit) vs ShardedRedisManager (nodes
+only subscribe to the shards of rooms they host).
+
+usage (from chat-backend/):
+    python benchmarks/bench_sharding.py [--nodes 1 2 4 8] [--rooms 20] [--rate 100] [--seconds 3]
+
+Each node is a separate process with its own Socket.IO server and client
+manager on the same Redis (REDIS_URL, default redis://localhost:6379);
+only the client transport is replaced by a counter. Every node hosts
+--rooms rooms of --members clients each (with --spread > 1 a room also
+has members on the next nodes), every client is in "global", and every
+node emits --rate new_message/s to its rooms, --global-share of them to
+"global". Deliveries are checked against the expected count, so a missed
+subscription would show up as delivered < 100%.
+
+Appends the numbers to results/sharding.jsonl.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+import socketio
+from socketio import packet
+
+from results import record
+from chat.pubsub import ShardedRedisManager
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
+
+MESSAGE = {"user": "someone@example.com", "message": "hello room", "toxicity": 0.01,
+           "status": "clean", "moderated_text": None}
+
+
+class CountingRedisManager(socketio.AsyncRedisManager):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = {"published": 0, "received": 0, "shards": 0}
+
+    async def _publish(self, data):
+        self.stats["published"] += 1
+        return await super()._publish(data)
+
+    async def _listen(self):
+        async for data in super()._listen():
+            self.stats["received"] += 1
+            yield data
+
+
+def room_members(room, node, nodes, args):
+    # room "r<n>" lives on node n % nodes and the next spread - 1 nodes
+    home = int(room[1:]) % nodes
+    return args.members if (node - home) % nodes < min(args.spread, nodes) else 0
+
+
+async def run_node(node, nodes, mode, channel, args, barrier, results):
+    if mode == "sharded":
+        manager = ShardedRedisManager(REDIS_URL, channel=channel, shards=args.shards)
+    else:
+        manager = CountingRedisManager(REDIS_URL, channel=channel)
+    server = socketio.AsyncServer(async_mode="asgi", client_manager=manager)
+
+    delivered = 0
+
+    async def send(eio_sid, data):
+        nonlocal delivered
+        delivered += 1
+
+    async def send_packet(eio_sid, eio_pkt):
+        nonlocal delivered
+        delivered += 1
+
+    server.eio.send = send
+    server.eio.send_packet = send_packet
+
+    all_rooms = [f"r{i}" for i in range(nodes * args.rooms)]
+    own_rooms = [r for r in all_rooms if int(r[1:]) % nodes == node]
+
+    client = 0
+    for room in all_rooms:
+        for _ in range(room_members(room, node, nodes, args)):
+            eio_sid = f"eio{client}"
+            client += 1
+            await server._handle_eio_connect(eio_sid, {})
+            await server._handle_eio_message(eio_sid, packet.Packet(packet.CONNECT, namespace="/").encode())
+            sid = server.manager.sid_from_eio_sid(eio_sid, "/")
+            await server.enter_room(sid, room)
+            await server.enter_room(sid, "global")
+
+    await asyncio.sleep(0.5)   # listener connected and subscribed
+    await asyncio.get_running_loop().run_in_executor(None, barrier.wait)
+    delivered = 0
+    received_before = manager.stats["received"]
+
+    rng = random.Random(node)
+    emits = {"global": 0, **{room: 0 for room in own_rooms}}
+    interval = 1 / args.rate
+    deadline = time.perf_counter() + args.seconds
+    next_at = time.perf_counter()
+    while time.perf_counter() < deadline:
+        room = "global" if rng.random() < args.global_share else rng.choice(own_rooms)
+        await server.emit("new_message", MESSAGE, room=room)
+        emits[room] += 1
+        next_at += interval
+        await asyncio.sleep(max(0, next_at - time.perf_counter()))
+
+    await asyncio.get_running_loop().run_in_executor(None, barrier.wait)
+    await asyncio.sleep(1)   # drain
+
+    results.put({
+        "node": node,
+        "clients": client,
+        "emits": emits,
+        "received": manager.stats["received"] - received_before,
+        "shards": manager.stats["shards"],
+        "delivered": delivered
+    })
+
+
+def node_process(*args):
+    asyncio.run(run_node(*args))
+
+
+def cluster(nodes, mode, args):
+    channel = f"bench-sharding-{os.getpid()}-{nodes}-{mode}"
+    barrier = multiprocessing.Barrier(nodes)
+    results = multiprocessing.Queue()
+    procs = [
+        multiprocessing.Process(target=node_process, args=(i, nodes, mode, channel, args, barrier, results))
+        for i in range(nodes)
+    ]
+    for p in procs:
+        p.start()
+    stats = [results.get(timeout=120 + args.seconds) for _ in procs]
+    for p in procs:
+        p.join()
+
+    # expected deliveries: every emit reaches every member of its room, cluster-wide
+    clients = sum(s["clients"] for s in stats)
+    expected = 0
+    for s in stats:
+        for room, count in s["emits"].items():
+            members = clients if room == "global" else args.members * min(args.spread, nodes)
+            expected += count * members
+
+    emits = sum(sum(s["emits"].values()) for s in stats)
+    return {
+        "emits": emits,
+        "received_per_node": sum(s["received"] for s in stats) / nodes,
+        "max_received": max(s["received"] for s in stats),
+        "shards_per_node": sum(s["shards"] for s in stats) / nodes,
+        "delivered": sum(s["delivered"] for s in stats) / max(expected, 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--nodes", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--rooms", type=int, default=20, help="rooms hosted per node")
+    parser.add_argument("--members", type=int, default=5, help="clients per room per hosting node")
+    parser.add_argument("--spread", type=int, default=1, help="nodes each room has members on")
+    parser.add_argument("--rate", type=float, default=100, help="emits per second per node")
+    parser.add_argument("--global-share", type=float, default=0.02)
+    parser.add_argument("--seconds", type=float, default=3)
+    parser.add_argument("--shards", type=int, default=256)
+    args = parser.parse_args()
+
+    metrics = {}
+    print(f"{args.rooms} rooms/node x {args.members} members, spread {args.spread}, "
+          f"{args.rate:g} emits/s/node for {args.seconds:g}s, {args.global_share:.0%} to global\n")
+    print(f"{'nodes':>5} {'manager':<8} {'cluster emits':>13} {'inbound/node':>13} "
+          f"{'max node':>9} {'shards/node':>12} {'delivered':>10}")
+    for nodes in args.nodes:
+        for mode in ("stock", "sharded"):
+            result = cluster(nodes, mode, args)
+            print(f"{nodes:>5} {mode:<8} {result['emits']:>13} {result['received_per_node']:>13.0f} "
+                  f"{result['max_received']:>9} {result['shards_per_node']:>12.1f} {result['delivered']:>10.1%}")
+            metrics[f"nodes_{nodes}_{mode}_inbound_per_node"] = round(result["received_per_node"])
+            metrics[f"nodes_{nodes}_{mode}_delivered"] = round(result["delivered"], 4)
+        print()
+
+    record("sharding", {k: v for k, v in vars(args).items()}, metrics)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Startup profile of both services.
+
+1. Import-time breakdown: `python -X importtime` of ml-service/app.py and
+   chat-backend/main.py, summed per top-level package (self time), so the
+   heavy imports stand out.
+2. Time to live / ready: spawns each service under uvicorn and measures
+   spawn -> first answer on / (process is up) and -> 200 on /ready (models
+   warm, schema current). The backend boots twice on a fresh SQLite file:
+   the first boot runs the migrations, the second only checks the version.
+
+usage (from chat-backend/):
+    python benchmarks/bench_startup.py [--top 12]
+
+Needs redis-server on PATH (or REDIS_URL) and `pip install aiosqlite`.
+Appends the timings to results/startup.jsonl.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+from loadtest import BACKEND_DIR, ML_DIR, free_port, http_ok
+from results import record
+
+
+def import_profile(cwd, module, env):
+    # -X importtime lines: "import time: self [us] | cumulative | name"
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=cwd, env=env, capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+
+    by_package = defaultdict(int)
+    total = 0
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = [part.strip() for part in line[len("import time:"):].split("|")]
+        by_package[name.split(".")[0]] += int(self_us)
+        if name == module:
+            total = int(cumulative_us)
+
+    return total / 1e6, sorted(by_package.items(), key=lambda item: -item[1])
+
+
+def time_to_ready(cmd, cwd, env, port, timeout=120):
+    import httpx   # noqa: F401 -- imported by http_ok; keep it out of the timing
+
+    started = time.perf_counter()
+    proc = subprocess.Popen(cmd, cwd=cwd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}"
+    live = None
+
+    try:
+        while time.perf_counter() - started < timeout:
+            if proc.poll() is not None:
+                raise RuntimeError(f"{cmd} exited with {proc.returncode}")
+            try:
+                if live is None and http_ok(url + "/"):
+                    live = time.perf_counter() - started
+                if http_ok(url + "/ready"):
+                    return live, time.perf_counter() - started
+            except Exception:
+                pass
+            time.sleep(0.05)
+        raise RuntimeError(f"{cmd} not ready in {timeout}s")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--top", type=int, default=12, help="packages shown per service")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="safechat-startup-")
+    env = dict(os.environ)
+    procs = []
+
+    try:
+        if "REDIS_URL" not in env:
+            port = free_port()
+            procs.append(subprocess.Popen(
+                ["redis-server", "--port", str(port), "--save", "", "--appendonly", "no"],
+                stdout=subprocess.DEVNULL
+            ))
+            env["REDIS_URL"] = f"redis://127.0.0.1:{port}"
+        env["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(tmp, 'startup.db')}"
+
+        metrics = {}
+        for name, cwd, module in (("ml", ML_DIR, "app"), ("backend", BACKEND_DIR, "main")):
+            seconds, packages = import_profile(cwd, module, env)
+            metrics[f"{name}_import_seconds"] = round(seconds, 3)
+
+            print(f"\n{name}: import {module} {seconds:.2f} s, self time by package")
+            for package, us in packages[:args.top]:
+                print(f"  {package:<24} {us / 1000:8.1f} ms")
+
+        ml_port = free_port()
+        live, ready = time_to_ready(
+            [sys.executable, "-m", "uvicorn", "app:app", "--port", str(ml_port), "--log-level", "warning"],
+            ML_DIR, env, ml_port
+        )
+        metrics.update(ml_live_seconds=round(live, 3), ml_ready_seconds=round(ready, 3))
+        print(f"\nml-service    live {live:5.2f} s  ready {ready:5.2f} s")
+
+        env["ML_URL"] = f"http://127.0.0.1:{ml_port}/predict"
+        for boot in ("first", "second"):
+            port = free_port()
+            live, ready = time_to_ready(
+                [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+                BACKEND_DIR, env, port
+            )
+            metrics.update({f"backend_{boot}_boot_ready_seconds": round(ready, 3)})
+            print(f"chat-backend  live {live:5.2f} s  ready {ready:5.2f} s  ({boot} boot)")
+
+    finally:
+        for proc in procs:
+            proc.terminate()
+            proc.wait()
+
+    record("startup", {}, metrics)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Redis pub/sub volume of the typing indicator: one emit per keystroke event
+(old) vs coalesced typing_users once per tick per room (new).
+
+usage (from chat-backend/):
+    python benchmarks/bench_typing.py [--rooms 100] [--typers 3] [--rate 10] [--seconds 5]
+
+Every sio.emit through AsyncRedisManager is one PUBLISH, so emits are
+counted directly. Uses REDIS_URL if set, otherwise fakeredis.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chat.typing import TypingTracker
+
+if "REDIS_URL" in os.environ:
+    from redis_client import redis_client as redis
+else:
+    import fakeredis.aioredis
+    redis = fakeredis.aioredis.FakeRedis(decode_responses=True)
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rooms", type=int, default=100)
+    parser.add_argument("--typers", type=int, default=3, help="users typing per room")
+    parser.add_argument("--rate", type=float, default=10, help="typing events per user per second")
+    parser.add_argument("--seconds", type=float, default=5)
+    args = parser.parse_args()
+
+    await redis.flushdb()
+
+    publishes = 0
+
+    async def emit(event, data, room=None):
+        nonlocal publishes
+        publishes += 1
+
+    tracker = TypingTracker(redis=redis)
+    await tracker.start(emit)
+
+    interval = 1 / args.rate
+    deadline = time.perf_counter() + args.seconds
+
+    async def user(room, name):
+        while time.perf_counter() < deadline:
+            await tracker.typing(room, name)
+            await asyncio.sleep(interval)
+
+    await asyncio.gather(*[
+        user(f"room_{r}", f"user{u}@example.com")
+        for r in range(args.rooms)
+        for u in range(args.typers)
+    ])
+
+    # let everyone expire so the "stopped typing" updates are counted too
+    await asyncio.sleep(tracker.ttl + 2 * tracker.tick)
+    await tracker.stop()
+
+    events = tracker.stats["events"]
+    print(f"{args.rooms} rooms x {args.typers} typers x {args.rate:g}/s for {args.seconds:g}s")
+    print(f"typing events:           {events}")
+    print(f"old PUBLISH (per event): {events}")
+    print(f"new PUBLISH (per tick):  {publishes}  ({events / max(publishes, 1):.0f}x fewer)")
+    print(f"new Redis writes:        {tracker.stats['redis_writes']}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,416 @@
+"""
+End-to-end load test: ml-service + chat-backend on localhost, driven by
+thousands of Socket.IO clients doing connect -> join -> chat_message x N
+-> disconnect.
+
+usage (from chat-backend/):
+    python benchmarks/loadtest.py [--clients 1000] [--messages 5] [--rooms 50]
+
+Reports client-side latency (connect, message sent -> echoed back), server
+per-stage latency (auth, precheck, rate_limit, moderation, db, emit),
+throughput and peak memory of both services, and appends the numbers to
+results/loadtest.jsonl.
+
+Needs `pip install aiohttp aiosqlite` (Socket.IO client, SQLite). Uses
+REDIS_URL / DATABASE_URL / ML_URL if set; otherwise starts a throwaway
+redis-server (must be on PATH), a temporary SQLite file and ml-service.
+Rate limits are off unless --rate-limits is given.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+ML_DIR = os.path.join(os.path.dirname(BACKEND_DIR), "ml-service")
+
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentiles(samples):
+    if not samples:
+        return {"count": 0, "p50_ms": None, "p95_ms": None, "p99_ms": None}
+
+    samples = sorted(samples)
+
+    def at(q):
+        return round(samples[min(len(samples) - 1, int(q * len(samples)))] * 1000, 3)
+
+    return {"count": len(samples), "p50_ms": at(0.50), "p95_ms": at(0.95), "p99_ms": at(0.99)}
+
+
+def peak_rss_mb(pid="self"):
+    # Linux only; None elsewhere
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        return None
+
+
+# ---------------------------------------------------
+# 🖥️ SERVER MODE — main.py with per-stage timers
+# ---------------------------------------------------
+def serve(port):
+    import uvicorn
+
+    from db import engine
+    import main
+    import chat.sockets as sockets
+    from chat.message_writer import message_writer
+
+    engine.echo = False
+    samples = {}
+
+    def timed(stage, fn):
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                samples.setdefault(stage, []).append(time.perf_counter() - started)
+        return wrapper
+
+    def timed_sync(stage, fn):
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                samples.setdefault(stage, []).append(time.perf_counter() - started)
+        return wrapper
+
+    handlers = sockets.sio.handlers["/"]
+    handlers["connect"] = timed("auth", handlers["connect"])
+    handlers["chat_message"] = timed("chat_message", handlers["chat_message"])
+
+    sockets.precheck = timed_sync("precheck", sockets.precheck)
+    sockets.rate_limiter.check = timed("rate_limit", sockets.rate_limiter.check)
+    sockets.moderate_message = timed("moderation", sockets.moderate_message)
+    sockets.save_message = timed("db_enqueue", sockets.save_message)
+    message_writer._flush = timed("db_flush", message_writer._flush)
+    sockets.sio.emit = timed("emit", sockets.sio.emit)
+
+    @main.app.get("/bench/stages")
+    async def stages():
+        return {
+            "stages": {stage: percentiles(s) for stage, s in samples.items()},
+            "peak_rss_mb": peak_rss_mb()
+        }
+
+    uvicorn.run(main.app, host="127.0.0.1", port=port, log_level="warning")
+
+
+# ---------------------------------------------------
+# 🧰 ENVIRONMENT — redis, database, ml-service, backend
+# ---------------------------------------------------
+def wait_for(check, what, timeout=90):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if check():
+                return
+        except Exception:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{what} did not come up in {timeout}s")
+
+
+def http_ok(url):
+    import httpx
+    return httpx.get(url, timeout=2).status_code == 200
+
+
+async def seed_database(users):
+    from sqlalchemy import insert
+
+    from db import engine, SessionLocal
+    from migrations import upgrade
+    from models.user import User
+    from auth.jwt import create_access_token
+
+    async with engine.begin() as conn:
+        await conn.run_sync(upgrade)
+
+    run = int(time.time())
+    emails = [f"load{run}_{i}@example.com" for i in range(users)]
+
+    async with SessionLocal() as db:
+        result = await db.execute(
+            insert(User).returning(User.id, sort_by_parameter_order=True),
+            [{"email": e, "password_hash": "x"} for e in emails]
+        )
+        ids = result.scalars().all()
+        await db.commit()
+
+    await engine.dispose()
+
+    return [
+        {"email": e, "token": create_access_token({"sub": e, "user_id": i})}
+        for e, i in zip(emails, ids)
+    ]
+
+
+def load_texts(n=2000):
+    # real comments (mostly clean, some toxic) so moderation does real work
+    path = os.path.join(ML_DIR, "data", "train.csv")
+    if not os.path.exists(path):
+        return ["hello there", "how is everyone doing today?", "this is a test message"]
+
+    import csv
+    texts = []
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            text = row["comment_text"].strip()
+            if 0 < len(text) <= 200:
+                texts.append(text)
+            if len(texts) >= n:
+                break
+    return texts
+
+
+# ---------------------------------------------------
+# 👥 CLIENTS
+# ---------------------------------------------------
+class Client:
+    def __init__(self, url, user, room, texts, args, results):
+        import socketio
+
+        self.url = url
+        self.user = user
+        self.room = room
+        self.texts = texts
+        self.args = args
+        self.results = results
+        self.sio = socketio.AsyncClient(reconnection=False)
+        self.waiting = None
+
+        for event in ("new_message", "moderation_notice", "rate_limited"):
+            self.sio.on(event, self._make_handler(event))
+
+    def _make_handler(self, event):
+        async def handler(data):
+            if self.waiting is None or self.waiting.done():
+                return
+            # new_message is broadcast to the room; only our own counts
+            if event == "new_message" and data.get("user") != self.user["email"]:
+                return
+            self.waiting.set_result(event)
+        return handler
+
+    async def connect(self):
+        started = time.perf_counter()
+        try:
+            await self.sio.connect(self.url, auth={"token": self.user["token"]},
+                                   transports=["websocket"], socketio_path="/socket.io",
+                                   wait_timeout=30)
+        except Exception:
+            self.results["errors"]["connect"] += 1
+            return False
+        self.results["connect"].append(time.perf_counter() - started)
+
+        await self.sio.emit("join_room", {"room": self.room})
+        return True
+
+    async def chat(self):
+        loop = asyncio.get_running_loop()
+
+        for _ in range(self.args.messages):
+            await asyncio.sleep(random.uniform(0, 2 * self.args.think))
+
+            self.waiting = loop.create_future()
+            started = time.perf_counter()
+            await self.sio.emit("chat_message", {
+                "room": self.room,
+                "message": random.choice(self.texts)
+            })
+
+            try:
+                outcome = await asyncio.wait_for(self.waiting, self.args.timeout)
+            except asyncio.TimeoutError:
+                self.results["errors"]["timeout"] += 1
+                continue
+
+            self.results["outcomes"][outcome] = self.results["outcomes"].get(outcome, 0) + 1
+            self.results["message"].append(time.perf_counter() - started)
+
+    async def disconnect(self):
+        started = time.perf_counter()
+        await self.sio.disconnect()
+        self.results["disconnect"].append(time.perf_counter() - started)
+
+
+async def drive(url, users, texts, args):
+    results = {
+        "connect": [], "message": [], "disconnect": [],
+        "errors": {"connect": 0, "timeout": 0}, "outcomes": {}
+    }
+    clients = [Client(url, u, f"bench_{i % args.rooms}", texts, args, results) for i, u in enumerate(users)]
+
+    sem = asyncio.Semaphore(args.connect_concurrency)
+
+    async def connect(c):
+        async with sem:
+            return await c.connect()
+
+    started = time.perf_counter()
+    ok = await asyncio.gather(*(connect(c) for c in clients))
+    connected = [c for c, good in zip(clients, ok) if good]
+    connect_seconds = time.perf_counter() - started
+    print(f"🔌 {len(connected)}/{len(clients)} connected in {connect_seconds:.1f}s")
+
+    started = time.perf_counter()
+    await asyncio.gather(*(c.chat() for c in connected))
+    chat_seconds = time.perf_counter() - started
+    print(f"💬 {len(results['message'])} messages in {chat_seconds:.1f}s")
+
+    await asyncio.gather(*(c.disconnect() for c in connected))
+
+    results["connect_per_sec"] = len(connected) / connect_seconds
+    results["messages_per_sec"] = len(results["message"]) / chat_seconds
+    return results
+
+
+# ---------------------------------------------------
+# 🚀 MAIN
+# ---------------------------------------------------
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--messages", type=int, default=5, help="messages per client")
+    parser.add_argument("--rooms", type=int, default=50)
+    parser.add_argument("--think", type=float, default=0.5, help="mean seconds between a client's messages")
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--connect-concurrency", type=int, default=200)
+    parser.add_argument("--rate-limits", action="store_true")
+    parser.add_argument("--serve", type=int, metavar="PORT", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve)
+        return
+
+    tmp = tempfile.mkdtemp(prefix="safechat-load-")
+    procs = []
+    env = dict(os.environ)
+
+    try:
+        if "REDIS_URL" not in env:
+            port = free_port()
+            procs.append(subprocess.Popen(
+                ["redis-server", "--port", str(port), "--save", "", "--appendonly", "no"],
+                stdout=subprocess.DEVNULL
+            ))
+            env["REDIS_URL"] = f"redis://127.0.0.1:{port}"
+
+        env.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{os.path.join(tmp, 'load.db')}")
+
+        if "ML_URL" not in env:
+            port = free_port()
+            procs.append(subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "app:app", "--port", str(port), "--log-level", "warning"],
+                cwd=ML_DIR, stdout=open(os.path.join(tmp, "ml.log"), "w"), stderr=subprocess.STDOUT
+            ))
+            ml_proc = procs[-1]
+            env["ML_URL"] = f"http://127.0.0.1:{port}/predict"
+        else:
+            ml_proc = None
+
+        if not args.rate_limits:
+            for scope in ("USER", "ROOM", "GLOBAL"):
+                env[f"RATE_{scope}_PER_SEC"] = "0"
+
+        # the seeding below runs in this process, so it needs the same settings
+        os.environ.update(env)
+        users = asyncio.run(seed_database(args.clients))
+        texts = load_texts()
+
+        ml_root = env["ML_URL"].rsplit("/", 1)[0] + "/"
+        wait_for(lambda: http_ok(ml_root + "ready"), "ml-service")
+
+        port = free_port()
+        backend_log = os.path.join(tmp, "backend.log")
+        procs.append(subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), "--serve", str(port)],
+            cwd=BACKEND_DIR, env=env, stdout=open(backend_log, "w"), stderr=subprocess.STDOUT
+        ))
+        url = f"http://127.0.0.1:{port}"
+        wait_for(lambda: http_ok(url + "/ready"), "chat-backend")
+
+        print(f"🚀 {args.clients} clients, {args.messages} messages each, {args.rooms} rooms")
+        results = asyncio.run(drive(url, users, texts, args))
+
+        # give the write-behind writer a moment to flush the tail
+        time.sleep(1)
+        import httpx
+        server = httpx.get(url + "/bench/stages", timeout=10).json()
+        ml_rss = peak_rss_mb(ml_proc.pid) if ml_proc else None
+
+    finally:
+        for proc in reversed(procs):
+            proc.terminate()
+        for proc in procs:
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+    shutil.rmtree(tmp, ignore_errors=True)
+
+    client_stages = {name: percentiles(results[name]) for name in ("connect", "message", "disconnect")}
+
+    print("\nclient                    count     p50 ms     p95 ms     p99 ms")
+    for name, p in client_stages.items():
+        print(f"  {name:<22} {p['count']:>6} {p['p50_ms'] or 0:>10} {p['p95_ms'] or 0:>10} {p['p99_ms'] or 0:>10}")
+    print("server stage")
+    for name, p in server["stages"].items():
+        print(f"  {name:<22} {p['count']:>6} {p['p50_ms'] or 0:>10} {p['p95_ms'] or 0:>10} {p['p99_ms'] or 0:>10}")
+
+    print(f"\nthroughput: {results['messages_per_sec']:.1f} msg/s, {results['connect_per_sec']:.1f} connects/s")
+    print(f"outcomes:   {json.dumps(results['outcomes'])}  errors: {json.dumps(results['errors'])}")
+    print(f"peak RSS:   chat-backend {server['peak_rss_mb']} MB, ml-service {ml_rss} MB,"
+          f" load generator {peak_rss_mb()} MB")
+
+    metrics = {
+        "messages_per_sec": round(results["messages_per_sec"], 2),
+        "connect_per_sec": round(results["connect_per_sec"], 2),
+        "errors": sum(results["errors"].values()),
+        "backend_peak_rss_mb": server["peak_rss_mb"],
+        "ml_peak_rss_mb": ml_rss
+    }
+    for name, p in client_stages.items():
+        metrics[f"{name}_p50_ms"] = p["p50_ms"]
+        metrics[f"{name}_p99_ms"] = p["p99_ms"]
+    for name, p in server["stages"].items():
+        metrics[f"server_{name}_p50_ms"] = p["p50_ms"]
+        metrics[f"server_{name}_p99_ms"] = p["p99_ms"]
+
+    from results import record
+    record("loadtest", {
+        "clients": args.clients,
+        "messages": args.messages,
+        "rooms": args.rooms,
+        "think": args.think,
+        "rate_limits": args.rate_limits
+    }, metrics)
+
+
+if __name__ == "__main__":
+    main()
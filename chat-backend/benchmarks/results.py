@@ -0,0 +1,69 @@
+"""
+Run-over-run benchmark results.
+
+Each benchmark appends one JSON line per run to results/<name>.jsonl
+(git commit, time, parameters, metrics) and prints how the metrics moved
+since the last run with the same parameters.
+"""
+import json
+import os
+import subprocess
+import time
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=RESULTS_DIR, stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def previous(name, params):
+    path = os.path.join(RESULTS_DIR, f"{name}.jsonl")
+    if not os.path.exists(path):
+        return None
+
+    last = None
+    with open(path) as f:
+        for line in f:
+            run = json.loads(line)
+            if run["params"] == params:
+                last = run
+    return last
+
+
+def record(name, params, metrics):
+    """
+    metrics: flat {name: number}. Names ending in _per_sec / _rps are
+    higher-is-better; everything else (latencies, bytes) lower-is-better.
+    """
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    last = previous(name, params)
+
+    run = {
+        "commit": git_commit(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "params": params,
+        "metrics": metrics
+    }
+    with open(os.path.join(RESULTS_DIR, f"{name}.jsonl"), "a") as f:
+        f.write(json.dumps(run) + "\n")
+
+    if last is None:
+        print(f"\n📁 Saved to results/{name}.jsonl (first run with these parameters)")
+        return
+
+    print(f"\n📁 Saved to results/{name}.jsonl, compared with {last['commit']} ({last['time']}):")
+    for key, value in metrics.items():
+        before = last["metrics"].get(key)
+        if not before or value is None:
+            continue
+
+        change = (value - before) / before * 100
+        better = key.endswith(("_per_sec", "_rps")) == (change > 0)
+        flag = "" if abs(change) < 10 else ("  ✅" if better else "  ⚠️ regression")
+        print(f"  {key:<40} {before:>12.4g} -> {value:<12.4g} {change:+6.1f}%{flag}")
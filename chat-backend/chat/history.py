@@ -0,0 +1,146 @@
+import base64
+import json
+import os
+from datetime import datetime
+
+from redis.exceptions import RedisError
+
+from redis_client import redis_client
+from moderation.auto_moderator import CENSORED_TEXT
+
+# Last N messages per chat kept in a Redis list (newest first)
+HISTORY_CACHE_SIZE = int(os.getenv("HISTORY_CACHE_SIZE", "50"))
+HISTORY_CACHE_TTL = int(os.getenv("HISTORY_CACHE_TTL", "3600"))
+
+
+# Bumped on every push, so a cold-path fill can tell that a message was
+# written while it was reading Postgres and skip its (older) snapshot
+FILL_SCRIPT = """
+if (redis.call('GET', KEYS[2]) or '') ~= ARGV[1] then
+    return 0
+end
+redis.call('DEL', KEYS[1])
+redis.call('RPUSH', KEYS[1], unpack(ARGV, 3))
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+return 1
+"""
+
+fill_script = redis_client.register_script(FILL_SCRIPT)
+
+
+# Messages in the "global" socket room are stored under this chat id (no
+# real room has id 0); "room_<id>" rooms under <id>. Private rooms have no
+# room history.
+GLOBAL_CHAT_ID = 0
+
+
+def room_chat_id(room):
+    # the chat id messages sent to a socket room are stored under
+    if room == "global":
+        return GLOBAL_CHAT_ID
+    if room.startswith("room_") and room[len("room_"):].isdigit():
+        return int(room[len("room_"):])
+    return None
+
+
+def history_key(chat_id):
+    return f"room_history:{chat_id}"
+
+
+def history_version_key(chat_id):
+    return f"room_history_version:{chat_id}"
+
+
+def serialize(row, user=None):
+    return {
+        "id": row["id"],
+        "chat_id": row["chat_id"],
+        "user_id": row["user_id"],
+        "user": user,
+        "message": row["content"],
+        "toxicity": row["toxicity"],
+        "status": row["status"],
+        "moderated_text": CENSORED_TEXT if row["status"] == "censored" else None,
+        "created_at": row["created_at"].isoformat()
+    }
+
+
+def encode_cursor(message):
+    raw = f"{message['created_at']}|{message['id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    created_at, message_id = base64.urlsafe_b64decode(cursor.encode()).decode().rsplit("|", 1)
+    return datetime.fromisoformat(created_at), int(message_id)
+
+
+async def push_history(rows):
+    """
+    Flush hook for the message writer. LPUSHX only appends to lists that
+    already exist, so a cold room is never left with a partial buffer;
+    it gets filled from Postgres on its first history read instead.
+    The version bump makes a fill that raced with this push back off.
+    """
+    try:
+        async with redis_client.pipeline(transaction=False) as pipe:
+            for row in rows:
+                if row["chat_id"] is None:
+                    continue
+                key = history_key(row["chat_id"])
+                version = history_version_key(row["chat_id"])
+                pipe.lpushx(key, json.dumps(serialize(row, row.get("user"))))
+                pipe.ltrim(key, 0, HISTORY_CACHE_SIZE - 1)
+                pipe.incr(version)
+                pipe.expire(version, HISTORY_CACHE_TTL)
+            await pipe.execute()
+    except RedisError:
+        pass
+
+
+async def cached_history(chat_id, limit):
+    if limit > HISTORY_CACHE_SIZE:
+        return None
+
+    try:
+        raw = await redis_client.lrange(history_key(chat_id), 0, limit - 1)
+    except RedisError:
+        return None
+
+    if not raw:
+        return None
+
+    messages = [json.loads(m) for m in raw]
+
+    # a message committed just before a fill's query but pushed just after
+    # the fill is in the list twice; let Postgres rebuild it
+    if len({m["id"] for m in messages}) != len(messages):
+        return None
+
+    return messages
+
+
+async def history_version(chat_id):
+    # read before the Postgres query of a cold fill
+    try:
+        return await redis_client.get(history_version_key(chat_id)) or ""
+    except RedisError:
+        return None
+
+
+async def fill_history(chat_id, messages, version):
+    """
+    Replace the cached list with a Postgres snapshot, unless a message was
+    pushed since `version` was read: the snapshot may be missing it, and
+    the next read fills again instead.
+    """
+    if not messages or version is None:
+        return
+
+    try:
+        await fill_script(
+            keys=[history_key(chat_id), history_version_key(chat_id)],
+            args=[version, HISTORY_CACHE_TTL, *[json.dumps(m) for m in messages[:HISTORY_CACHE_SIZE]]]
+        )
+    except RedisError:
+        pass
@@ -0,0 +1,113 @@
+import asyncio
+import os
+
+from redis.exceptions import RedisError
+from sqlalchemy.future import select
+
+from db import SessionLocal
+from models.room import Room
+from models.room_member import RoomMember
+from redis_client import redis_client
+
+# user_rooms:{user_id} -> Redis hash {room_id: room_name}
+MEMBERSHIP_TTL = int(os.getenv("MEMBERSHIP_TTL", "600"))
+
+# marks a cached "member of nothing" (a hash can't be empty)
+EMPTY = "_"
+
+# user_id -> task loading that user's rooms, shared by concurrent misses
+inflight = {}
+
+def membership_key(user_id):
+    return f"user_rooms:{user_id}"
+
+
+def generation_key(user_id):
+    return f"user_rooms_gen:{user_id}"
+
+
+async def get_user_rooms(user_id):
+    """
+    Rooms the user belongs to as [{"id": int, "name": str}].
+
+    Reads the Redis cache; on a miss, one Postgres query per user is in
+    flight at a time, however many sockets reconnect at once.
+    """
+    try:
+        cached = await redis_client.hgetall(membership_key(user_id))
+    except RedisError:
+        cached = None
+
+    if cached:
+        return [{"id": int(room_id), "name": name} for room_id, name in cached.items() if room_id != EMPTY]
+
+    task = inflight.get(user_id)
+    if task is None:
+        task = asyncio.ensure_future(load_user_rooms(user_id))
+        inflight[user_id] = task
+        task.add_done_callback(lambda done: forget_load(user_id, done))
+
+    # one cancelled waiter must not cancel the load for the others
+    return await asyncio.shield(task)
+
+
+def forget_load(user_id, task):
+    # an invalidation may already have replaced it with a newer load
+    if inflight.get(user_id) is task:
+        del inflight[user_id]
+
+
+async def load_user_rooms(user_id):
+    try:
+        generation = await redis_client.get(generation_key(user_id)) or ""
+    except RedisError:
+        generation = None
+
+    async with SessionLocal() as db:
+        result = await db.execute(
+            select(Room.id, Room.name)
+            .join(RoomMember)
+            .where(RoomMember.user_id == user_id)
+        )
+        rooms = [{"id": room_id, "name": name} for room_id, name in result.all()]
+
+    if generation is None:
+        return rooms
+
+    key = membership_key(user_id)
+    mapping = {str(r["id"]): r["name"] or "" for r in rooms} or {EMPTY: ""}
+
+    # only if no invalidation happened since the generation was read: a
+    # load that raced with create_room must not cache the rooms from before
+    # it (a bump during the transaction aborts it with WatchError)
+    try:
+        async with redis_client.pipeline(transaction=True) as pipe:
+            await pipe.watch(generation_key(user_id))
+            if (await pipe.get(generation_key(user_id)) or "") != generation:
+                return rooms
+
+            pipe.multi()
+            pipe.delete(key)
+            pipe.hset(key, mapping=mapping)
+            pipe.expire(key, MEMBERSHIP_TTL)
+            await pipe.execute()
+    except RedisError:
+        pass
+
+    return rooms
+
+
+async def invalidate_user_rooms(user_id):
+    # call after any membership change (create/join/leave); the change is
+    # already committed, so a Redis failure only means a stale cache
+    inflight.pop(user_id, None)
+
+    generation = generation_key(user_id)
+    try:
+        async with redis_client.pipeline(transaction=True) as pipe:
+            pipe.incr(generation)
+            pipe.expire(generation, MEMBERSHIP_TTL)
+            pipe.delete(membership_key(user_id))
+            await pipe.execute()
+    except RedisError:
+        pass
@@ -0,0 +1,412 @@
+import asyncio
+import json
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timezone
+
+from sqlalchemy import exc
+from sqlalchemy.dialects import postgresql, sqlite
+
+from db import SessionLocal
+from models.message import Message
+from redis_client import redis_client
+from metrics import observe
+from logs import get_logger
+
+log = get_logger("message_writer")
+
+WRITE_BATCH_SIZE = int(os.getenv("WRITE_BATCH_SIZE", "500"))
+WRITE_FLUSH_MS = float(os.getenv("WRITE_FLUSH_MS", "50"))
+WRITE_MAX_BUFFER = int(os.getenv("WRITE_MAX_BUFFER", "10000"))
+# Connection-level failures are retried with backoff for as long as the
+# writer runs (the buffer pushes back meanwhile); on shutdown only this
+# many times, after which the rows are left in the journal
+WRITE_MAX_RETRIES = int(os.getenv("WRITE_MAX_RETRIES", "5"))
+
+# Every buffered row is also appended to a Redis stream owned by this
+# process and only removed once it is committed. While the process is
+# alive it keeps a lease on its journal; a journal whose lease has expired
+# is claimed and replayed by another writer, so a crash loses nothing.
+MESSAGE_JOURNAL = os.getenv("MESSAGE_JOURNAL", "true").lower() == "true"
+JOURNAL_LEASE_MS = int(os.getenv("MESSAGE_JOURNAL_LEASE_MS", "30000"))
+
+JOURNALS_KEY = "message_journals"              # set of every live or orphaned journal
+DEAD_LETTER_KEY = "message_dead_letter"        # "<journal>/<entry id>" -> {journal, row, error}
+
+COLUMNS = {c.name for c in Message.__table__.columns}
+
+# errors that say nothing about the rows themselves
+TRANSIENT_ERRORS = (OSError, asyncio.TimeoutError, exc.OperationalError, exc.InterfaceError, exc.TimeoutError)
+
+
+def journal_key(writer_id):
+    return f"message_journal:{writer_id}"
+
+
+def lease_key(journal):
+    return f"{journal}:lease"
+
+
+def claim_key(journal):
+    return f"{journal}:claim"
+
+
+def dead_letter_field(journal, entry_id):
+    return f"{journal}/{entry_id}"
+
+
+def insert_new(dialect):
+    # INSERT ... ON CONFLICT (message_key) DO NOTHING RETURNING id, message_key
+    dialect = postgresql if dialect == "postgresql" else sqlite
+    return (
+        dialect.insert(Message)
+        .on_conflict_do_nothing(index_elements=[Message.message_key])
+        .returning(Message.id, Message.message_key)
+    )
+
+
+def is_transient(error):
+    return isinstance(error, TRANSIENT_ERRORS) or getattr(error, "connection_invalidated", False)
+
+
+class MessageWriter:
+    """
+    Write-behind persistence for chat messages.
+
+    enqueue() returns as soon as the row is buffered (and journaled); a
+    background task inserts buffered rows with one multi-row INSERT and one
+    commit every `flush_ms` or `batch_size` rows. When the buffer is full,
+    enqueue() waits, which pushes back on chat_message.
+
+    A batch that fails on its rows (not on the connection) is split in
+    half and each half written on its own, down to single rows; a row that
+    fails alone is recorded in the dead-letter hash and stays in the
+    journal, and every other row of the batch is committed.
+
+    Rows may carry extra keys (e.g. the sender's email) that are not
+    columns; they are skipped by the INSERT but passed, together with the
+    new id, to every coroutine in `on_flush`.
+
+    Every row gets a unique message_key when it is buffered, and the INSERT
+    skips keys that are already stored, so replaying a journal entry whose
+    row was committed (e.g. the XDEL after the commit failed) adds nothing.
+    """
+
+    def __init__(self, batch_size=WRITE_BATCH_SIZE, flush_ms=WRITE_FLUSH_MS,
+                 max_buffer=WRITE_MAX_BUFFER, journal=MESSAGE_JOURNAL,
+                 redis=redis_client, lease_ms=JOURNAL_LEASE_MS):
+        self.batch_size = batch_size
+        self.flush_wait = flush_ms / 1000
+        self.max_buffer = max_buffer
+        self.journal = journal
+        self.redis = redis
+        self.lease_ms = lease_ms
+
+        # one journal per process: workers on the same host don't share it
+        self.writer_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.journal_key = journal_key(self.writer_id)
+
+        self.queue = None
+        self.task = None
+        self.lease_task = None
+        self.recovery = None
+        self.stopping = False
+        self.on_flush = []
+
+        self.stats = {
+            "enqueued": 0,
+            "flushed": 0,
+            "batches": 0,
+            "failures": 0,
+            "split_batches": 0,
+            "dead_lettered": 0,
+            "recovered": 0,
+            "journals_claimed": 0
+        }
+
+    async def start(self):
+        if self.task is not None:
+            return
+
+        self.queue = asyncio.Queue(maxsize=self.max_buffer)
+        self.stopping = False
+
+        if self.journal:
+            await self.renew_lease()
+            await self.redis.sadd(JOURNALS_KEY, self.journal_key)
+            await self.recover()
+            self.lease_task = asyncio.create_task(self._keep_lease())
+
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        # sentinel: the writer flushes everything queued before it, then exits
+        if self.task is None:
+            return
+
+        self.stopping = True
+        await self.queue.put(None)
+        await self.task
+        self.task = None
+
+        if self.lease_task is not None:
+            self.lease_task.cancel()
+            self.lease_task = None
+            if self.recovery is not None:
+                await asyncio.gather(self.recovery, return_exceptions=True)
+            try:
+                # nothing left to replay: retire the journal; otherwise let
+                # the lease expire so another writer claims what's left
+                if not await self._pending(self.journal_key):
+                    await self.redis.srem(JOURNALS_KEY, self.journal_key)
+                    await self.redis.delete(lease_key(self.journal_key))
+            except Exception as e:
+                log.error("journal_release_failed", error=str(e))
+
+    async def enqueue(self, row):
+        row.setdefault("created_at", datetime.now(timezone.utc))
+        row.setdefault("message_key", uuid.uuid4().hex)
+
+        entry_id = None
+        if self.journal:
+            try:
+                entry_id = await self.redis.xadd(self.journal_key, {"row": json.dumps(row, default=str)})
+            except Exception as e:
+                # the message may already be on screen (optimistic rooms):
+                # store it anyway, just without crash protection
+                log.error("journal_append_failed", error=str(e))
+
+        await self.queue.put((entry_id, row))
+        self.stats["enqueued"] += 1
+
+    # ---------------------------------------------------
+    # Journal ownership
+    # ---------------------------------------------------
+    async def renew_lease(self):
+        await self.redis.set(lease_key(self.journal_key), self.writer_id, px=self.lease_ms)
+
+    async def _keep_lease(self):
+        # renew well inside the lease; look for orphaned journals on the side,
+        # so a long replay never delays a renewal
+        while True:
+            await asyncio.sleep(self.lease_ms / 3000)
+            try:
+                await self.renew_lease()
+            except Exception as e:
+                log.error("journal_lease_failed", error=str(e))
+
+            if self.recovery is None or self.recovery.done():
+                self.recovery = asyncio.create_task(self._recover_quietly())
+
+    async def _recover_quietly(self):
+        try:
+            await self.recover()
+        except Exception as e:
+            log.error("journal_recovery_failed", error=str(e))
+
+    async def recover(self):
+        """
+        Replay every journal whose owner's lease has expired. A short-lived
+        claim key makes sure only one writer replays a given journal.
+        """
+        for journal in await self.redis.smembers(JOURNALS_KEY):
+            if journal == self.journal_key or await self.redis.exists(lease_key(journal)):
+                continue
+            if not await self.redis.set(claim_key(journal), self.writer_id, nx=True, px=self.lease_ms * 2):
+                continue
+
+            try:
+                await self._replay(journal)
+            finally:
+                await self.redis.delete(claim_key(journal))
+
+    async def _replay(self, journal):
+        self.stats["journals_claimed"] += 1
+        entries = await self._pending(journal)
+
+        batch = [(entry_id, self._load_row(fields["row"])) for entry_id, fields in entries]
+        recovered = 0
+        for i in range(0, len(batch), self.batch_size):
+            recovered += await self._flush(batch[i:i + self.batch_size], journal, claim_key(journal))
+
+        self.stats["recovered"] += recovered
+        if batch:
+            log.warning("journal_recovered", journal=journal, messages=recovered, pending=len(batch))
+
+        # whatever is left has been dead-lettered; the stream stays as its record
+        if not await self._pending(journal):
+            await self.redis.srem(JOURNALS_KEY, journal)
+
+    async def _pending(self, journal):
+        # journal entries not yet committed, minus the dead-lettered ones
+        entries = await self.redis.xrange(journal)
+        if not entries:
+            return []
+        dead = await self.redis.hmget(DEAD_LETTER_KEY, [dead_letter_field(journal, entry_id) for entry_id, _ in entries])
+        return [entry for entry, known in zip(entries, dead) if known is None]
+
+    # ---------------------------------------------------
+    # Writing
+    # ---------------------------------------------------
+    async def _collect(self):
+        # block for the first row, then take more until full or timed out
+        first = await self.queue.get()
+        if first is None:
+            return [], True
+
+        batch = [first]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.flush_wait
+
+        while len(batch) < self.batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self.queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            if item is None:
+                return batch, True
+            batch.append(item)
+
+        return batch, False
+
+    async def _run(self):
+        while True:
+            try:
+                batch, stopping = await self._collect()
+
+                if batch:
+                    await self._flush(batch)
+
+                if stopping:
+                    return
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # the rows are still journaled; never let the drain loop die
+                log.error("message_writer_error", error=str(e))
+
+    async def _flush(self, batch, journal=None, claim=None):
+        # returns how many rows were committed
+        journal = journal or self.journal_key
+        started = time.perf_counter()
+
+        written = await self._write(batch, journal, claim)
+        if not written:
+            return 0
+
+        # rows without an id were already stored by an earlier flush
+        inserted = [(row, message_id) for _, row, message_id in written if message_id is not None]
+
+        observe("db_flush", started)
+        self.stats["flushed"] += len(inserted)
+        self.stats["batches"] += 1
+
+        if self.journal:
+            try:
+                await self.redis.xdel(journal, *[entry_id for entry_id, _, _ in written])
+            except Exception as e:
+                # a leftover entry is replayed later, and skipped by the
+                # INSERT since its message_key is already stored
+                log.error("journal_delete_failed", journal=journal, error=str(e))
+
+        rows = []
+        for row, message_id in inserted:
+            row["id"] = message_id
+            rows.append(row)
+
+        for hook in self.on_flush:
+            try:
+                await hook(rows)
+            except Exception as e:
+                log.error("message_flush_hook_failed", error=str(e))
+
+        return len(inserted)
+
+    async def _write(self, batch, journal, claim=None):
+        """
+        Insert the batch; returns [(entry_id, row, id)] for the rows that
+        are committed, with id None for rows that already were. Splits the
+        batch when it fails on its contents.
+        """
+        try:
+            ids = await self._insert([row for _, row in batch], claim)
+        except Exception as e:
+            if is_transient(e):
+                # gave up on shutdown: the rows stay in the journal
+                return []
+
+            if len(batch) == 1:
+                await self._dead_letter(batch[0], journal, e)
+                return []
+
+            self.stats["split_batches"] += 1
+            middle = len(batch) // 2
+            return await self._write(batch[:middle], journal, claim) + await self._write(batch[middle:], journal, claim)
+
+        return [(entry_id, row, ids.get(row["message_key"])) for entry_id, row in batch]
+
+    async def _insert(self, rows, claim=None):
+        # one multi-row INSERT and one commit; connection errors are retried.
+        # When replaying another writer's journal, `claim` is renewed before
+        # every attempt so a long DB outage can't let a second writer replay it.
+        # Returns {message_key: id} for the rows this INSERT added.
+        for row in rows:
+            # journals written before message_key existed
+            row.setdefault("message_key", uuid.uuid4().hex)
+        values = [{k: v for k, v in row.items() if k in COLUMNS} for row in rows]
+        delay = 0.1
+        attempt = 0
+
+        while True:
+            if claim is not None:
+                await self._renew_claim(claim)
+            try:
+                async with SessionLocal() as db:
+                    result = await db.execute(insert_new(db.bind.dialect.name), values)
+                    ids = {key: message_id for message_id, key in result.all()}
+                    await db.commit()
+                return ids
+            except Exception as e:
+                self.stats["failures"] += 1
+                attempt += 1
+                if not is_transient(e) or (self.stopping and attempt >= WRITE_MAX_RETRIES):
+                    raise
+
+                log.error("message_flush_failed", attempt=attempt, rows=len(rows), error=str(e))
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 5)
+
+    async def _renew_claim(self, claim):
+        try:
+            await self.redis.pexpire(claim, self.lease_ms * 2)
+        except Exception as e:
+            log.error("journal_claim_failed", claim=claim, error=str(e))
+
+    async def _dead_letter(self, item, journal, error):
+        entry_id, row = item
+        self.stats["dead_lettered"] += 1
+        record = json.dumps({"journal": journal, "row": row, "error": str(error)}, default=str)
+
+        if entry_id is None:
+            # not journaled: the log line is the only copy
+            log.error("message_dead_lettered", row=record)
+            return
+
+        log.error("message_dead_lettered", journal=journal, entry=entry_id, error=str(error))
+        try:
+            await self.redis.hset(DEAD_LETTER_KEY, dead_letter_field(journal, entry_id), record)
+        except Exception as e:
+            log.error("dead_letter_failed", row=record, error=str(e))
+
+    def _load_row(self, raw):
+        row = json.loads(raw)
+        row["created_at"] = datetime.fromisoformat(row["created_at"])
+        return row
+
+
+message_writer = MessageWriter()
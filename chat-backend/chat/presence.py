@@ -0,0 +1,221 @@
+import asyncio
+import json
+import os
+import time
+import uuid
+
+from redis.exceptions import RedisError
+
+from redis_client import redis_client
+from logs import get_logger
+
+log = get_logger("presence")
+
+PRESENCE_TICK_SECONDS = float(os.getenv("PRESENCE_TICK_SECONDS", "1"))
+# A node that hasn't renewed its heartbeat for this long is considered dead
+# and its connections are removed by the other nodes
+PRESENCE_NODE_TTL_SECONDS = float(os.getenv("PRESENCE_NODE_TTL_SECONDS", "30"))
+
+NODES_KEY = "presence:nodes"   # set of nodes that may hold connections
+
+# Drop one connection from each of its rooms; the user leaves a room when
+# no other connection of theirs (on any node) still holds it. One atomic
+# step, so a reconnect on another node can't be lost. KEYS: the room
+# hashes, then this node's hash; ARGV: the user, then the node fields.
+# Returns the (1-based) rooms left.
+DISCONNECT_SCRIPT = """
+local node = KEYS[#KEYS]
+local left = {}
+for i = 1, #KEYS - 1 do
+    if redis.call('HINCRBY', node, ARGV[i + 1], -1) <= 0 then
+        redis.call('HDEL', node, ARGV[i + 1])
+    end
+    if redis.call('HINCRBY', KEYS[i], ARGV[1], -1) <= 0 then
+        redis.call('HDEL', KEYS[i], ARGV[1])
+        table.insert(left, i)
+    end
+end
+return left
+"""
+
+# Remove every connection a dead node still held. Atomic, so when several
+# nodes sweep the same one only the first finds anything to remove.
+# Returns the node fields ([room, user]) whose user left the room.
+SWEEP_SCRIPT = """
+local entries = redis.call('HGETALL', KEYS[1])
+local left = {}
+for i = 1, #entries, 2 do
+    local room_user = cjson.decode(entries[i])
+    local key = ARGV[2] .. room_user[1]
+    if redis.call('HINCRBY', key, room_user[2], -tonumber(entries[i + 1])) <= 0 then
+        redis.call('HDEL', key, room_user[2])
+        table.insert(left, entries[i])
+    end
+end
+redis.call('DEL', KEYS[1])
+redis.call('SREM', KEYS[2], ARGV[1])
+return left
+"""
+
+ROOM_KEY_PREFIX = "presence:members:"
+
+
+def room_key(room):
+    # hash: user -> number of their open sockets in the room, across all nodes
+    return f"{ROOM_KEY_PREFIX}{room}"
+
+
+def node_key(node):
+    # hash: [room, user] -> number of those sockets on this node
+    return f"presence:node:{node}"
+
+
+def alive_key(node):
+    return f"presence:alive:{node}"
+
+
+def node_field(room, user):
+    return json.dumps([room, user])
+
+
+class Presence:
+    """
+    Room-scoped online presence.
+
+    A user is online in a room while at least one of their sockets is in
+    it (refcount per user and room in Redis), so closing one of two tabs
+    only changes the rooms the other tab isn't in.
+    Online/offline transitions are buffered per room and sent once per
+    tick as a `presence_delta` {room, joined, left}; a user who leaves and
+    comes back within the same tick produces no event at all. Clients get
+    the full list only when they ask for it (snapshot()).
+
+    Every node also counts its own share of the connections and keeps a
+    heartbeat key alive. When a node dies, the others notice the expired
+    heartbeat and take its connections out of the room counts, so its
+    users don't stay online forever.
+    """
+
+    def __init__(self, redis=redis_client, tick=PRESENCE_TICK_SECONDS, node_ttl=PRESENCE_NODE_TTL_SECONDS):
+        self.redis = redis
+        self.tick = tick
+        self.node_ttl = node_ttl
+        self.node = uuid.uuid4().hex[:12]
+        self.disconnect_script = redis.register_script(DISCONNECT_SCRIPT)
+        self.sweep_script = redis.register_script(SWEEP_SCRIPT)
+        self.emit = None
+        self.task = None
+        self.last_heartbeat = 0.0
+
+        self.pending = {}   # room -> {"joined": set(), "left": set()}
+
+    async def start(self, emit):
+        # emit(event, data, room=...) -- normally sio.emit
+        self.emit = emit
+        await self.heartbeat()
+        # nodes that died while no one was running
+        await self.sweep()
+        if self.task is None:
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+        await self.flush()
+
+    async def connected(self, user, rooms):
+        node = node_key(self.node)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            for room in rooms:
+                pipe.hincrby(room_key(room), user, 1)
+                pipe.hincrby(node, node_field(room, user), 1)
+            counts = (await pipe.execute())[0::2]
+
+        # only rooms the user wasn't already online in (e.g. not a 2nd tab)
+        for room, count in zip(rooms, counts):
+            if count == 1:
+                self._record(room, user, "joined")
+
+    async def disconnected(self, user, rooms):
+        # `rooms` must be rooms this connection passed to connected()
+        if not rooms:
+            return
+
+        left = await self.disconnect_script(
+            keys=[room_key(room) for room in rooms] + [node_key(self.node)],
+            args=[user] + [node_field(room, user) for room in rooms]
+        )
+
+        for i in left:
+            self._record(rooms[i - 1], user, "left")
+
+    async def snapshot(self, room):
+        return sorted(await self.redis.hkeys(room_key(room)))
+
+    # ---------------------------------------------------
+    # Node liveness
+    # ---------------------------------------------------
+    async def heartbeat(self):
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.set(alive_key(self.node), 1, px=int(self.node_ttl * 1000))
+            pipe.sadd(NODES_KEY, self.node)
+            await pipe.execute()
+        self.last_heartbeat = time.monotonic()
+
+    async def sweep(self):
+        """Remove the connections of every node whose heartbeat expired."""
+        for node in await self.redis.smembers(NODES_KEY):
+            if node == self.node or await self.redis.exists(alive_key(node)):
+                continue
+
+            left = await self.sweep_script(keys=[node_key(node), NODES_KEY], args=[node, ROOM_KEY_PREFIX])
+            for field in left:
+                room, user = json.loads(field)
+                self._record(room, user, "left")
+
+            log.warning("presence_node_swept", node=node, left=len(left))
+
+    def _record(self, room, user, change):
+        delta = self.pending.setdefault(room, {"joined": set(), "left": set()})
+        opposite = delta["left" if change == "joined" else "joined"]
+
+        # left + joined inside one tick cancel out
+        if user in opposite:
+            opposite.discard(user)
+        else:
+            delta[change].add(user)
+
+    async def flush(self):
+        pending, self.pending = self.pending, {}
+
+        for room, delta in pending.items():
+            if not delta["joined"] and not delta["left"]:
+                continue
+
+            await self.emit("presence_delta", {
+                "room": room,
+                "joined": sorted(delta["joined"]),
+                "left": sorted(delta["left"])
+            }, room=room)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.tick)
+            try:
+                if time.monotonic() - self.last_heartbeat >= self.node_ttl / 3:
+                    await self.heartbeat()
+                    await self.sweep()
+                await self.flush()
+            except RedisError as e:
+                log.error("presence_heartbeat_failed", error=str(e))
+            except Exception as e:
+                log.error("presence_flush_failed", error=str(e))
+
+
+presence = Presence()
@@ -0,0 +1,232 @@
+import asyncio
+import os
+import re
+import zlib
+
+import socketio
+from bidict import ValueDuplicationError
+
+from logs import get_logger
+
+log = get_logger("pubsub")
+
+# Room emits are published on one of this many shard channels (a room's
+# shard is a hash of its name); 0 = one channel per room
+SOCKETIO_SHARDS = int(os.getenv("SOCKETIO_SHARDS", "256"))
+
+# sids carry the id of the node that hosts them: "<node>.<engine.io id>"
+SID_NODE = re.compile(r"^([0-9a-f]{12})\.")
+
+
+class ShardedRedisManager(socketio.AsyncRedisManager):
+    """
+    AsyncRedisManager that doesn't send every emit to every node.
+
+    Channels, all prefixed with `channel`:
+      <channel>                 broadcasts (no room, or a list of rooms) and
+                                anything that can't be routed; every node
+      <channel>:node:<node>     emits / disconnects / room changes aimed at
+                                one of that node's sids, and callbacks
+      <channel>:shard:<n>       emits to named rooms, and close_room
+
+    A node subscribes to the base channel, its own node channel and the
+    shards of the rooms that have members on it, updated as clients enter
+    and leave rooms. Its inbound traffic follows the rooms it hosts, not the
+    size of the cluster. Emits to a sid on this node never leave the node.
+
+    Every node in a cluster must use this manager with the same channel
+    and SOCKETIO_SHARDS; it doesn't interoperate with AsyncRedisManager.
+
+    It overrides python-socketio internals (publish / listen loops, room
+    bookkeeping, the _handle_* methods); requirements.txt pins the tested
+    release and tests/test_socketio_internals.py fails if they change.
+    """
+
+    def __init__(self, url="redis://localhost:6379/0", channel="socketio", shards=SOCKETIO_SHARDS, **kwargs):
+        super().__init__(url, channel, **kwargs)
+        self.shards = shards
+        self.node = self.host_id[:12]
+        self.node_channel = f"{channel}:node:{self.node}"
+
+        self.local = {}         # shard channel -> {(namespace, room)} with members here
+        self.subscribed = set() # shard channels the listener is subscribed to
+        self.dirty = False
+        self.listener = None    # the listening PubSub (publishing may reconnect self.pubsub)
+        self.subscribing = asyncio.Lock()
+
+        self.stats = {"published": 0, "received": 0, "received_bytes": 0, "shards": 0, "local_rooms": 0}
+
+    # ---------------------------------------------------
+    # Routing
+    # ---------------------------------------------------
+    def room_channel(self, namespace, room):
+        if not self.shards:
+            return f"{self.channel}:room:{namespace}:{room}"
+        shard = zlib.crc32(f"{namespace}\0{room}".encode()) % self.shards
+        return f"{self.channel}:shard:{shard}"
+
+    def node_of(self, sid):
+        match = SID_NODE.match(sid) if isinstance(sid, str) else None
+        return match and match.group(1)
+
+    def route(self, message):
+        method = message["method"]
+
+        if method == "callback":
+            return f"{self.channel}:node:{message['host_id'][:12]}"
+
+        if method in ("disconnect", "enter_room", "leave_room"):
+            node = self.node_of(message["sid"])
+            return f"{self.channel}:node:{node}" if node else self.channel
+
+        room = message.get("room")
+        if room is None or not isinstance(room, str):
+            return self.channel
+
+        node = self.node_of(room)
+        if node:
+            return f"{self.channel}:node:{node}"
+        return self.room_channel(message["namespace"], room)
+
+    async def _publish(self, data):
+        channel = self.route(data)
+        if channel == self.node_channel:
+            return   # already handled on this node
+
+        for retries_left in range(1, -1, -1):
+            try:
+                if not self.connected:
+                    self._redis_connect()
+                self.stats["published"] += 1
+                return await self.redis.publish(channel, self.json.dumps(data))
+            except Exception as e:
+                if retries_left > 0:
+                    log.error("publish_failed", channel=channel, error=str(e), retrying=True)
+                    self.connected = False
+                else:
+                    log.error("publish_failed", channel=channel, error=str(e), retrying=False)
+
+    # ---------------------------------------------------
+    # Local rooms -> shard subscriptions
+    # ---------------------------------------------------
+    async def connect(self, eio_sid, namespace):
+        # BaseManager.connect, with a sid that names this node
+        sid = f"{self.node}.{self.server.eio.generate_id()}"
+        try:
+            self.basic_enter_room(sid, namespace, None, eio_sid=eio_sid)
+        except ValueDuplicationError:
+            return None
+        self.basic_enter_room(sid, namespace, sid, eio_sid=eio_sid)
+        return sid
+
+    def basic_enter_room(self, sid, namespace, room, eio_sid=None):
+        super().basic_enter_room(sid, namespace, room, eio_sid=eio_sid)
+        # the all-clients room (None) and sid rooms go over the base / node channels
+        if room is not None and room != sid:
+            rooms = self.local.setdefault(self.room_channel(namespace, room), set())
+            if not rooms:
+                self.dirty = True
+            if (namespace, room) not in rooms:
+                rooms.add((namespace, room))
+                self.stats["local_rooms"] += 1
+
+    def basic_leave_room(self, sid, namespace, room):
+        super().basic_leave_room(sid, namespace, room)
+        if room is not None and room != sid and room not in self.rooms.get(namespace, {}):
+            channel = self.room_channel(namespace, room)
+            rooms = self.local.get(channel)
+            if rooms and (namespace, room) in rooms:
+                rooms.discard((namespace, room))
+                self.stats["local_rooms"] -= 1
+                if not rooms:
+                    del self.local[channel]
+                    self.dirty = True
+
+    async def enter_room(self, sid, namespace, room, eio_sid=None):
+        await super().enter_room(sid, namespace, room, eio_sid=eio_sid)
+        # subscribed before returning: emits to the room from now on reach us
+        await self.sync_subscriptions()
+
+    async def leave_room(self, sid, namespace, room):
+        await super().leave_room(sid, namespace, room)
+        await self.sync_subscriptions()
+
+    async def disconnect(self, sid, namespace, **kwargs):
+        await super().disconnect(sid, namespace, **kwargs)
+        await self.sync_subscriptions()
+
+    async def close_room(self, room, namespace=None):
+        await super().close_room(room, namespace)
+        await self.sync_subscriptions()
+
+    async def _handle_enter_room(self, message):
+        await super()._handle_enter_room(message)
+        await self.sync_subscriptions()
+
+    async def _handle_leave_room(self, message):
+        await super()._handle_leave_room(message)
+        await self.sync_subscriptions()
+
+    async def _handle_close_room(self, message):
+        await super()._handle_close_room(message)
+        await self.sync_subscriptions()
+
+    async def sync_subscriptions(self):
+        """
+        SUBSCRIBE / UNSUBSCRIBE the shards whose local room set became
+        (non-)empty. Only sends the commands; the listener reads the replies.
+        """
+        if not self.dirty or self.listener is None:
+            return
+
+        async with self.subscribing:
+            while self.dirty:
+                self.dirty = False
+                want = set(self.local)
+                subscribe = want - self.subscribed
+                unsubscribe = self.subscribed - want
+                try:
+                    if subscribe:
+                        await self.listener.subscribe(*subscribe)
+                    if unsubscribe:
+                        await self.listener.unsubscribe(*unsubscribe)
+                except Exception as e:
+                    # the listener reconnects and subscribes to everything again
+                    log.error("subscribe_failed", error=str(e))
+                    self.dirty = True
+                    return
+                self.subscribed = (self.subscribed | subscribe) - unsubscribe
+                self.stats["shards"] = len(self.subscribed)
+
+    # ---------------------------------------------------
+    # Listening
+    # ---------------------------------------------------
+    async def _redis_listen_with_retries(self):
+        retry_sleep = 1
+        connected = False
+        while True:
+            try:
+                if not connected:
+                    self._redis_connect()
+                    self.listener = self.pubsub
+                    self.subscribed = set()
+                    self.dirty = True
+                    await self.listener.subscribe(self.channel, self.node_channel)
+                    await self.sync_subscriptions()
+                    connected = True
+                    retry_sleep = 1
+                async for message in self.listener.listen():
+                    yield message
+            except Exception as e:
+                log.error("listen_failed", error=str(e), retry_in=retry_sleep)
+                self.listener = None
+                connected = False
+                await asyncio.sleep(retry_sleep)
+                retry_sleep = min(retry_sleep * 2, 60)
+
+    async def _listen(self):
+        async for message in self._redis_listen_with_retries():
+            if message["type"] == "message" and "data" in message:
+                self.stats["received"] += 1
+                self.stats["received_bytes"] += len(message["data"])
+                yield message["data"]
@@ -0,0 +1,224 @@
+import os
+import time
+
+from redis.exceptions import RedisError
+
+from redis_client import redis_client
+from logs import get_logger
+
+log = get_logger("rate_limit")
+
+# Tokens per second and bucket size for each scope; rate 0 turns a scope off
+RATE_USER_PER_SEC = float(os.getenv("RATE_USER_PER_SEC", "1"))
+RATE_USER_BURST = float(os.getenv("RATE_USER_BURST", "5"))
+RATE_ROOM_PER_SEC = float(os.getenv("RATE_ROOM_PER_SEC", "20"))
+RATE_ROOM_BURST = float(os.getenv("RATE_ROOM_BURST", "40"))
+# Cluster-wide cap, off unless configured: every message would touch it
+RATE_GLOBAL_PER_SEC = float(os.getenv("RATE_GLOBAL_PER_SEC", "0"))
+RATE_GLOBAL_BURST = float(os.getenv("RATE_GLOBAL_BURST", "1000"))
+# Rooms without a room bucket (only the per-user limit applies). Every
+# socket joins "global", so a room cap there would throttle the main room
+# and make its bucket the hottest key in Redis.
+RATE_ROOM_EXEMPT = {room for room in os.getenv("RATE_ROOM_EXEMPT", "global").split(",") if room}
+
+# Local bookkeeping is dropped for idle users once it gets this big
+RATE_LOCAL_MAX_ENTRIES = int(os.getenv("RATE_LOCAL_MAX_ENTRIES", "10000"))
+# A Redis call takes up to this many tokens from the sender's own user bucket
+# and spends the extra ones locally, so a user chatting in exempt rooms only
+# reaches Redis every few messages. Room and global buckets are shared, so
+# they never give more than the one token a message needs. Unspent user
+# tokens are dropped after RATE_LEASE_SECONDS.
+RATE_LEASE_SIZE = int(os.getenv("RATE_LEASE_SIZE", "3"))
+RATE_LEASE_SECONDS = float(os.getenv("RATE_LEASE_SECONDS", "5"))
+
+
+# Token bucket per key (a hash of tokens + last refill time). A message
+# needs one token from *every* bucket; tokens are only taken when all of
+# them have one, so a message rejected by the room bucket doesn't cost the
+# user anything. Each key comes with (rate, burst, want): a bucket gives
+# up to `want` tokens, as many as it has. Returns {granted by the first
+# key, wait}: wait is the seconds until a token would be available when
+# nothing was taken. The clock is Redis' own, so skew between nodes can't
+# corrupt a bucket.
+TOKEN_BUCKET_SCRIPT = """
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local tokens = {}
+local grants = {}
+local wait = 0
+
+for i = 1, #KEYS do
+    local rate = tonumber(ARGV[3 * i - 2])
+    local burst = tonumber(ARGV[3 * i - 1])
+    local want = tonumber(ARGV[3 * i])
+    local h = redis.call('HMGET', KEYS[i], 'tokens', 'ts')
+    local t = tonumber(h[1]) or burst
+    local ts = tonumber(h[2]) or now
+
+    t = math.min(burst, t + math.max(0, now - ts) * rate)
+    tokens[i] = t
+    grants[i] = math.min(want, math.floor(t))
+    if t < 1 then
+        wait = math.max(wait, (1 - t) / rate)
+    end
+end
+
+if wait > 0 then
+    return {'0', tostring(wait)}
+end
+
+for i = 1, #KEYS do
+    local rate = tonumber(ARGV[3 * i - 2])
+    local burst = tonumber(ARGV[3 * i - 1])
+    redis.call('HSET', KEYS[i], 'tokens', tokens[i] - grants[i], 'ts', now)
+    redis.call('PEXPIRE', KEYS[i], math.ceil(burst / rate * 1000))
+end
+
+return {tostring(grants[1]), '0'}
+"""
+
+
+class RateLimiter:
+    """
+    Token-bucket limits on chat_message per user, per room and overall,
+    shared by every node through one Lua call.
+
+    The Lua call leases a few tokens at a time from the user's own bucket,
+    and later messages from that user spend them locally; a message to a
+    room with a room (or global) bucket still takes its one token there
+    from Redis. In front of that sits an in-process leaky bucket per user
+    (same rate and size as the user bucket) and a memo of recent Redis
+    rejections, so a client that floods is turned away locally and its
+    excess messages never reach Redis, the ML service or Postgres.
+    """
+
+    def __init__(self, redis=redis_client,
+                 user=(RATE_USER_PER_SEC, RATE_USER_BURST),
+                 room=(RATE_ROOM_PER_SEC, RATE_ROOM_BURST),
+                 overall=(RATE_GLOBAL_PER_SEC, RATE_GLOBAL_BURST),
+                 room_exempt=RATE_ROOM_EXEMPT,
+                 lease_size=RATE_LEASE_SIZE,
+                 lease_seconds=RATE_LEASE_SECONDS):
+        self.redis = redis
+        self.user = user
+        self.room = room
+        self.overall = overall
+        self.room_exempt = room_exempt
+        self.lease_size = max(1, lease_size)
+        self.lease_seconds = lease_seconds
+        self.script = redis.register_script(TOKEN_BUCKET_SCRIPT)
+
+        self.levels = {}         # user -> (water level, last update)
+        self.blocked_until = {}  # (user, room) -> time Redis said to come back
+        self.leases = {}         # user -> (user-bucket tokens left, expiry)
+
+        self.stats = {
+            "allowed": 0,
+            "allowed_leased": 0,
+            "limited_local": 0,
+            "limited_redis": 0,
+            "redis_calls": 0
+        }
+
+    async def check(self, user, room):
+        """Return 0 if the message may go through, else the retry-after in seconds."""
+        now = time.monotonic()
+
+        retry_after = max(0.0, self.blocked_until.get((user, room), 0) - now)
+        if not retry_after:
+            retry_after = self._leak(user, now)
+
+        if retry_after:
+            self.stats["limited_local"] += 1
+            return retry_after
+
+        leased = self._has_lease(user, now)
+        retry_after = await self._take(user, room, leased, now)
+        if retry_after:
+            # Redis turned it away: the local bucket shouldn't charge it too
+            if user in self.levels:
+                level, last = self.levels[user]
+                self.levels[user] = (max(0.0, level - 1), last)
+            self.stats["limited_redis"] += 1
+            self.blocked_until[(user, room)] = now + retry_after
+            return retry_after
+
+        if leased:
+            self._spend_lease(user)
+            self.stats["allowed_leased"] += 1
+
+        self.stats["allowed"] += 1
+        return 0
+
+    def _has_lease(self, user, now):
+        lease = self.leases.get(user)
+        if lease is not None and lease[1] <= now:
+            del self.leases[user]
+            return False
+        return lease is not None
+
+    def _spend_lease(self, user):
+        left, expires = self.leases[user]
+        if left > 1:
+            self.leases[user] = (left - 1, expires)
+        else:
+            del self.leases[user]
+
+    def _leak(self, user, now):
+        rate, capacity = self.user
+        if not rate:
+            return 0
+
+        level, last = self.levels.get(user, (0.0, now))
+        level = max(0.0, level - (now - last) * rate)
+
+        if level + 1 > capacity:
+            self.levels[user] = (level, now)
+            return (level + 1 - capacity) / rate
+
+        self.levels[user] = (level + 1, now)
+
+        if len(self.levels) > RATE_LOCAL_MAX_ENTRIES:
+            self._prune(now)
+        return 0
+
+    def _prune(self, now):
+        rate = self.user[0]
+        self.levels = {u: (lvl, t) for u, (lvl, t) in self.levels.items() if lvl - (now - t) * rate > 0}
+        self.blocked_until = {k: t for k, t in self.blocked_until.items() if t > now}
+        self.leases = {u: lease for u, lease in self.leases.items() if lease[1] > now}
+
+    async def _take(self, user, room, leased, now):
+        """
+        Take this message's tokens from Redis and return the retry-after
+        (0 when allowed). With a lease the user bucket is skipped; without
+        one it is asked for a new lease.
+        """
+        keys, args = [], []
+        for key, (rate, burst), want in [
+            (f"rate:user:{user}", (0, 0) if leased else self.user, self.lease_size),
+            (f"rate:room:{room}", (0, 0) if room in self.room_exempt else self.room, 1),
+            ("rate:global", self.overall, 1)
+        ]:
+            if rate:
+                keys.append(key)
+                args += [rate, burst, want]
+
+        if not keys:
+            return 0
+
+        self.stats["redis_calls"] += 1
+        try:
+            granted, wait = await self.script(keys=keys, args=args)
+        except RedisError as e:
+            # fail open: a Redis hiccup shouldn't stop the chat
+            log.warning("rate_limit_check_failed", error=str(e))
+            return 0
+
+        # the user bucket, when asked, is the first key
+        if not leased and self.user[0] and int(granted) > 1:
+            self.leases[user] = (int(granted) - 1, now + self.lease_seconds)
+        return float(wait)
+
+
+rate_limiter = RateLimiter()
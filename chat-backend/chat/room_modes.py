@@ -0,0 +1,35 @@
+import os
+import time
+
+from redis_client import redis_client
+
+# Rooms (socket room names, e.g. "room_3") that broadcast before moderation
+OPTIMISTIC_ROOMS_KEY = "optimistic_rooms"
+DEFAULT_OPTIMISTIC_ROOMS = {r for r in os.getenv("OPTIMISTIC_ROOMS", "").split(",") if r}
+OPTIMISTIC_REFRESH_SECONDS = float(os.getenv("OPTIMISTIC_REFRESH_SECONDS", "5"))
+
+# Local copy of the Redis set so the hot path doesn't need a round-trip
+optimistic_rooms = set(DEFAULT_OPTIMISTIC_ROOMS)
+loaded_at = 0.0
+
+
+async def is_optimistic(room):
+    global optimistic_rooms, loaded_at
+
+    if time.monotonic() - loaded_at > OPTIMISTIC_REFRESH_SECONDS:
+        optimistic_rooms = DEFAULT_OPTIMISTIC_ROOMS | await redis_client.smembers(OPTIMISTIC_ROOMS_KEY)
+        loaded_at = time.monotonic()
+
+    return room in optimistic_rooms
+
+
+async def set_optimistic(room, enabled):
+    global loaded_at
+
+    if enabled:
+        await redis_client.sadd(OPTIMISTIC_ROOMS_KEY, room)
+    else:
+        await redis_client.srem(OPTIMISTIC_ROOMS_KEY, room)
+
+    # force a reload on this node; other nodes pick it up on their next refresh
+    loaded_at = 0.0
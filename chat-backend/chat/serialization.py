@@ -0,0 +1,130 @@
+import json
+import os
+from urllib.parse import parse_qs
+
+import msgpack
+import socketio
+from engineio import packet as eio_packet
+from socketio import packet
+
+# Per-connection msgpack for clients that ask for it. Off by default: it
+# costs more CPU than it saves in bytes for the chat's small text events
+# (see the README and benchmarks/bench_serialization.py).
+MSGPACK_CLIENTS = os.getenv("SOCKETIO_MSGPACK_CLIENTS", "false").lower() == "true"
+
+# What this node publishes on the Redis manager channel: "json" (what
+# AsyncRedisManager sends) or "msgpack". Every node reads both, so the
+# channel can be switched one node at a time.
+CHANNEL_CODEC = os.getenv("SOCKETIO_CHANNEL_CODEC", "json")
+
+
+class ChannelCodec:
+    """
+    Stands in for the `json` module of the pub/sub client manager, which
+    only calls dumps() on publish and loads() on receive.
+    """
+
+    def __init__(self, codec=CHANNEL_CODEC):
+        self.codec = codec
+
+    def dumps(self, message):
+        if self.codec == "msgpack":
+            return msgpack.packb(message)
+        return json.dumps(message)
+
+    def loads(self, data):
+        # a JSON message is an object, so it starts with "{"; a msgpack
+        # map never does (0x80-0x8f, 0xde or 0xdf)
+        if isinstance(data, str) or data[:1] == b"{":
+            return json.loads(data)
+        return msgpack.unpackb(data)
+
+
+class EncodedPacket(str):
+    """
+    The JSON text of a packet, which also produces (once, on first use)
+    the Engine.IO packet carrying its msgpack encoding. A room fan-out
+    encodes once per format no matter how many members use each.
+    """
+
+    def msgpack_eio(self):
+        if self.eio is None:
+            self.eio = eio_packet.Packet(eio_packet.MESSAGE, msgpack.packb(self.packet._to_dict()))
+        return self.eio
+
+
+class NegotiatedPacket(packet.Packet):
+    """
+    JSON packet (the default Socket.IO parser) that decodes msgpack frames
+    too: text frames only come from JSON clients and binary frames that
+    aren't attachments only from msgpack clients.
+    """
+
+    def encode(self):
+        encoded = super().encode()
+        if isinstance(encoded, list):
+            # binary attachments (not used by the chat events) stay JSON-only
+            return encoded
+        encoded = EncodedPacket(encoded)
+        encoded.packet = self
+        encoded.eio = None
+        return encoded
+
+    def decode(self, encoded_packet):
+        if isinstance(encoded_packet, str):
+            return super().decode(encoded_packet)
+
+        decoded = msgpack.unpackb(encoded_packet)
+        self.packet_type = decoded["type"]
+        self.data = decoded.get("data")
+        self.id = decoded.get("id")
+        self.namespace = decoded["nsp"]
+
+
+class NegotiatingServer(socketio.AsyncServer):
+    """
+    Socket.IO server that speaks msgpack to the clients that ask for it
+    (`?serializer=msgpack` on the connection URL, with the client using
+    socket.io-msgpack-parser) and JSON to everyone else.
+
+    With `msgpack` off (the default) it is the stock JSON server: the
+    stock packet class is used and every client stays on JSON.
+
+    The overrides below are python-socketio internals; requirements.txt
+    pins the tested release and tests/test_socketio_internals.py fails if
+    their signatures change.
+    """
+
+    def __init__(self, *args, msgpack=MSGPACK_CLIENTS, **kwargs):
+        if msgpack:
+            kwargs["serializer"] = NegotiatedPacket
+        super().__init__(*args, **kwargs)
+        self.msgpack = msgpack
+        self.msgpack_clients = set()   # eio sids
+        self.stats = {"msgpack_clients": 0}
+
+    async def _handle_eio_connect(self, eio_sid, environ):
+        query = parse_qs(environ.get("QUERY_STRING", ""))
+        if self.msgpack and query.get("serializer") == ["msgpack"]:
+            self.msgpack_clients.add(eio_sid)
+            self.stats["msgpack_clients"] = len(self.msgpack_clients)
+        return await super()._handle_eio_connect(eio_sid, environ)
+
+    async def _handle_eio_disconnect(self, eio_sid, reason):
+        try:
+            return await super()._handle_eio_disconnect(eio_sid, reason)
+        finally:
+            self.msgpack_clients.discard(eio_sid)
+            self.stats["msgpack_clients"] = len(self.msgpack_clients)
+
+    async def _send_packet(self, eio_sid, pkt):
+        # one recipient (acks, connect, emits to a sid)
+        if eio_sid in self.msgpack_clients:
+            return await self.eio.send(eio_sid, msgpack.packb(pkt._to_dict()))
+        return await super()._send_packet(eio_sid, pkt)
+
+    async def _send_eio_packet(self, eio_sid, eio_pkt):
+        # room fan-out: the manager encoded the packet once, as JSON
+        if eio_sid in self.msgpack_clients and isinstance(eio_pkt.data, EncodedPacket):
+            eio_pkt = eio_pkt.data.msgpack_eio()
+        return await super()._send_eio_packet(eio_sid, eio_pkt)
@@ -1,25 +1,54 @@
+import asyncio
 import os
-import socketio
+import time
+import uuid
+from urllib.parse import quote, unquote
+import httpx
 from auth.jwt import decode_token
-from moderation.pipeline import moderate_message
-
-from redis_client import redis_client
-from db import SessionLocal
-from models.message import Message
-from sqlalchemy.future import select
-from models.room_member import RoomMember
-from models.room import Room
-
-
-# 🔥 Redis-backed Socket.IO server (scalable)
-sio = socketio.AsyncServer(
+from moderation.pipeline import moderate_message, precheck
+from moderation.ml_client import retry_after as ml_retry_after
+from chat.room_modes import is_optimistic
+from chat.message_writer import message_writer
+from chat.memberships import get_user_rooms
+from chat.history import room_chat_id
+from chat.presence import presence
+from chat.typing import typing_tracker
+from chat.rate_limit import rate_limiter
+from chat.serialization import ChannelCodec, NegotiatingServer
+from chat.pubsub import ShardedRedisManager
+from metrics import MESSAGES, observe
+from logs import get_logger
+
+log = get_logger("sockets")
+
+
+class TimedRedisManager(ShardedRedisManager):
+    # every emit (incl. presence / typing ticks) is at most one Redis publish
+    async def emit(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await super().emit(*args, **kwargs)
+        finally:
+            observe("emit", started)
+
+    def initialize(self):
+        super().initialize()
+        # after super(), which sets the server's JSON module here
+        self.json = ChannelCodec()
+
+
+# 🔥 Redis-backed Socket.IO server (scalable); msgpack clients opt-in (SOCKETIO_MSGPACK_CLIENTS)
+sio = NegotiatingServer(
     cors_allowed_origins="*",
     async_mode="asgi",
-    client_manager=socketio.AsyncRedisManager(os.getenv("REDIS_URL"),"redis://localhost:6379")
+    client_manager=TimedRedisManager(os.getenv("REDIS_URL", "redis://localhost:6379"))
 )
 
 # Local sid -> user mapping
-connected_users = {}   # sid -> {"email": str, "user_id": int}
+connected_users = {}   # sid -> {"email": str, "user_id": int, "presence_rooms": [str]}
+
+# Keep references to in-flight optimistic moderation tasks
+background_tasks = set()
 
 
 # ---------------------------------------------------
@@ -28,8 +57,10 @@ connected_users = {}   # sid -> {"email": str, "user_id": int}
 @sio.event
 async def connect(sid, environ, auth):
     try:
+        started = time.perf_counter()
         token = auth.get("token")
         payload = decode_token(token)
+        observe("auth", started)
 
         user_email = payload["sub"]
         user_id = payload["user_id"]
@@ -40,53 +71,87 @@ async def connect(sid, environ, auth):
             "user_id": user_id
         }
 
-        # Mark user online
-        await redis_client.sadd("online_users", user_email)
-
-        users = await redis_client.smembers("online_users")
-        users = [u.decode() if isinstance(u, bytes) else u for u in users]
-
-        await sio.emit("online_users", users)
+        # 🔥 Auto join all persistent rooms (cached, DB only on a miss)
+        started = time.perf_counter()
+        rooms = await get_user_rooms(user_id)
+        observe("memberships", started)
 
-        # 🔥 Auto join all persistent rooms from DB
-        async with SessionLocal() as db:
-            result = await db.execute(
-                select(Room)
-                .join(RoomMember)
-                .where(RoomMember.user_id == user_id)
-            )
-
-            rooms = result.scalars().all()
-
-            for room in rooms:
-                await sio.enter_room(sid, f"room_{room.id}")
-                print(f"👥 {user_email} auto-joined room_{room.id}")
+        for room in rooms:
+            await sio.enter_room(sid, f"room_{room['id']}")
 
         # Always join global
         await sio.enter_room(sid, "global")
 
-        print(f"🟢 Connected: {user_email}")
+        # 🟢 Mark user online in each of their rooms (sent as batched deltas)
+        presence_rooms = ["global"] + [f"room_{room['id']}" for room in rooms]
+        connected_users[sid]["presence_rooms"] = presence_rooms
+        await presence.connected(user_email, presence_rooms)
+
+        log.event("connected", user=user_email, rooms=len(rooms))
 
     except Exception as e:
-        print("❌ Connection rejected:", e)
+        log.warning("connection_rejected", error=str(e))
         return False
 
 
+# ---------------------------------------------------
+# 🟢 PRESENCE SNAPSHOT — full online list, on request
+# ---------------------------------------------------
+@sio.event
+async def presence_snapshot(sid, data):
+    room = (data or {}).get("room", "global")
+
+    if room not in sio.rooms(sid):
+        return {"room": room, "users": []}
+
+    return {"room": room, "users": await presence.snapshot(room)}
+
+
 # ---------------------------------------------------
 # 👥 JOIN ROOM
 # ---------------------------------------------------
+async def may_join(user, room):
+    # "global" for everyone, room_<id> only for its members, private_<a>_<b>
+    # only for a and b; nothing else (ad-hoc names, other sockets' sid rooms)
+    if room == "global":
+        return True
+    if room.startswith("room_"):
+        chat_id = room_chat_id(room)
+        return chat_id is not None and chat_id in {r["id"] for r in await get_user_rooms(user["user_id"])}
+    if room.startswith("private_"):
+        return user["email"] in private_room_members(room)
+    return False
+
+
 @sio.event
 async def join_room(sid, data):
     room = data["room"]
     user = connected_users.get(sid)
 
+    if not user or not await may_join(user, room):
+        return
+
     await sio.enter_room(sid, room)
+    await presence_enter(user, room)
 
     await sio.emit("system", {
         "message": f"{user['email']} joined the room"
     }, room=room)
 
 
+async def presence_enter(user, room):
+    # online in rooms joined after connect too; disconnect() leaves them all
+    if room not in user["presence_rooms"]:
+        user["presence_rooms"].append(room)
+        await presence.connected(user["email"], [room])
+
+
+async def presence_leave(user, room):
+    if room in user["presence_rooms"]:
+        user["presence_rooms"].remove(room)
+        await presence.disconnected(user["email"], [room])
+
+
 # ---------------------------------------------------
 # 👋 LEAVE ROOM
 # ---------------------------------------------------
@@ -95,7 +160,11 @@ async def leave_room(sid, data):
     room = data["room"]
     user = connected_users.get(sid)
 
+    if not user:
+        return
+
     await sio.leave_room(sid, room)
+    await presence_leave(user, room)
 
     await sio.emit("system", {
         "message": f"{user['email']} left the room"
@@ -106,8 +175,19 @@ async def leave_room(sid, data):
 # 🔐 PRIVATE ROOM CREATION
 # ---------------------------------------------------
 def private_room(user1: str, user2: str):
+    # "_" only separates the two emails: one inside an email is escaped,
+    # so "private_a_b@x.com_c@x.com" can't be read as another pair's room
     users = sorted([user1, user2])
-    return f"private_{users[0]}_{users[1]}"
+    return "private_" + "_".join(quote(u, safe="@.+-").replace("_", "%5F") for u in users)
+
+
+def private_room_members(room):
+    # the two emails a private room belongs to; () for a malformed name
+    parts = room[len("private_"):].split("_")
+    if len(parts) != 2:
+        return ()
+    users = tuple(unquote(p) for p in parts)
+    return users if private_room(*users) == room else ()
 
 
 @sio.event
@@ -118,13 +198,14 @@ async def start_private_chat(sid, data):
     room = private_room(user["email"], target)
 
     await sio.enter_room(sid, room)
+    await presence_enter(user, room)
 
     await sio.emit("private_room_created", {
         "room": room,
         "with": target
     }, to=sid)
 
-    print(f"🔐 Private room created: {room}")
+    log.event("private_room_created", room=room)
 
 
 # ---------------------------------------------------
@@ -134,9 +215,11 @@ async def start_private_chat(sid, data):
 async def typing(sid, data):
     user = connected_users.get(sid)
 
-    await sio.emit("typing", {
-        "user": user["email"]
-    }, room=data["room"], skip_sid=sid)
+    if not user or data["room"] not in sio.rooms(sid):
+        return
+
+    # coalesced; typing_users goes out once per tick per room
+    await typing_tracker.typing(data["room"], user["email"])
 
 
 # ---------------------------------------------------
@@ -147,46 +230,88 @@ async def chat_message(sid, data):
     """
     data = {
         room: "global" | "room_1" | "private_x_y",
-        message: "hello",
-        chat_id: 1
+        message: "hello"
     }
+    The message is stored under the room it was sent to (room_chat_id),
+    which the sender must be in.
     """
 
     user = connected_users.get(sid)
 
-    if not user:
+    if not user or data.get("room") not in sio.rooms(sid):
         return
 
-    # 🔹 Run ML moderation
-    result = await moderate_message({
-        "user": user["email"],
-        "message": data["message"]
-    })
-
-    # 🔹 If BLOCKED
-    if result["status"] == "blocked":
-        await sio.emit("moderation_notice", {
-            "message": "‼️ Your message was blocked due to toxic content",
-            "toxicity": result["toxicity"]
+    started = time.perf_counter()
+    try:
+        await handle_chat_message(sid, user, data)
+    finally:
+        observe("chat_message", started)
+
+
+async def handle_chat_message(sid, user, data):
+    # 🔹 Rate limit before spending an ML call / DB write on it
+    started = time.perf_counter()
+    retry_after = await rate_limiter.check(user["email"], data["room"])
+    observe("rate_limit", started)
+
+    if retry_after:
+        MESSAGES.labels("rate_limited").inc()
+        await sio.emit("rate_limited", {
+            "room": data["room"],
+            "retry_after": round(retry_after, 2)
         }, to=sid)
+        return
+
+    await typing_tracker.stopped(data["room"], user["email"])
+
+    # 🔹 Local pre-check (no network)
+    started = time.perf_counter()
+    local = precheck(data["message"])
+    observe("precheck", started)
+
+    # 🔹 Optimistic rooms: broadcast now, moderate in the background
+    if local is None and await is_optimistic(data["room"]):
+        message_id = uuid.uuid4().hex
+        MESSAGES.labels("pending").inc()
+
+        await sio.emit("new_message", {
+            "id": message_id,
+            "user": user["email"],
+            "message": data["message"],
+            "toxicity": None,
+            "status": "pending",
+            "moderated_text": None
+        }, room=data["room"])
+
+        task = asyncio.create_task(moderate_optimistic(sid, user, data, message_id))
+        background_tasks.add(task)
+        task.add_done_callback(background_tasks.discard)
+        return
 
-        await sio.emit("toxicity_update", {
-            "toxicity": result["toxicity"]
+    # 🔹 Run ML moderation
+    try:
+        result = await moderate_message({
+            "user": user["email"],
+            "message": data["message"]
+        }, local)
+    except httpx.HTTPError as e:
+        # ml-service down, warming up (503) or timing out: nothing was
+        # stored or broadcast, so tell the sender to resend
+        log.warning("moderation_unavailable", error=str(e))
+        MESSAGES.labels("moderation_unavailable").inc()
+        await sio.emit("moderation_unavailable", {
+            "room": data["room"],
+            "retry_after": round(ml_retry_after(e), 2)
         }, to=sid)
+        return
 
+    # 🔹 If BLOCKED
+    if result["status"] == "blocked":
+        await notify_blocked(sid, result)
         return
 
     # 🔹 Save message
-    async with SessionLocal() as db:
-        msg = Message(
-            chat_id=data.get("chat_id", 1),
-            user_id=user["user_id"],
-            content=result["message"],
-            toxicity=result["toxicity"],
-            status=result["status"]
-        )
-        db.add(msg)
-        await db.commit()
+    await save_message(user, data, result)
 
     # 🔹 Update toxicity meter
     await sio.emit("toxicity_update", {
@@ -203,20 +328,100 @@ async def chat_message(sid, data):
     }, room=data["room"])
 
 
+async def moderate_optimistic(sid, user, data, message_id):
+    """
+    Moderation for a message that was already broadcast. Clients replace
+    the pending message using the follow-up event for message_id; if any
+    step up to that event fails it is retracted, so it never stays "pending".
+    """
+    try:
+        result = await settle_optimistic(sid, user, data, message_id)
+    except Exception as e:
+        # can't vouch for it (or couldn't save it) -> take it back down
+        log.error("optimistic_moderation_failed", error=str(e))
+        try:
+            await sio.emit("message_retracted", {"id": message_id}, room=data["room"])
+        except Exception as e:
+            log.error("optimistic_retract_failed", error=str(e))
+        return
+
+    if result["status"] == "blocked":
+        return
+
+    await sio.emit("toxicity_update", {
+        "toxicity": result["toxicity"]
+    }, to=sid)
+
+
+async def settle_optimistic(sid, user, data, message_id):
+    result = await moderate_message({
+        "user": user["email"],
+        "message": data["message"]
+    })
+
+    # 🔹 If BLOCKED -> retract from everyone
+    if result["status"] == "blocked":
+        await sio.emit("message_retracted", {
+            "id": message_id
+        }, room=data["room"])
+
+        await notify_blocked(sid, result)
+        return result
+
+    await save_message(user, data, result)
+
+    # 🔹 If CENSORED -> replace text on clients
+    if result["status"] == "censored":
+        await sio.emit("message_censored", {
+            "id": message_id,
+            "toxicity": result["toxicity"],
+            "moderated_text": result["moderated_text"]
+        }, room=data["room"])
+        return result
+
+    await sio.emit("message_approved", {
+        "id": message_id,
+        "toxicity": result["toxicity"]
+    }, room=data["room"])
+    return result
+
+
+async def notify_blocked(sid, result):
+    await sio.emit("moderation_notice", {
+        "message": "‼️ Your message was blocked due to toxic content",
+        "toxicity": result["toxicity"]
+    }, to=sid)
+
+    await sio.emit("toxicity_update", {
+        "toxicity": result["toxicity"]
+    }, to=sid)
+
+
+async def save_message(user, data, result):
+    # buffered; written in batches by the message writer
+    await message_writer.enqueue({
+        "user": user["email"],
+        "chat_id": room_chat_id(data["room"]),
+        "user_id": user["user_id"],
+        "content": result["message"],
+        "toxicity": result["toxicity"],
+        "status": result["status"]
+    })
+
+
 # ---------------------------------------------------
 # 🔴 DISCONNECT
 # ---------------------------------------------------
 @sio.event
 async def disconnect(sid):
-    user = connected_users.get(sid)
+    user = connected_users.pop(sid, None)
 
     if user:
-        await redis_client.srem("online_users", user["email"])
-        connected_users.pop(sid, None)
-
-        users = await redis_client.smembers("online_users")
-        users = [u.decode() if isinstance(u, bytes) else u for u in users]
+        rooms = user.get("presence_rooms", ["global"])
+        await presence.disconnected(user["email"], rooms)
 
-        await sio.emit("online_users", users)
+        # closed the tab mid-typing: don't leave them "typing" until the TTL
+        for room in rooms:
+            await typing_tracker.stopped(room, user["email"])
 
-        print(f"🔴 Disconnected: {user['email']}")
+        log.event("disconnected", user=user["email"])
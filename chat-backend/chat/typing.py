@@ -0,0 +1,127 @@
+import asyncio
+import os
+import time
+
+from redis_client import redis_client
+from logs import get_logger
+
+log = get_logger("typing")
+
+# How often each node sends typing_users for the rooms it is tracking
+TYPING_TICK_MS = float(os.getenv("TYPING_TICK_MS", "500"))
+# A user stops "typing" this long after their last keystroke event
+TYPING_TTL_SECONDS = float(os.getenv("TYPING_TTL_SECONDS", "3"))
+# Keystroke events from the same (room, user) inside this window only
+# update local state; Redis is written at most once per window
+TYPING_WINDOW_MS = float(os.getenv("TYPING_WINDOW_MS", "1000"))
+
+
+def typing_key(room):
+    return f"typing:{room}"
+
+
+class TypingTracker:
+    """
+    Coalesced typing indicator.
+
+    Who is typing in a room lives in a Redis sorted set scored by expiry
+    time, shared by every node. Keystroke events only touch that set once
+    per (room, user) per window, and nothing is broadcast per keystroke:
+    once per tick, each node sends one `typing_users` {room, users} event
+    for every room it tracks whose list changed since the last tick.
+    Expired users drop out on the next tick without a "stopped" event.
+    """
+
+    def __init__(self, redis=redis_client, tick_ms=TYPING_TICK_MS,
+                 ttl=TYPING_TTL_SECONDS, window_ms=TYPING_WINDOW_MS):
+        self.redis = redis
+        self.tick = tick_ms / 1000
+        self.ttl = ttl
+        self.window = window_ms / 1000
+        self.emit = None
+        self.task = None
+
+        self.last_write = {}   # (room, user) -> when we last wrote to Redis
+        self.dirty = set()     # rooms touched since the last tick
+        self.sent = {}         # room -> users in the last typing_users sent
+
+        self.stats = {"events": 0, "redis_writes": 0, "emits": 0}
+
+    async def start(self, emit):
+        # emit(event, data, room=...) -- normally sio.emit
+        self.emit = emit
+        if self.task is None:
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    async def typing(self, room, user):
+        self.stats["events"] += 1
+
+        now = time.time()
+        last = self.last_write.get((room, user))
+        if last is not None and now - last < self.window:
+            return
+
+        self.last_write[(room, user)] = now
+        self.stats["redis_writes"] += 1
+        await self.redis.zadd(typing_key(room), {user: now + self.ttl})
+        self.dirty.add(room)
+
+    async def stopped(self, room, user):
+        # sent a message or disconnected: clear right away instead of waiting out the TTL
+        if self.last_write.pop((room, user), None) is None:
+            return
+
+        await self.redis.zrem(typing_key(room), user)
+        self.dirty.add(room)
+
+    async def flush(self):
+        # rooms touched this tick + rooms whose last list still has someone to expire
+        rooms = self.dirty | set(self.sent)
+        self.dirty = set()
+        if not rooms:
+            return
+
+        rooms = list(rooms)
+        now = time.time()
+
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for room in rooms:
+                pipe.zremrangebyscore(typing_key(room), "-inf", now)
+                pipe.zrange(typing_key(room), 0, -1)
+            results = (await pipe.execute())[1::2]
+
+        for room, users in zip(rooms, results):
+            users = sorted(users)
+
+            if users != self.sent.get(room, []):
+                self.stats["emits"] += 1
+                await self.emit("typing_users", {"room": room, "users": users}, room=room)
+
+            if users:
+                self.sent[room] = users
+            else:
+                self.sent.pop(room, None)
+
+        # forget write timestamps that can't suppress anything any more
+        cutoff = now - max(self.window, self.ttl)
+        self.last_write = {k: t for k, t in self.last_write.items() if t > cutoff}
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.tick)
+            try:
+                await self.flush()
+            except Exception as e:
+                log.error("typing_flush_failed", error=str(e))
+
+
+typing_tracker = TypingTracker()
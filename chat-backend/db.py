@@ -15,9 +15,12 @@ connect_args = {}
 if "neon.tech" in DATABASE_URL or "render.com" in DATABASE_URL:
     connect_args = {"ssl": True}
 
+# per-statement SQL logging is slow and noisy; opt in with SQL_ECHO=1
+SQL_ECHO = os.getenv("SQL_ECHO", "0") == "1"
+
 engine = create_async_engine(
     DATABASE_URL,
-    echo=True,
+    echo=SQL_ECHO,
     connect_args=connect_args
 )
 
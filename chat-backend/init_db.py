@@ -1,18 +1,17 @@
-
 import asyncio
-from db import engine, Base
-
-# 🔥 import ALL models so they register with Base
-from models.user import User
-from models.chats import Chat
-from models.message import Message
-from models.room import Room
-from models.room_member import RoomMember
+from db import engine
+from migrations import upgrade
 
 
 async def init():
     async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+        before, after = await conn.run_sync(upgrade)
+    await engine.dispose()
+
+    if before == after:
+        print(f"✅ Database schema up to date (version {after})")
+    else:
+        print(f"✅ Database schema migrated {before} -> {after}")
 
 
 if __name__ == "__main__":
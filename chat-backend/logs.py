@@ -0,0 +1,61 @@
+import json
+import logging
+import os
+import random
+import sys
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# Fraction of per-event info lines (connects, disconnects, ...) that are
+# written; warnings and errors are always written
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "0.1"))
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        line = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "event": record.getMessage(),
+            **getattr(record, "fields", {})
+        }
+        if record.exc_info:
+            line["exc"] = self.formatException(record.exc_info)
+        return json.dumps(line, default=str)
+
+
+handler = logging.StreamHandler(sys.stdout)
+handler.setFormatter(JsonFormatter())
+
+root = logging.getLogger("safechat")
+root.addHandler(handler)
+root.setLevel(LOG_LEVEL)
+root.propagate = False
+
+
+class Logger:
+    """
+    One JSON line per event: log.event("connected", user=...). event() is
+    sampled at LOG_SAMPLE_RATE (the dice roll happens before any
+    formatting); warning() / error() always log.
+    """
+
+    def __init__(self, name, sample_rate=LOG_SAMPLE_RATE):
+        self.logger = root.getChild(name)
+        self.sample_rate = sample_rate
+
+    def event(self, event, **fields):
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return
+        if self.logger.isEnabledFor(logging.INFO):
+            self.logger.info(event, extra={"fields": fields})
+
+    def warning(self, event, **fields):
+        self.logger.warning(event, extra={"fields": fields})
+
+    def error(self, event, **fields):
+        self.logger.error(event, extra={"fields": fields})
+
+
+def get_logger(name):
+    return Logger(name)
@@ -1,20 +1,70 @@
-from fastapi import FastAPI
+import time
+
+from fastapi import Depends, FastAPI, Response
 import socketio
-from chat.sockets import sio
+from chat.sockets import sio, connected_users
+from chat.presence import presence
+from chat.typing import typing_tracker
 from auth.routes import router as auth_router
 from routes.rooms import router as rooms_router
 from fastapi.middleware.cors import CORSMiddleware
 
-from db import engine, Base   # 👈 IMPORTANT: import these
+from db import engine
+from migrations import upgrade
+from moderation.ml_client import start_ml_client, close_ml_client
+from moderation.cache import moderation_cache
+from moderation.prefilter import prefilter
+from moderation.risk import risk_store
+from chat.message_writer import message_writer
+from chat.history import push_history
+from chat.rate_limit import rate_limiter
+from auth.passwords import password_hasher
+from auth.dependencies import require_admin
+import auth.jwt as auth_jwt
+from metrics import stats_collector, pool_stats, render
 
 app = FastAPI()
 
-# 🔥 AUTO-CREATE TABLES ON STARTUP (THIS FIXES YOUR ERROR)
+# flipped by startup / shutdown, reported by /ready
+readiness = {"ready": False, "startup_seconds": None}
+
 @app.on_event("startup")
 async def startup():
+    started = time.perf_counter()
+
+    # 🗄️ Schema migrations: a single version query when already current
     async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
-    print("✅ Database tables ensured")
+        before, after = await conn.run_sync(upgrade)
+    if before == after:
+        print(f"✅ Database schema at version {after}")
+    else:
+        print(f"✅ Database schema migrated {before} -> {after}")
+
+    # 🔌 Long-lived pooled HTTP client for ML moderation calls
+    await start_ml_client()
+
+    # 📝 Write-behind message persistence (replays any journaled rows)
+    message_writer.on_flush.append(push_history)
+    await message_writer.start()
+
+    # 🟢 Batched presence deltas
+    await presence.start(sio.emit)
+
+    # ✍️ Coalesced typing indicator
+    await typing_tracker.start(sio.emit)
+
+    readiness["ready"] = True
+    readiness["startup_seconds"] = round(time.perf_counter() - started, 3)
+
+@app.on_event("shutdown")
+async def shutdown():
+    # stop taking traffic before draining
+    readiness["ready"] = False
+    await presence.stop()
+    await typing_tracker.stop()
+    # flush buffered messages before the process exits
+    await message_writer.stop()
+    await close_ml_client()
 
 # 🌍 CORS (allow Render + Vercel later)
 app.add_middleware(
@@ -40,3 +90,45 @@ app.mount("/socket.io", socketio.ASGIApp(sio))
 @app.get("/")
 async def root():
     return {"status": "chat backend running"}
+
+# ✅ Readiness: 503 until startup (schema, ML client, writers) is done
+@app.get("/ready")
+async def ready(response: Response):
+    if not readiness["ready"]:
+        response.status_code = 503
+    return readiness
+
+# 📈 Prometheus metrics: stage histograms + the components' own counters,
+# which are only read here, at scrape time
+stats_collector.add("moderation_cache", lambda: moderation_cache.stats)
+stats_collector.add("prefilter", lambda: prefilter.stats if prefilter else {})
+stats_collector.add("message_writer", lambda: {
+    **message_writer.stats,
+    "queued": message_writer.queue.qsize() if message_writer.queue else 0
+})
+stats_collector.add("rate_limit", lambda: rate_limiter.stats)
+stats_collector.add("password_hasher", lambda: password_hasher.stats)
+stats_collector.add("jwt_cache", lambda: {**auth_jwt.cache_stats, "size": len(auth_jwt.verified)})
+stats_collector.add("typing", lambda: typing_tracker.stats)
+stats_collector.add("db_pool", lambda: pool_stats(engine))
+stats_collector.add("sockets", lambda: {"connected": len(connected_users), **sio.stats})
+stats_collector.add("pubsub", lambda: sio.manager.stats)
+
+@app.get("/metrics")
+async def metrics():
+    body, content_type = render()
+    return Response(body, media_type=content_type)
+
+# 📊 Moderation fast-path stats (pre-filter + cache + rate limiter)
+@app.get("/moderation/stats", dependencies=[Depends(require_admin)])
+async def moderation_stats():
+    return {
+        "prefilter": prefilter.report() if prefilter else None,
+        "cache": moderation_cache.stats,
+        "rate_limit": rate_limiter.stats
+    }
+
+# ⚠️ Current risk (score, recent toxic messages, thresholds) per user (admins only)
+@app.get("/moderation/risk", dependencies=[Depends(require_admin)])
+async def moderation_risk(users: str):
+    return await risk_store.get_many([u for u in users.split(",") if u])
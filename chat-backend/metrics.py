@@ -0,0 +1,76 @@
+import time
+
+from prometheus_client import Counter, Gauge, Histogram, REGISTRY, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client.core import GaugeMetricFamily
+
+# Hot-path stages; histograms are cheap to observe (a bucket increment),
+# everything else is only computed when /metrics is scraped
+STAGES = [
+    "auth", "memberships", "chat_message", "rate_limit", "precheck",
+    "cache_lookup", "ml_call", "risk", "db_flush", "emit", "password_hash"
+]
+
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+STAGE_SECONDS = Histogram(
+    "safechat_stage_seconds", "Time spent in each hot-path stage", ["stage"], buckets=BUCKETS
+)
+MESSAGES = Counter(
+    "safechat_messages_total", "chat_message outcomes", ["status"]
+)
+ML_IN_FLIGHT = Gauge(
+    "safechat_ml_in_flight", "ML service calls currently waiting for a response"
+)
+
+# resolve label children once, not on every observation
+stage = {name: STAGE_SECONDS.labels(name) for name in STAGES}
+
+
+def observe(name, started):
+    stage[name].observe(time.perf_counter() - started)
+
+
+class StatsCollector:
+    """
+    Exposes the plain `stats` dicts the components already keep (cache,
+    pre-filter, writer, rate limiter, ...) and the DB pool at scrape time,
+    so none of them pays for metrics on the hot path.
+    """
+
+    def __init__(self):
+        self.sources = {}   # name -> fn returning {key: number}
+
+    def add(self, name, fn):
+        self.sources[name] = fn
+
+    def collect(self):
+        for name, fn in self.sources.items():
+            try:
+                stats = fn()
+            except Exception:
+                continue
+
+            family = GaugeMetricFamily(f"safechat_{name}", f"{name} counters", labels=["key"])
+            for key, value in stats.items():
+                if isinstance(value, (int, float)):
+                    family.add_metric([key], value)
+            yield family
+
+
+stats_collector = StatsCollector()
+REGISTRY.register(stats_collector)
+
+
+def pool_stats(engine):
+    # QueuePool counters; pools without them (e.g. SQLite's) report nothing
+    pool = engine.pool
+    stats = {}
+    for key in ("size", "checkedout", "checkedin", "overflow"):
+        fn = getattr(pool, key, None)
+        if fn is not None:
+            stats[key] = fn()
+    return stats
+
+
+def render():
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -0,0 +1,136 @@
+"""
+Schema migrations.
+
+MIGRATIONS upgrade the schema one version at a time; the applied versions
+are recorded in schema_migrations. On boot the app only reads the version
+(one query) and runs whatever is missing, so an up-to-date database costs
+no DDL. `python init_db.py` does the same from the command line.
+
+Each migration describes the schema as it was at that version, never via
+the live models, so replaying them on an empty database always ends up at
+the same place as upgrading an old one.
+"""
+from sqlalchemy import (
+    Boolean, Column, DateTime, Float, ForeignKey, Index, Integer, MetaData, String, Table, inspect, text
+)
+from sqlalchemy.sql import func
+
+VERSION_TABLE = "schema_migrations"
+
+# any constant; serializes concurrent upgrades from several pods (postgres)
+LOCK_ID = 7201
+
+
+def initial_schema(conn):
+    # the tables create_all used to produce, with today's messages index;
+    # checkfirst makes this a no-op on databases that were created that
+    # way, which still carry ix_messages_chat_id (see drop_chat_id_index)
+    meta = MetaData()
+
+    Table(
+        "users", meta,
+        Column("id", Integer, primary_key=True),
+        Column("email", String(255), unique=True, index=True, nullable=False),
+        Column("password_hash", String(255), nullable=False),
+        Column("created_at", DateTime(timezone=True), server_default=func.now()),
+    )
+    Table(
+        "chats", meta,
+        Column("id", Integer, primary_key=True),
+        Column("name", String),
+        Column("is_group", Boolean, default=False),
+    )
+    Table(
+        "rooms", meta,
+        Column("id", Integer, primary_key=True),
+        Column("name", String, index=True),
+        Column("is_private", Boolean, default=False),
+        Column("created_by", Integer, ForeignKey("users.id")),
+        Column("create_at", DateTime(timezone=True), server_default=func.now()),
+    )
+    Table(
+        "room_members", meta,
+        Column("id", Integer, primary_key=True),
+        Column("room_id", Integer, ForeignKey("rooms.id")),
+        Column("user_id", Integer, ForeignKey("users.id")),
+        Index("uq_room_members_user_room", "user_id", "room_id", unique=True),
+    )
+    Table(
+        "messages", meta,
+        Column("id", Integer, primary_key=True),
+        Column("chat_id", Integer),
+        Column("user_id", Integer, ForeignKey("users.id")),
+        Column("content", String),
+        Column("toxicity", Float),
+        Column("status", String),
+        Column("created_at", DateTime(timezone=True), server_default=func.now()),
+        Index("ix_messages_chat_created_id", "chat_id", "created_at", "id"),
+    )
+
+    meta.create_all(conn)
+
+    # create_all skips indexes on tables that already exist
+    for table in meta.sorted_tables:
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+
+
+def drop_chat_id_index(conn):
+    # create_all-era databases have it; ix_messages_chat_created_id covers
+    # the same lookups, so it only costs writes
+    conn.execute(text("DROP INDEX IF EXISTS ix_messages_chat_id"))
+
+
+def add_message_key(conn):
+    # write-behind rows carry a key from enqueue; the unique index makes a
+    # journal replay of rows that were already committed a no-op (NULLs,
+    # i.e. older rows, never conflict)
+    conn.execute(text("ALTER TABLE messages ADD COLUMN message_key VARCHAR(32)"))
+    conn.execute(text("CREATE UNIQUE INDEX uq_messages_message_key ON messages (message_key)"))
+
+
+# (version, description, upgrade(conn)) -- append only
+MIGRATIONS = [
+    (1, "initial schema", initial_schema),
+    (2, "drop ix_messages_chat_id", drop_chat_id_index),
+    (3, "messages.message_key", add_message_key),
+]
+
+HEAD = MIGRATIONS[-1][0]
+
+
+def current_version(conn):
+    if not inspect(conn).has_table(VERSION_TABLE):
+        return 0
+    return conn.execute(text(f"SELECT MAX(version) FROM {VERSION_TABLE}")).scalar() or 0
+
+
+def upgrade(conn):
+    """
+    Bring the schema to HEAD (sync, for conn.run_sync). Returns the
+    (before, after) versions.
+    """
+    before = current_version(conn)
+    if before >= HEAD:
+        return before, before
+
+    if conn.dialect.name == "postgresql":
+        # held until the transaction commits; whoever waited re-reads the version
+        conn.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": LOCK_ID})
+        before = current_version(conn)
+
+    conn.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {VERSION_TABLE} ("
+        "version INTEGER PRIMARY KEY, description VARCHAR(255) NOT NULL, "
+        "applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)"
+    ))
+
+    for version, description, migrate in MIGRATIONS:
+        if version > before:
+            migrate(conn)
+            conn.execute(
+                text(f"INSERT INTO {VERSION_TABLE} (version, description) VALUES (:version, :description)"),
+                {"version": version, "description": description}
+            )
+
+    return before, HEAD
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Index
 from sqlalchemy.sql import func
 from db import Base
 
@@ -6,9 +6,19 @@ class Message(Base):
     __tablename__ = "messages"
 
     id = Column(Integer, primary_key=True)
-    chat_id = Column(Integer, index= True)
+    chat_id = Column(Integer)
     user_id = Column(Integer, ForeignKey("users.id"))
     content = Column(String)
     toxicity= Column(Float)
     status = Column(String)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # set when the message is buffered; a journal replay of an already
+    # committed row hits the unique index and is skipped
+    message_key = Column(String(32))
+
+    # history pages are a range scan: chat_id = ? AND (created_at, id) < cursor
+    # (also serves plain chat_id lookups, so no separate chat_id index)
+    __table_args__ = (
+        Index("ix_messages_chat_created_id", "chat_id", "created_at", "id"),
+        Index("uq_messages_message_key", "message_key", unique=True),
+    )
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, ForeignKey
+from sqlalchemy import Column, Integer, ForeignKey, Index
 from db import Base
 
 class RoomMember(Base):
@@ -7,4 +7,8 @@ class RoomMember(Base):
     id = Column(Integer, primary_key=True)
     room_id = Column(Integer, ForeignKey("rooms.id"))
     user_id = Column(Integer, ForeignKey("users.id"))
-    
\ No newline at end of file
+
+    # one membership per (user, room); also serves the "rooms of user" lookup
+    __table_args__ = (
+        Index("uq_room_members_user_room", "user_id", "room_id", unique=True),
+    )
@@ -1,6 +1,10 @@
-def auto_moderate(toxicity, scores):
+CENSORED_TEXT = "[‼️ Message hidden due to inappropriate language]"
+
+def auto_moderate(toxicity, scores, censor_at=0.3, block_at=0.7):
+    # thresholds are lowered for high-risk users (see risk.RISK_LEVELS)
+
     # clean message
-    if toxicity < 0.3:
+    if toxicity < censor_at:
         return {
             "status": "approved",
             "text": None,
@@ -8,10 +12,10 @@ def auto_moderate(toxicity, scores):
         }
     
     # medium toxicity -> censor
-    if toxicity < 0.7:
+    if toxicity < block_at:
         return {
             "status": "censored",
-            "text": "[‼️ Message hidden due to inappropriate language]",
+            "text": CENSORED_TEXT,
             "reason": "toxic_language"
         }
     
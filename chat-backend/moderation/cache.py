@@ -0,0 +1,156 @@
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+
+from redis.exceptions import RedisError
+
+from redis_client import redis_client
+from .normalize import normalize_text
+
+CACHE_MAX_SIZE = int(os.getenv("MODERATION_CACHE_SIZE", "10000"))
+CACHE_TTL = float(os.getenv("MODERATION_CACHE_TTL", "300"))
+CACHE_REDIS_TTL = int(os.getenv("MODERATION_CACHE_REDIS_TTL", "3600"))
+
+VERSION_KEY = "moderation_cache:model_version"
+BACKEND_KEY = "moderation_cache:backend"
+
+# ml-service backends whose scores only depend on the normalized text (the
+# TF-IDF model sees preprocess.clean_text output). The transformer and the
+# cascade score raw text, so "YOU IDIOT!!!" and "you idiot" may differ.
+NORMALIZED_BACKENDS = {"tfidf"}
+
+
+class ModerationCache:
+    """
+    Two-tier cache of ML scores keyed by message text: normalized when the
+    ml-service backend is TF-IDF, raw otherwise (or while unknown).
+
+    Tier 1 is a per-process LRU with a TTL, tier 2 is shared Redis so one
+    ML call per distinct message is enough for the whole cluster. Redis keys
+    include the model version reported by ml-service, so retraining the
+    models makes old entries unreachable; they then age out via their TTL.
+    """
+
+    def __init__(self, redis=redis_client, max_size=CACHE_MAX_SIZE,
+                 ttl=CACHE_TTL, redis_ttl=CACHE_REDIS_TTL):
+        self.redis = redis
+        self.max_size = max_size
+        self.ttl = ttl
+        self.redis_ttl = redis_ttl
+
+        self.local = OrderedDict()   # key -> (expires_at, result)
+        self.model_version = None
+        self.backend = None          # as reported by ml-service
+
+        self.stats = {
+            "local_hits": 0,
+            "redis_hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "invalidations": 0
+        }
+
+    @property
+    def normalized(self):
+        return self.backend in NORMALIZED_BACKENDS
+
+    def key(self, text):
+        if self.normalized:
+            text = normalize_text(text)
+        return hashlib.sha1(text.encode()).hexdigest()
+
+    def redis_key(self, key):
+        return f"moderation_cache:{self.model_version}:{key}"
+
+    async def get(self, text):
+        if self.model_version is None:
+            await self._load_version()
+
+        key = self.key(text)
+
+        entry = self.local.get(key)
+        if entry is not None:
+            expires_at, result = entry
+            if expires_at > time.monotonic():
+                self.local.move_to_end(key)
+                self.stats["local_hits"] += 1
+                return result
+
+            del self.local[key]
+            self.stats["expirations"] += 1
+
+        try:
+            if self.model_version is not None:
+                raw = await self.redis.get(self.redis_key(key))
+                if raw is not None:
+                    result = json.loads(raw)
+                    self._store_local(key, result)
+                    self.stats["redis_hits"] += 1
+                    return result
+        except RedisError:
+            pass
+
+        self.stats["misses"] += 1
+        return None
+
+    async def set(self, text, result):
+        version = result.get("model_version")
+        if version is None:
+            return
+
+        backend = result.get("backend")
+        if version != self.model_version or backend != self.backend:
+            await self._switch_version(version, backend)
+
+        key = self.key(text)
+        self._store_local(key, result)
+
+        try:
+            await self.redis.set(self.redis_key(key), json.dumps(result), ex=self.redis_ttl)
+        except RedisError:
+            pass
+
+    def invalidate(self):
+        self.local.clear()
+        self.stats["invalidations"] += 1
+
+    async def _load_version(self):
+        # what another node last saw, until this one gets a result itself
+        try:
+            self.model_version, self.backend = await self.redis.mget(VERSION_KEY, BACKEND_KEY)
+        except RedisError:
+            pass
+
+    async def _switch_version(self, version, backend):
+        # models changed (or first result seen): drop everything scored by the
+        # old ones; the backend also decides how keys are derived
+        if self.model_version is not None:
+            self.invalidate()
+
+        self.model_version = version
+        self.backend = backend
+
+        try:
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.set(VERSION_KEY, version)
+                if backend is None:
+                    pipe.delete(BACKEND_KEY)
+                else:
+                    pipe.set(BACKEND_KEY, backend)
+                await pipe.execute()
+        except RedisError:
+            pass
+
+    def _store_local(self, key, result):
+        self.local[key] = (time.monotonic() + self.ttl, result)
+        self.local.move_to_end(key)
+
+        while len(self.local) > self.max_size:
+            self.local.popitem(last=False)
+            self.stats["evictions"] += 1
+
+
+moderation_cache = ModerationCache()
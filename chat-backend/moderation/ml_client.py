@@ -0,0 +1,79 @@
+import asyncio
+import os
+import httpx
+
+from metrics import ML_IN_FLIGHT
+
+ML_URL = os.getenv("ML_URL", "http://localhost:8001/predict")
+
+# Pool settings (override via env)
+ML_MAX_CONNECTIONS = int(os.getenv("ML_MAX_CONNECTIONS", "100"))
+ML_MAX_KEEPALIVE = int(os.getenv("ML_MAX_KEEPALIVE", "20"))
+ML_KEEPALIVE_EXPIRY = float(os.getenv("ML_KEEPALIVE_EXPIRY", "30"))
+ML_HTTP2 = os.getenv("ML_HTTP2", "false").lower() == "true"
+ML_TIMEOUT = float(os.getenv("ML_TIMEOUT", "5"))
+ML_CONNECT_TIMEOUT = float(os.getenv("ML_CONNECT_TIMEOUT", "2"))
+ML_MAX_CONCURRENCY = int(os.getenv("ML_MAX_CONCURRENCY", "64"))
+# Suggested wait before resending when ml-service can't score a message
+# (unless its response carries a Retry-After)
+ML_RETRY_AFTER = float(os.getenv("ML_RETRY_AFTER", "2"))
+
+# App-lifetime client, created on startup and reused by every message
+client = None
+limiter = None
+
+
+async def start_ml_client():
+    global client, limiter
+
+    if client is not None:
+        return client
+
+    client = httpx.AsyncClient(
+        http2=ML_HTTP2,
+        limits=httpx.Limits(
+            max_connections=ML_MAX_CONNECTIONS,
+            max_keepalive_connections=ML_MAX_KEEPALIVE,
+            keepalive_expiry=ML_KEEPALIVE_EXPIRY
+        ),
+        timeout=httpx.Timeout(ML_TIMEOUT, connect=ML_CONNECT_TIMEOUT)
+    )
+    limiter = asyncio.Semaphore(ML_MAX_CONCURRENCY)
+
+    return client
+
+
+async def close_ml_client():
+    global client, limiter
+
+    if client is not None:
+        await client.aclose()
+
+    client = None
+    limiter = None
+
+
+async def post_ml(payload, url=ML_URL, timeout=None):
+    # lazily start so scripts that skip the FastAPI lifecycle still work
+    if client is None:
+        await start_ml_client()
+
+    async with limiter:
+        with ML_IN_FLIGHT.track_inprogress():
+            if timeout is None:
+                resp = await client.post(url, json=payload)
+            else:
+                resp = await client.post(url, json=payload, timeout=timeout)
+
+    resp.raise_for_status()
+    return resp.json()
+
+
+def retry_after(error):
+    # seconds a sender should wait after post_ml raised `error`
+    if isinstance(error, httpx.HTTPStatusError):
+        try:
+            return float(error.response.headers["Retry-After"])
+        except (KeyError, ValueError):
+            pass
+    return ML_RETRY_AFTER
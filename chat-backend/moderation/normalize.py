@@ -0,0 +1,15 @@
+import re
+
+# Same steps as ml-service preprocess.clean_text, minus stopword removal.
+# Keeping stopwords makes this slightly stricter than the ML side, so two
+# messages that normalize equal here always get the same ML scores.
+LINK_RE = re.compile(r"http\S+")
+MENTION_RE = re.compile(r"@\w+")
+NON_ALPHA_RE = re.compile(r"[^a-z\s]")
+
+def normalize_text(text):
+    text = text.lower()
+    text = LINK_RE.sub("", text)
+    text = MENTION_RE.sub("", text)
+    text = NON_ALPHA_RE.sub("", text)
+    return " ".join(text.split())
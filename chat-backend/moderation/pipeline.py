@@ -1,22 +1,52 @@
-import os
-import httpx
+import time
 from .auto_moderator import auto_moderate
-from .risk import update_user_risk
+from .risk import risk_store
+from .ml_client import post_ml
+from .cache import moderation_cache
+from .prefilter import prefilter
+from metrics import MESSAGES, observe
 
-ML_URL = os.getenv("ML_URL", "http://localhost:8001/predict")
+def precheck(message):
+    # obviously clean / obviously severe messages are decided in-process;
+    # the prefilter mimics the TF-IDF model, so only when that is what
+    # ml-service runs and it was exported from the same model version
+    # (both known from ml-service's results, via the cache)
+    if prefilter and moderation_cache.normalized and prefilter.version == moderation_cache.model_version:
+        return prefilter.check(message)
+    return None
+
+async def score_remote(message):
+    # identical content (normalized, for the TF-IDF backend) is only scored once
+    started = time.perf_counter()
+    result = await moderation_cache.get(message)
+    observe("cache_lookup", started)
+
+    if result is None:
+        started = time.perf_counter()
+        result = await post_ml({"text": message})
+        observe("ml_call", started)
+        if prefilter:
+            prefilter.record_ml_latency(time.perf_counter() - started)
+
+        await moderation_cache.set(message, result)
+
+    return result
+
+async def moderate_message(data, result=None):
+    # result: the precheck() verdict, if it reached one
+    if result is None:
+        result = await score_remote(data["message"])
 
-async def moderate_message(data):
-    async with httpx.AsyncClient() as client:
-        resp = await client.post(ML_URL, json={"text": data["message"]})
-    
-    result = resp.json()
     toxicity = result["toxicity"]
     scores = result["scores"]
 
-    decision = auto_moderate(toxicity, scores)
+    # update user risk; thresholds come from the risk before this message
+    started = time.perf_counter()
+    risk = await risk_store.record(data["user"], toxicity)
+    observe("risk", started)
 
-    # update user risk
-    await update_user_risk(data["user"], toxicity)
+    decision = auto_moderate(toxicity, scores, risk["censor_at"], risk["block_at"])
+    MESSAGES.labels(decision["status"]).inc()
 
     return {
         "user": data["user"],
@@ -25,6 +55,6 @@ async def moderate_message(data):
         "scores": scores,
         "status": decision["status"],
         "moderated_text": decision["text"],
-        "reason": decision["reason"]
-
+        "reason": decision["reason"],
+        "risk": risk["level"]
     }
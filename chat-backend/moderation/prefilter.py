@@ -0,0 +1,224 @@
+import json
+import math
+import os
+import re
+from collections import Counter, deque
+
+from .normalize import normalize_text
+from logs import get_logger
+
+log = get_logger("prefilter")
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+PREFILTER_ENABLED = os.getenv("PREFILTER_ENABLED", "true").lower() == "true"
+PREFILTER_MODEL_PATH = os.getenv("PREFILTER_MODEL_PATH", os.path.join(BASE_DIR, "prefilter_model.json"))
+PREFILTER_LEXICON_PATH = os.getenv("PREFILTER_LEXICON_PATH", os.path.join(BASE_DIR, "lexicon.txt"))
+
+# Only scores far from the auto_moderator 0.3 / 0.7 cut-offs are decided locally
+PREFILTER_APPROVE_BELOW = float(os.getenv("PREFILTER_APPROVE_BELOW", "0.1"))
+PREFILTER_BLOCK_ABOVE = float(os.getenv("PREFILTER_BLOCK_ABOVE", "0.9"))
+
+LEET = str.maketrans({"0": "o", "1": "i", "3": "e", "4": "a", "5": "s", "7": "t", "@": "a", "$": "s", "!": "i"})
+# a leet character only stands for a letter when a letter follows it in the
+# same word: "sh!t" and "$hit" are undone, "kys!" keeps its "!" as punctuation
+LEET_RE = re.compile(r"[013457@$!](?=[013457@$!]*[a-z])")
+NON_ALPHA_RE = re.compile(r"[^a-z\s]")
+SPACED_LETTERS_RE = re.compile(r"\b(?:[a-z] ){2,}[a-z]\b")   # "f u c k"
+STRETCHED_RE = re.compile(r"([a-z])\1{2,}")                  # "fuuuck"
+
+
+def deobfuscate(text):
+    text = LEET_RE.sub(lambda m: m.group(0).translate(LEET), text.lower())
+    text = NON_ALPHA_RE.sub("", text)
+    text = " ".join(text.split())
+    text = SPACED_LETTERS_RE.sub(lambda m: m.group(0).replace(" ", ""), text)
+    return STRETCHED_RE.sub(r"\1", text)
+
+
+class Lexicon:
+    """
+    Aho-Corasick automaton over the lexicon terms.
+
+    One pass over the message finds every term; a match only counts when it
+    starts and ends on a word boundary, so "class" does not hit "ass".
+    """
+
+    def __init__(self, terms):
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [[]]
+
+        for term, severity in terms.items():
+            node = 0
+            for ch in term:
+                if ch not in self.goto[node]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.out.append([])
+                    self.goto[node][ch] = len(self.goto) - 1
+                node = self.goto[node][ch]
+            self.out[node].append((term, severity))
+
+        # breadth-first pass to fill failure links
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self.goto[node].items():
+                queue.append(child)
+                f = self.fail[node]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[child] = self.goto[f].get(ch, 0)
+                self.out[child] = self.out[child] + self.out[self.fail[child]]
+
+    @classmethod
+    def load(cls, path):
+        terms = {}
+        with open(path) as f:
+            for line in f:
+                line = line.rstrip("\n")
+                if not line or line.startswith("#"):
+                    continue
+                term, severity = line.split("\t")
+                terms[deobfuscate(term)] = severity
+        return cls(terms)
+
+    def search(self, text):
+        hits = []
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in self.goto[node]:
+                node = self.fail[node]
+            node = self.goto[node].get(ch, 0)
+
+            for term, severity in self.out[node]:
+                start = i - len(term) + 1
+                end = i + 1
+                if (start == 0 or text[start - 1] == " ") and (end == len(text) or text[end] == " "):
+                    hits.append((term, severity))
+        return hits
+
+
+class LinearModel:
+    """
+    Pure-Python copy of the ml-service TF-IDF + logistic regression scorer,
+    loaded from the JSON written by ml-service/export_prefilter.py.
+    """
+
+    def __init__(self, labels, intercept, stopwords, features, version=None):
+        self.version = version    # ml-service model_version it was exported from
+        self.labels = labels
+        self.intercept = intercept
+        self.stopwords = frozenset(stopwords)
+        self.features = features   # term -> [idf, coef per label...]
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            data = json.load(f)
+        return cls(data["labels"], data["intercept"], data["stopwords"], data["features"], data.get("version"))
+
+    def score(self, text):
+        # same tokens as clean_text + TfidfVectorizer(ngram_range=(1, 2))
+        tokens = [w for w in normalize_text(text).split() if w not in self.stopwords and len(w) > 1]
+        terms = Counter(tokens)
+        terms.update(" ".join(pair) for pair in zip(tokens, tokens[1:]))
+
+        weighted = []
+        norm = 0.0
+        for term, count in terms.items():
+            feature = self.features.get(term)
+            if feature:
+                value = count * feature[0]
+                norm += value * value
+                weighted.append((value, feature))
+
+        logits = list(self.intercept)
+        if norm:
+            norm = math.sqrt(norm)
+            for value, feature in weighted:
+                for i in range(len(logits)):
+                    logits[i] += value / norm * feature[i + 1]
+
+        scores = {label: 1 / (1 + math.exp(-z)) for label, z in zip(self.labels, logits)}
+        return max(scores.values()), scores
+
+
+class PreFilter:
+    """
+    Decides confident-clean and confident-severe messages in-process and
+    returns None for everything else, which then goes to ml-service.
+    """
+
+    def __init__(self, model=None, lexicon=None,
+                 approve_below=PREFILTER_APPROVE_BELOW, block_above=PREFILTER_BLOCK_ABOVE):
+        self.model = model
+        self.lexicon = lexicon
+        self.approve_below = approve_below
+        self.block_above = block_above
+
+        self.stats = {
+            "approved_local": 0,
+            "blocked_local": 0,
+            "deferred": 0,
+            "ml_calls": 0,
+            "ml_seconds": 0.0
+        }
+
+    @property
+    def version(self):
+        return self.model.version if self.model is not None else None
+
+    @classmethod
+    def load(cls):
+        model = None
+        if os.path.exists(PREFILTER_MODEL_PATH):
+            model = LinearModel.load(PREFILTER_MODEL_PATH)
+        else:
+            log.warning("prefilter_model_missing", hint="run ml-service/export_prefilter.py")
+
+        lexicon = Lexicon.load(PREFILTER_LEXICON_PATH)
+        return cls(model, lexicon)
+
+    def check(self, text):
+        hits = self.lexicon.search(deobfuscate(text)) if self.lexicon else []
+        severe = any(severity == "severe" for _, severity in hits)
+
+        if self.model is not None:
+            toxicity, scores = self.model.score(text)
+        elif severe:
+            toxicity, scores = 1.0, {}
+        else:
+            self.stats["deferred"] += 1
+            return None
+
+        if severe or toxicity > self.block_above:
+            self.stats["blocked_local"] += 1
+            return {"toxicity": 1.0 if severe else toxicity, "scores": scores, "tier": "local"}
+
+        if not hits and toxicity < self.approve_below:
+            self.stats["approved_local"] += 1
+            return {"toxicity": toxicity, "scores": scores, "tier": "local"}
+
+        self.stats["deferred"] += 1
+        return None
+
+    def record_ml_latency(self, seconds):
+        self.stats["ml_calls"] += 1
+        self.stats["ml_seconds"] += seconds
+
+    def report(self):
+        local = self.stats["approved_local"] + self.stats["blocked_local"]
+        total = local + self.stats["deferred"]
+        avg_ml = self.stats["ml_seconds"] / self.stats["ml_calls"] if self.stats["ml_calls"] else 0.0
+
+        return {
+            **self.stats,
+            "local_fraction": local / total if total else 0.0,
+            "avg_ml_latency_ms": avg_ml * 1000,
+            "est_latency_saved_ms": local * avg_ml * 1000
+        }
+
+
+prefilter = PreFilter.load() if PREFILTER_ENABLED else None
@@ -1,10 +1,158 @@
-user_risk = {}
+import os
+import time
 
-async def update_user_risk(user, toxicity):
-    if user not in user_risk:
-        user_risk[user] = 0
-    
-    user_risk[user] += toxicity
+from redis.exceptions import RedisError
 
-# TODO add microservice architecture - docker and requirement.txt for both ml and backend, and real database
- # important- changed bcrypt to argon2
+from redis_client import redis_client
+from logs import get_logger
+
+log = get_logger("risk")
+
+# Risk score = sum of the toxicities of toxic messages (see RISK_TOXIC_AT),
+# halving every RISK_HALF_LIFE_SECONDS. Clean messages add nothing, so an
+# active user's everyday chatter never builds up a score.
+RISK_HALF_LIFE_SECONDS = float(os.getenv("RISK_HALF_LIFE_SECONDS", "3600"))
+# Sliding window for the "toxic messages recently" counter
+RISK_WINDOW_SECONDS = float(os.getenv("RISK_WINDOW_SECONDS", "300"))
+# A message counts as toxic (score and counter) from the auto_moderator
+# censor cut-off up
+RISK_TOXIC_AT = float(os.getenv("RISK_TOXIC_AT", "0.3"))
+# Idle users are forgotten once their score has decayed to ~0
+RISK_TTL_SECONDS = int(os.getenv("RISK_TTL_SECONDS", "28800"))
+
+# level -> (minimum score, minimum toxic messages in window, censor_at, block_at)
+RISK_LEVELS = [
+    ("high", 3.0, 6, 0.1, 0.5),
+    ("elevated", 1.5, 3, 0.2, 0.6),
+    ("normal", 0.0, 0, 0.3, 0.7),
+]
+
+
+# One hash per user: decayed score, when it was last updated and a
+# two-bucket sliding window of toxic messages. Returns the state *before*
+# this message so the message is judged on the user's history, then folds
+# it in. Single key, so it is safe on Redis Cluster.
+RECORD_SCRIPT = """
+local now = tonumber(ARGV[1])
+local toxicity = tonumber(ARGV[2])
+local half_life = tonumber(ARGV[3])
+local window = tonumber(ARGV[4])
+local toxic_at = tonumber(ARGV[5])
+
+local h = redis.call('HMGET', KEYS[1], 'score', 'ts', 'bucket', 'cur', 'prev')
+local score = tonumber(h[1]) or 0
+local ts = tonumber(h[2]) or now
+local bucket = tonumber(h[3])
+local cur = tonumber(h[4]) or 0
+local prev = tonumber(h[5]) or 0
+
+if now > ts then
+    score = score * 2 ^ (-(now - ts) / half_life)
+end
+
+local current = math.floor(now / window)
+if bucket ~= current then
+    if bucket == current - 1 then prev = cur else prev = 0 end
+    cur = 0
+end
+
+local elapsed = (now - current * window) / window
+local rate = prev * (1 - elapsed) + cur
+
+local new_cur = cur
+local new_score = score
+if toxicity >= toxic_at then
+    new_cur = cur + 1
+    new_score = score + toxicity
+end
+
+redis.call('HSET', KEYS[1], 'score', new_score, 'ts', now,
+           'bucket', current, 'cur', new_cur, 'prev', prev)
+redis.call('EXPIRE', KEYS[1], ARGV[6])
+
+return {tostring(score), tostring(rate)}
+"""
+
+
+def risk_key(user):
+    return f"risk:{{{user}}}"
+
+
+def risk_level(score, rate):
+    for level, min_score, min_rate, censor_at, block_at in RISK_LEVELS:
+        if score >= min_score or rate >= min_rate:
+            return level, censor_at, block_at
+
+
+class RiskStore:
+    """
+    Per-user risk kept in Redis, so every backend replica sees the same
+    value and idle users expire instead of piling up.
+
+    record() is the only call on the message path: one EVALSHA that reads,
+    decays and updates the user in place.
+    """
+
+    def __init__(self, redis=redis_client, half_life=RISK_HALF_LIFE_SECONDS,
+                 window=RISK_WINDOW_SECONDS, toxic_at=RISK_TOXIC_AT, ttl=RISK_TTL_SECONDS):
+        self.redis = redis
+        self.half_life = half_life
+        self.window = window
+        self.toxic_at = toxic_at
+        self.ttl = ttl
+        self.record_script = redis.register_script(RECORD_SCRIPT)
+
+    async def record(self, user, toxicity):
+        """
+        Add a message to the user's risk and return their risk before it:
+        {score, toxic_rate, level, censor_at, block_at}.
+        """
+        try:
+            score, rate = await self.record_script(
+                keys=[risk_key(user)],
+                args=[time.time(), toxicity, self.half_life, self.window, self.toxic_at, self.ttl]
+            )
+            score, rate = float(score), float(rate)
+        except RedisError as e:
+            # don't hold up chat on Redis; judge on default thresholds
+            log.warning("risk_update_failed", error=str(e))
+            score, rate = 0.0, 0.0
+
+        return self._describe(score, rate)
+
+    async def get_many(self, users):
+        """Current risk for several users in one pipelined round trip."""
+        now = time.time()
+        current = int(now // self.window)
+
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for user in users:
+                pipe.hmget(risk_key(user), "score", "ts", "bucket", "cur", "prev")
+            rows = await pipe.execute()
+
+        risk = {}
+        for user, (score, ts, bucket, cur, prev) in zip(users, rows):
+            score = float(score or 0) * 2 ** (-(now - float(ts or now)) / self.half_life)
+
+            bucket = int(float(bucket)) if bucket is not None else None
+            cur, prev = float(cur or 0), float(prev or 0)
+            if bucket != current:
+                prev, cur = (cur if bucket == current - 1 else 0.0), 0.0
+            rate = prev * (1 - (now - current * self.window) / self.window) + cur
+
+            risk[user] = self._describe(score, rate)
+
+        return risk
+
+    def _describe(self, score, rate):
+        level, censor_at, block_at = risk_level(score, rate)
+        return {
+            "score": score,
+            "toxic_rate": rate,
+            "level": level,
+            "censor_at": censor_at,
+            "block_at": block_at
+        }
+
+
+risk_store = RiskStore()
@@ -3,6 +3,16 @@ import os
 
 
 REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "200"))
+REDIS_POOL_TIMEOUT = float(os.getenv("REDIS_POOL_TIMEOUT", "5"))
 
+# Blocking pool: during bursts (e.g. a reconnect storm) callers wait for a
+# free connection instead of failing with "Too many connections"
+pool = redis.BlockingConnectionPool.from_url(
+    REDIS_URL,
+    max_connections=REDIS_MAX_CONNECTIONS,
+    timeout=REDIS_POOL_TIMEOUT,
+    decode_responses=True
+)
 
-redis_client = redis.from_url(REDIS_URL, decode_responses=True)
\ No newline at end of file
+redis_client = redis.Redis(connection_pool=pool)
\ No newline at end of file
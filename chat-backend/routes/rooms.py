@@ -1,13 +1,26 @@
-from fastapi import APIRouter, Depends
+import os
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import tuple_
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from auth.jwt import decode_token
+from auth.dependencies import current_user, is_admin
 from db import get_db
 from models.room import Room
 from models.room_member import RoomMember
+from models.message import Message
+from models.user import User
+from chat.room_modes import set_optimistic
+from chat.memberships import get_user_rooms, invalidate_user_rooms
+from chat.history import (
+    GLOBAL_CHAT_ID, HISTORY_CACHE_SIZE, serialize, encode_cursor, decode_cursor, cached_history,
+    fill_history, history_version
+)
 
 router = APIRouter()
 
+HISTORY_MAX_PAGE = int(os.getenv("HISTORY_MAX_PAGE", "200"))
+
 # create new room
 @router.post("/create")
 async def create_room(data: dict, db: AsyncSession = Depends(get_db)):
@@ -29,17 +42,89 @@ async def create_room(data: dict, db: AsyncSession = Depends(get_db)):
     db.add(member)
     await db.commit()
 
+    await invalidate_user_rooms(user_id)
+
     return {"room_id":room.id, "name":room.name}
 
 # List rooms for user
 @router.get("/my/{user_id}")
-async def my_rooms(user_id: int, db: AsyncSession = Depends(get_db)):
-    result = await db.execute(
-        select(Room)
-        .join(RoomMember)
-        .where(RoomMember.user_id == user_id)
+async def my_rooms(user_id: int):
+    return await get_user_rooms(user_id)
+
+# Opt a room in/out of optimistic delivery (broadcast first, moderate after).
+# Only the room's creator or an admin: it skips moderation before broadcast.
+@router.post("/{room_id}/optimistic")
+async def room_optimistic(room_id: int, data: dict, user: dict = Depends(current_user),
+                          db: AsyncSession = Depends(get_db)):
+    room = await db.get(Room, room_id)
+    if room is None:
+        raise HTTPException(status_code=404, detail="Room not found")
+    if room.created_by != user["user_id"] and not is_admin(user):
+        raise HTTPException(status_code=403, detail="Only the room's creator can change this")
+
+    enabled = bool(data.get("enabled", True))
+    await set_optimistic(f"room_{room_id}", enabled)
+
+    return {"room_id": room_id, "optimistic": enabled}
+
+# Message history, newest first. Pass next_cursor back as `before` for older pages.
+# Room 0 is the "global" room (every user); other rooms only for their members.
+@router.get("/{room_id}/messages")
+async def room_messages(room_id: int, limit: int = 50, before: str = None,
+                        user: dict = Depends(current_user), db: AsyncSession = Depends(get_db)):
+    if room_id != GLOBAL_CHAT_ID and room_id not in {r["id"] for r in await get_user_rooms(user["user_id"])}:
+        raise HTTPException(status_code=403, detail="Not a member of this room")
+
+    limit = max(1, min(limit, HISTORY_MAX_PAGE))
+
+    # 🔥 First page straight from the Redis ring buffer when warm
+    if before is None:
+        cached = await cached_history(room_id, limit)
+        if cached is not None:
+            return history_page(cached, limit)
+        version = await history_version(room_id)
+
+    query = (
+        select(Message, User.email)
+        .outerjoin(User, Message.user_id == User.id)
+        .where(Message.chat_id == room_id)
     )
 
-    rooms = result.scalars().all()
+    # keyset pagination: an index range scan, no OFFSET
+    if before is not None:
+        try:
+            created_at, message_id = decode_cursor(before)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+        query = query.where(tuple_(Message.created_at, Message.id) < tuple_(created_at, message_id))
+
+    # a cold first page also fills the ring buffer, so fetch enough for it
+    fetch = limit if before is not None else max(limit, HISTORY_CACHE_SIZE)
+    query = query.order_by(Message.created_at.desc(), Message.id.desc()).limit(fetch)
+
+    result = await db.execute(query)
+    messages = [
+        serialize({
+            "id": msg.id,
+            "chat_id": msg.chat_id,
+            "user_id": msg.user_id,
+            "content": msg.content,
+            "toxicity": msg.toxicity,
+            "status": msg.status,
+            "created_at": msg.created_at
+        }, email)
+        for msg, email in result.all()
+    ]
+
+    if before is None:
+        await fill_history(room_id, messages, version)
+
+    return history_page(messages[:limit], limit)
+
 
-    return [{"id": r.id, "name": r.name} for r in rooms]
\ No newline at end of file
+def history_page(messages, limit):
+    return {
+        "messages": messages,
+        "next_cursor": encode_cursor(messages[-1]) if len(messages) == limit else None
+    }
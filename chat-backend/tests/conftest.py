@@ -0,0 +1,37 @@
+import asyncio
+import os
+import sys
+
+import pytest
+import redis.asyncio as aioredis
+from redis.exceptions import RedisError
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# a scratch database: it is flushed before and after every test
+TEST_REDIS_URL = os.getenv("TEST_REDIS_URL", "redis://localhost:6379/15")
+
+
+@pytest.fixture
+def with_redis():
+    """Run `await test(redis)` on a fresh event loop against TEST_REDIS_URL."""
+
+    def run(test):
+        async def main():
+            redis = aioredis.from_url(TEST_REDIS_URL, decode_responses=True)
+            try:
+                await redis.ping()
+            except (OSError, RedisError):
+                await redis.aclose()
+                pytest.skip(f"no Redis at {TEST_REDIS_URL}")
+
+            await redis.flushdb()
+            try:
+                await test(redis)
+            finally:
+                await redis.flushdb()
+                await redis.aclose()
+
+        asyncio.run(main())
+
+    return run
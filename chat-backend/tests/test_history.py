@@ -0,0 +1,123 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+
+import chat.history as history
+import chat.sockets as sockets
+import routes.rooms as rooms
+from chat.history import GLOBAL_CHAT_ID, decode_cursor, encode_cursor, room_chat_id
+
+USER = {"user_id": 1, "email": "a@x.com"}
+
+
+def member_of(*room_ids):
+    async def get_user_rooms(user_id):
+        return [{"id": room_id} for room_id in room_ids]
+    return get_user_rooms
+
+
+def use_redis(monkeypatch, redis):
+    monkeypatch.setattr(history, "redis_client", redis)
+    monkeypatch.setattr(history, "fill_script", redis.register_script(history.FILL_SCRIPT))
+
+
+def stored(message_id, created_at="2024-05-01T12:00:00.000001"):
+    return {
+        "id": message_id, "chat_id": 1, "user_id": 1, "content": f"m{message_id}",
+        "toxicity": 0.0, "status": "ok", "created_at": datetime.fromisoformat(created_at)
+    }
+
+
+def test_chat_id_comes_from_the_socket_room():
+    assert room_chat_id("global") == GLOBAL_CHAT_ID
+    assert room_chat_id("room_42") == 42
+    # no room history for private chats or made-up rooms
+    assert room_chat_id("private_a@x.com_b@x.com") is None
+    assert room_chat_id("room_") is None
+    assert room_chat_id("room_1; drop") is None
+    assert room_chat_id("lobby") is None
+
+
+def test_cursor_round_trips():
+    message = history.serialize(stored(7))
+
+    assert decode_cursor(encode_cursor(message)) == (datetime(2024, 5, 1, 12, 0, 0, 1), 7)
+
+
+@pytest.mark.parametrize("cursor", ["", "not base64!", "bm8gc2VwYXJhdG9y", "eHx5"])
+def test_bad_cursors_are_value_errors(cursor):
+    # the route turns ValueError into a 400
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+
+def test_only_members_may_join_rooms(monkeypatch):
+    monkeypatch.setattr(sockets, "get_user_rooms", member_of(3))
+
+    async def test():
+        assert await sockets.may_join(USER, "global")
+        assert await sockets.may_join(USER, "room_3")
+        assert not await sockets.may_join(USER, "room_4")
+        assert await sockets.may_join(USER, "private_a@x.com_b@x.com")
+        assert not await sockets.may_join(USER, "private_b@x.com_c@x.com")
+        # ad-hoc names and other sockets' sid rooms
+        assert not await sockets.may_join(USER, "lobby")
+        assert not await sockets.may_join(USER, "Xk2fS9a0AAAB")
+
+    asyncio.run(test())
+
+
+def test_underscores_in_emails_dont_open_other_private_rooms():
+    smith = {"user_id": 2, "email": "smith@corp.com"}
+    john = {"user_id": 3, "email": "john_smith@corp.com"}
+    room = sockets.private_room("p@x.com", john["email"])
+
+    async def test():
+        assert await sockets.may_join(john, room)
+        assert not await sockets.may_join(smith, room)
+        # the unescaped name the old scheme produced for p and john
+        assert not await sockets.may_join(smith, "private_john_smith@corp.com_p@x.com")
+        assert not await sockets.may_join(smith, "private_p@x.com_john_smith@corp.com")
+
+    asyncio.run(test())
+
+
+def test_history_is_members_only(monkeypatch):
+    monkeypatch.setattr(rooms, "get_user_rooms", member_of(3))
+
+    async def cached_history(chat_id, limit):
+        return [{"id": chat_id}]
+
+    monkeypatch.setattr(rooms, "cached_history", cached_history)
+
+    async def test():
+        with pytest.raises(HTTPException) as e:
+            await rooms.room_messages(4, limit=10, user=USER, db=None)
+        assert e.value.status_code == 403
+
+        assert (await rooms.room_messages(3, limit=10, user=USER, db=None))["messages"] == [{"id": 3}]
+        assert (await rooms.room_messages(GLOBAL_CHAT_ID, limit=10, user=USER, db=None))["messages"] == [{"id": 0}]
+
+    asyncio.run(test())
+
+
+def test_fill_backs_off_after_a_concurrent_push(with_redis, monkeypatch):
+    async def test(redis):
+        use_redis(monkeypatch, redis)
+        snapshot = [history.serialize(stored(1))]
+
+        # a message is pushed between the fill's version read and its write
+        version = await history.history_version(1)
+        await history.push_history([stored(2)])
+        await history.fill_history(1, snapshot, version)
+        assert await history.cached_history(1, 10) is None
+
+        # the next cold read fills, and later pushes land on top of it
+        version = await history.history_version(1)
+        await history.fill_history(1, snapshot, version)
+        await history.push_history([stored(2)])
+        assert [m["id"] for m in await history.cached_history(1, 10)] == [2, 1]
+
+    with_redis(test)
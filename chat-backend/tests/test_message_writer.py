@@ -0,0 +1,150 @@
+import asyncio
+import json
+
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+import chat.message_writer as mw
+import models.room  # noqa: F401 -- messages' foreign keys
+import models.user  # noqa: F401
+from migrations import upgrade
+from models.message import Message
+
+# the scratch database is SQLite (requirements-dev.txt)
+pytest.importorskip("aiosqlite")
+
+
+def row(content, **extra):
+    return {"chat_id": 0, "user_id": 1, "content": content, "toxicity": 0.0, "status": "ok", **extra}
+
+
+def with_db(tmp_path, monkeypatch, with_redis):
+    """Run `await test(redis, count)` with the writer on a scratch SQLite database."""
+
+    def run(test):
+        async def main(redis):
+            engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'chat.db'}")
+            async with engine.begin() as conn:
+                await conn.run_sync(upgrade)
+            session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+            monkeypatch.setattr(mw, "SessionLocal", session)
+
+            async def count():
+                async with session() as db:
+                    return (await db.execute(select(func.count()).select_from(Message))).scalar()
+
+            try:
+                await test(redis, count)
+            finally:
+                await engine.dispose()
+
+        with_redis(main)
+
+    return run
+
+
+def test_poison_row_is_bisected_out(tmp_path, monkeypatch, with_redis):
+    async def test(redis, count):
+        writer = mw.MessageWriter(batch_size=50, flush_ms=10, redis=redis)
+        batch = [(None, row(f"m{i}")) for i in range(20)]
+        batch[7] = ("1-0", row("bad", created_at="not-a-date"))
+
+        assert await writer._flush(batch) == 19
+
+        assert await count() == 19
+        assert writer.stats["dead_lettered"] == 1
+        assert writer.stats["split_batches"] > 0
+        dead = json.loads(await redis.hget(mw.DEAD_LETTER_KEY, mw.dead_letter_field(writer.journal_key, "1-0")))
+        assert dead["row"]["content"] == "bad"
+
+    with_db(tmp_path, monkeypatch, with_redis)(test)
+
+
+def test_orphaned_journal_is_recovered(tmp_path, monkeypatch, with_redis):
+    async def test(redis, count):
+        # a writer that journaled rows and died before writing them
+        crashed = mw.MessageWriter(redis=redis)
+        await redis.sadd(mw.JOURNALS_KEY, crashed.journal_key)
+        for i in range(3):
+            await redis.xadd(crashed.journal_key, {"row": json.dumps(row(f"m{i}", created_at="2026-01-01T00:00:00+00:00"))})
+        await redis.xadd(crashed.journal_key, {"row": json.dumps(row("bad", created_at="2026-01-01T00:00:00+00:00", toxicity=[1]))})
+
+        writer = mw.MessageWriter(redis=redis)
+        await writer.recover()
+
+        assert await count() == 3
+        assert writer.stats["journals_claimed"] == 1
+        # only the committed rows count as recovered
+        assert writer.stats["recovered"] == 3
+        assert writer.stats["dead_lettered"] == 1
+        assert await writer._pending(crashed.journal_key) == []
+        assert await redis.sismember(mw.JOURNALS_KEY, crashed.journal_key) == 0
+        assert not await redis.exists(mw.claim_key(crashed.journal_key))
+
+    with_db(tmp_path, monkeypatch, with_redis)(test)
+
+
+def test_replay_keeps_its_claim_through_retries(tmp_path, monkeypatch, with_redis):
+    async def test(redis, count):
+        writer = mw.MessageWriter(redis=redis, lease_ms=300)
+        claim = mw.claim_key("message_journal:crashed")
+        await redis.set(claim, writer.writer_id, px=writer.lease_ms * 2)
+
+        # the database is down for longer than the claim lives
+        session, failures = mw.SessionLocal, iter(range(3))
+
+        def flaky():
+            if next(failures, None) is not None:
+                raise OSError("connection refused")
+            return session()
+
+        monkeypatch.setattr(mw, "SessionLocal", flaky)
+
+        await writer._insert([row("m")], claim)
+
+        assert writer.stats["failures"] == 3
+        assert await count() == 1
+        assert await redis.get(claim) == writer.writer_id
+
+    with_db(tmp_path, monkeypatch, with_redis)(test)
+
+
+def test_row_is_buffered_when_the_journal_is_down():
+    class DownRedis:
+        async def xadd(self, *args, **kwargs):
+            raise RedisConnectionError("connection refused")
+
+    async def test():
+        writer = mw.MessageWriter(redis=DownRedis())
+        writer.queue = asyncio.Queue()
+
+        await writer.enqueue(row("hi"))
+
+        entry_id, buffered = writer.queue.get_nowait()
+        assert entry_id is None
+        assert buffered["content"] == "hi"
+        assert writer.stats["enqueued"] == 1
+
+    asyncio.run(test())
+
+
+def test_replaying_a_committed_row_adds_nothing(tmp_path, monkeypatch, with_redis):
+    async def test(redis, count):
+        # committed, but the XDEL afterwards failed: the entry is still journaled
+        stored = row("m", message_key="k1", created_at="2026-01-01T00:00:00+00:00")
+        crashed = mw.MessageWriter(redis=redis)
+        await redis.sadd(mw.JOURNALS_KEY, crashed.journal_key)
+        await redis.xadd(crashed.journal_key, {"row": json.dumps(stored)})
+        assert await crashed._flush([(None, crashed._load_row(json.dumps(stored)))]) == 1
+
+        writer = mw.MessageWriter(redis=redis)
+        await writer.recover()
+
+        assert await count() == 1
+        assert writer.stats["recovered"] == 0
+        assert await writer._pending(crashed.journal_key) == []
+
+    with_db(tmp_path, monkeypatch, with_redis)(test)
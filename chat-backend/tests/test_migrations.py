@@ -0,0 +1,22 @@
+from sqlalchemy import create_engine, inspect, text
+
+from migrations import HEAD, initial_schema, upgrade
+
+
+def message_indexes(conn):
+    return sorted(index["name"] for index in inspect(conn).get_indexes("messages"))
+
+
+def test_upgraded_and_fresh_databases_match(tmp_path):
+    old = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with old.begin() as conn:
+        # what create_all left behind before migrations existed
+        initial_schema(conn)
+        conn.execute(text("CREATE INDEX ix_messages_chat_id ON messages (chat_id)"))
+        assert upgrade(conn) == (0, HEAD)
+        upgraded = message_indexes(conn)
+
+    fresh = create_engine(f"sqlite:///{tmp_path / 'fresh.db'}")
+    with fresh.begin() as conn:
+        upgrade(conn)
+        assert message_indexes(conn) == upgraded == ["ix_messages_chat_created_id", "uq_messages_message_key"]
@@ -0,0 +1,57 @@
+import asyncio
+
+import httpx
+
+import chat.sockets as sockets
+from moderation.ml_client import ML_RETRY_AFTER, retry_after
+
+USER = {"user_id": 1, "email": "a@x.com"}
+
+
+def status_error(status, headers=None):
+    request = httpx.Request("POST", "http://ml/predict")
+    response = httpx.Response(status, headers=headers, request=request)
+    return httpx.HTTPStatusError("failed", request=request, response=response)
+
+
+def test_retry_after_comes_from_the_response():
+    assert retry_after(status_error(503, {"Retry-After": "7"})) == 7
+    assert retry_after(status_error(503, {"Retry-After": "soon"})) == ML_RETRY_AFTER
+    assert retry_after(status_error(500)) == ML_RETRY_AFTER
+    assert retry_after(httpx.ConnectTimeout("timed out")) == ML_RETRY_AFTER
+
+
+def test_sender_hears_when_ml_service_fails(monkeypatch):
+    emitted = []
+    saved = []
+
+    async def allow(user, room):
+        return 0
+
+    async def nothing(*args, **kwargs):
+        return None
+
+    async def not_optimistic(room):
+        return False
+
+    async def warming_up(data, result=None):
+        raise status_error(503)
+
+    async def emit(event, data, **kwargs):
+        emitted.append((event, data, kwargs))
+
+    async def save(user, data, result):
+        saved.append(data)
+
+    monkeypatch.setattr(sockets.rate_limiter, "check", allow)
+    monkeypatch.setattr(sockets.typing_tracker, "stopped", nothing)
+    monkeypatch.setattr(sockets, "precheck", lambda message: None)
+    monkeypatch.setattr(sockets, "is_optimistic", not_optimistic)
+    monkeypatch.setattr(sockets, "moderate_message", warming_up)
+    monkeypatch.setattr(sockets, "save_message", save)
+    monkeypatch.setattr(sockets.sio, "emit", emit)
+
+    asyncio.run(sockets.handle_chat_message("sid", USER, {"room": "global", "message": "hi"}))
+
+    assert emitted == [("moderation_unavailable", {"room": "global", "retry_after": ML_RETRY_AFTER}, {"to": "sid"})]
+    assert saved == []
@@ -0,0 +1,73 @@
+import moderation.pipeline as pipeline
+from moderation.cache import ModerationCache
+
+
+def result(toxicity, backend, version="v1"):
+    return {"toxicity": toxicity, "scores": {}, "model_version": version, "backend": backend}
+
+
+def test_cascade_scores_are_keyed_on_raw_text(with_redis):
+    async def test(redis):
+        cache = ModerationCache(redis=redis)
+        # escalated to the transformer, which saw the raw text
+        await cache.set("YOU IDIOT!!!", result(0.95, "cascade"))
+
+        assert (await cache.get("YOU IDIOT!!!"))["toxicity"] == 0.95
+        assert await cache.get("you idiot") is None
+
+        # another node learns the backend from Redis before its first result
+        other = ModerationCache(redis=redis)
+        assert await other.get("you idiot") is None
+        assert (await other.get("YOU IDIOT!!!"))["toxicity"] == 0.95
+
+    with_redis(test)
+
+
+def test_tfidf_scores_are_keyed_on_normalized_text(with_redis):
+    async def test(redis):
+        cache = ModerationCache(redis=redis)
+        await cache.set("YOU IDIOT!!!", result(0.8, "tfidf"))
+
+        assert (await cache.get("you idiot"))["toxicity"] == 0.8
+
+    with_redis(test)
+
+
+class Prefilter:
+    version = "v2"   # the model_version it was exported from
+
+    def check(self, message):
+        return {"toxicity": 0.0}
+
+
+def test_prefilter_only_runs_for_tfidf(with_redis, monkeypatch):
+    async def test(redis):
+        cache = ModerationCache(redis=redis)
+        monkeypatch.setattr(pipeline, "prefilter", Prefilter())
+        monkeypatch.setattr(pipeline, "moderation_cache", cache)
+
+        assert pipeline.precheck("hi") is None   # backend not known yet
+
+        await cache.set("hi", result(0.01, "cascade"))
+        assert pipeline.precheck("hi") is None
+
+        await cache.set("hi", result(0.01, "tfidf", version="v2"))
+        assert pipeline.precheck("hi") == {"toxicity": 0.0}
+
+    with_redis(test)
+
+
+def test_prefilter_is_skipped_after_a_retrain(with_redis, monkeypatch):
+    async def test(redis):
+        cache = ModerationCache(redis=redis)
+        monkeypatch.setattr(pipeline, "prefilter", Prefilter())
+        monkeypatch.setattr(pipeline, "moderation_cache", cache)
+
+        await cache.set("hi", result(0.01, "tfidf", version="v2"))
+        assert pipeline.precheck("hi") == {"toxicity": 0.0}
+
+        # ml-service now runs a newer model than the exported pre-filter
+        await cache.set("hi", result(0.01, "tfidf", version="v3"))
+        assert pipeline.precheck("hi") is None
+
+    with_redis(test)
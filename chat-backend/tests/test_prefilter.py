@@ -0,0 +1,37 @@
+from moderation.prefilter import PREFILTER_LEXICON_PATH, Lexicon, PreFilter, deobfuscate
+
+
+class CleanModel:
+    """Scores everything as clean, like the TF-IDF model does for short slurs."""
+
+    def score(self, text):
+        return 0.065, {}
+
+
+def make_prefilter():
+    return PreFilter(CleanModel(), Lexicon.load(PREFILTER_LEXICON_PATH))
+
+
+def test_trailing_punctuation_is_not_leetspeak():
+    assert deobfuscate("kys!") == "kys"
+    assert deobfuscate("hope you die!!") == "hope you die"
+    assert deobfuscate("sh!t") == "shit"
+    assert deobfuscate("$hit") == "shit"
+    assert deobfuscate("k1ll y0urself") == "kill yourself"
+
+
+def test_severe_terms_block_with_trailing_punctuation():
+    prefilter = make_prefilter()
+
+    for text in ["kys!", "hope you die!!", "kill yourself!"]:
+        result = prefilter.check(text)
+        assert result is not None and result["toxicity"] == 1.0, text
+
+
+def test_mild_terms_are_never_approved_locally():
+    prefilter = make_prefilter()
+
+    for text in ["f*ck!", "idiot!", "go die!"]:
+        assert prefilter.check(text) is None, text
+
+    assert prefilter.check("see you tomorrow!")["toxicity"] == 0.065
@@ -0,0 +1,139 @@
+from chat.presence import Presence
+
+
+def deltas(presence):
+    return {room: (sorted(d["joined"]), sorted(d["left"])) for room, d in presence.pending.items()}
+
+
+def test_second_tab_changes_nothing(with_redis):
+    async def test(redis):
+        presence = Presence(redis=redis)
+        await presence.connected("a", ["global"])
+        await presence.connected("a", ["global"])
+        presence.pending.clear()
+
+        await presence.disconnected("a", ["global"])
+        assert deltas(presence) == {}
+        assert await presence.snapshot("global") == ["a"]
+
+        await presence.disconnected("a", ["global"])
+        assert deltas(presence) == {"global": ([], ["a"])}
+        assert await presence.snapshot("global") == []
+
+    with_redis(test)
+
+
+def test_tabs_with_different_rooms(with_redis):
+    tab_a = ["global", "room_1"]
+    tab_b = ["global", "room_1", "room_2"]
+
+    async def test(redis):
+        presence = Presence(redis=redis)
+        await presence.connected("a", tab_a)
+        await presence.connected("a", tab_b)
+        presence.pending.clear()
+
+        # B closes first: only room_2 loses the user
+        await presence.disconnected("a", tab_b)
+        assert deltas(presence) == {"room_2": ([], ["a"])}
+        assert await presence.snapshot("room_1") == ["a"]
+        assert await presence.snapshot("room_2") == []
+        presence.pending.clear()
+
+        await presence.disconnected("a", tab_a)
+        assert deltas(presence) == {"global": ([], ["a"]), "room_1": ([], ["a"])}
+        for room in tab_b:
+            assert await presence.snapshot(room) == []
+
+    with_redis(test)
+
+
+def test_other_users_unaffected(with_redis):
+    async def test(redis):
+        presence = Presence(redis=redis)
+        await presence.connected("a", ["global", "room_1"])
+        await presence.connected("b", ["global"])
+        await presence.disconnected("a", ["global", "room_1"])
+
+        assert await presence.snapshot("global") == ["b"]
+        assert await presence.snapshot("room_1") == []
+
+    with_redis(test)
+
+
+def test_crashed_node_is_swept(with_redis):
+    async def test(redis):
+        crashed = Presence(redis=redis)
+        alive = Presence(redis=redis)
+        await crashed.heartbeat()
+        await alive.heartbeat()
+
+        await crashed.connected("a", ["global", "room_1"])
+        await crashed.connected("b", ["global"])
+        await alive.connected("b", ["global"])
+
+        # still heartbeating -> nothing to sweep
+        await alive.sweep()
+        assert await alive.snapshot("global") == ["a", "b"]
+
+        # the crashed node stops renewing its heartbeat
+        await redis.delete(f"presence:alive:{crashed.node}")
+        await alive.sweep()
+
+        assert deltas(alive) == {"global": ([], ["a"]), "room_1": ([], ["a"])}
+        assert await alive.snapshot("global") == ["b"]
+        assert await alive.snapshot("room_1") == []
+        assert await redis.smembers("presence:nodes") == {alive.node}
+
+        # b's socket on the live node still counts once
+        alive.pending.clear()
+        await alive.disconnected("b", ["global"])
+        assert deltas(alive) == {"global": ([], ["b"])}
+
+    with_redis(test)
+
+
+def test_room_joined_after_connect(with_redis):
+    async def test(redis):
+        presence = Presence(redis=redis)
+        await presence.connected("a", ["global"])
+        await presence.connected("a", ["room_7"])
+        assert await presence.snapshot("room_7") == ["a"]
+
+        await presence.disconnected("a", ["room_7"])
+        await presence.disconnected("a", ["global"])
+        assert await presence.snapshot("global") == []
+        assert await redis.hgetall(f"presence:node:{presence.node}") == {}
+
+    with_redis(test)
+
+
+def test_join_and_leave_update_presence_rooms(with_redis, monkeypatch):
+    from chat import sockets
+
+    async def noop(*args, **kwargs):
+        pass
+
+    for name in ("enter_room", "leave_room", "emit"):
+        monkeypatch.setattr(sockets.sio, name, noop)
+
+    async def test(redis):
+        presence = Presence(redis=redis)
+        monkeypatch.setattr(sockets, "presence", presence)
+        user = {"email": "a", "user_id": 1, "presence_rooms": ["global"]}
+        monkeypatch.setitem(sockets.connected_users, "sid", user)
+        await presence.connected("a", ["global"])
+
+        await sockets.join_room("sid", {"room": "private_a_b"})
+        await sockets.join_room("sid", {"room": "private_a_b"})
+        assert user["presence_rooms"] == ["global", "private_a_b"]
+        assert await presence.snapshot("private_a_b") == ["a"]
+
+        await sockets.leave_room("sid", {"room": "private_a_b"})
+        assert user["presence_rooms"] == ["global"]
+        assert await presence.snapshot("private_a_b") == []
+
+        await sockets.disconnect("sid")
+        assert await presence.snapshot("global") == []
+
+    with_redis(test)
@@ -0,0 +1,153 @@
+import asyncio
+
+from chat.rate_limit import RateLimiter
+
+
+class ScriptRedis:
+    """Just enough of a Redis client to answer the token-bucket script."""
+
+    def __init__(self, reply):
+        self.reply = reply
+        self.calls = []
+
+    def register_script(self, script):
+        return self.run
+
+    async def run(self, keys, args):
+        self.calls.append(keys)
+        return self.reply
+
+
+async def redis_now(redis):
+    seconds, micros = await redis.time()
+    return seconds + micros / 1_000_000
+
+
+def test_leased_tokens_skip_redis(with_redis):
+    async def test(redis):
+        limiter = RateLimiter(redis=redis, user=(1, 5), room=(0, 0), overall=(0, 0), lease_size=3)
+
+        assert [await limiter.check("a", "r") for _ in range(3)] == [0, 0, 0]
+        assert limiter.stats["redis_calls"] == 1
+        assert limiter.stats["allowed_leased"] == 2
+        assert 1.9 < float(await redis.hget("rate:user:a", "tokens")) < 2.1
+
+        assert await limiter.check("a", "r") == 0
+        assert limiter.stats["redis_calls"] == 2
+
+    with_redis(test)
+
+
+def test_many_users_share_a_room_one_token_each(with_redis):
+    async def test(redis):
+        limiter = RateLimiter(redis=redis, user=(1, 5), room=(20, 40), overall=(0, 0),
+                              room_exempt=set(), lease_size=3)
+
+        assert [await limiter.check(f"u{i}", "room_1") for i in range(20)] == [0] * 20
+        assert 19.9 < float(await redis.hget("rate:room:room_1", "tokens")) < 21
+
+    with_redis(test)
+
+
+def test_one_user_many_rooms_within_the_user_burst(with_redis):
+    async def test(redis):
+        limiter = RateLimiter(redis=redis, user=(1, 5), room=(20, 40), overall=(0, 0),
+                              room_exempt={"global"}, lease_size=3)
+
+        rooms = ["global", "room_1", "room_2", "room_3", "global"]
+        assert [await limiter.check("a", room) for room in rooms] == [0] * 5
+        assert await limiter.check("a", "room_4") > 0
+
+        # each room bucket paid for its one message only
+        for room in ("room_1", "room_2", "room_3"):
+            assert 38.9 < float(await redis.hget(f"rate:room:{room}", "tokens")) < 40
+
+    with_redis(test)
+
+
+def test_no_bucket_is_charged_unless_all_have_a_token(with_redis):
+    async def test(redis):
+        limiter = RateLimiter(redis=redis, user=(1, 5), room=(0.01, 1), overall=(0, 0),
+                              room_exempt=set(), lease_size=1)
+
+        assert await limiter.check("a", "r") == 0
+        assert await limiter.check("b", "r") > 1
+
+        # the room said no, so b's own bucket was never touched
+        assert not await redis.exists("rate:user:b")
+        assert 3.9 < float(await redis.hget("rate:user:a", "tokens")) < 4.1
+
+    with_redis(test)
+
+
+def test_lease_is_capped_by_the_user_bucket(with_redis):
+    async def test(redis):
+        limiter = RateLimiter(redis=redis, user=(0.01, 2), room=(0, 0), overall=(0, 0), lease_size=3)
+
+        assert await limiter.check("a", "r") == 0
+        assert limiter.leases["a"][0] == 1
+        assert await limiter.check("a", "r") == 0
+        assert limiter.stats["redis_calls"] == 1
+        assert await limiter.check("a", "r") > 0
+
+    with_redis(test)
+
+
+def test_refill_uses_the_redis_clock(with_redis):
+    async def test(redis):
+        limiter = RateLimiter(redis=redis, user=(1, 5), room=(0, 0), overall=(0, 0), lease_size=1)
+        now = await redis_now(redis)
+
+        await redis.hset("rate:user:a", mapping={"tokens": 0, "ts": now - 10})
+        assert await limiter.check("a", "r") == 0
+
+        await redis.hset("rate:user:b", mapping={"tokens": 0, "ts": now + 5})
+        assert 0.9 < await limiter.check("b", "r") <= 1
+
+    with_redis(test)
+
+
+def test_exempt_rooms_have_no_room_bucket(with_redis):
+    async def test(redis):
+        limiter = RateLimiter(redis=redis, user=(1, 5), room=(1, 1), overall=(0, 0), room_exempt={"global"})
+
+        assert await limiter.check("a", "global") == 0
+        assert await limiter.check("b", "global") == 0
+        assert not await redis.exists("rate:room:global")
+        assert await redis.exists("rate:user:a")
+
+        assert await limiter.check("a", "room_1") == 0
+        assert await redis.exists("rate:room:room_1")
+
+    with_redis(test)
+
+
+def test_floods_are_turned_away_locally():
+    redis = ScriptRedis(["1", "0"])
+    limiter = RateLimiter(redis=redis, user=(1, 5), room=(0, 0), overall=(0, 0))
+
+    async def flood():
+        return [await limiter.check("a", "r") for _ in range(8)]
+
+    results = asyncio.run(flood())
+
+    assert results[:5] == [0] * 5
+    assert all(r > 0 for r in results[5:])
+    assert len(redis.calls) == 5
+    assert limiter.stats["limited_local"] == 3
+
+
+def test_redis_rejection_refunds_the_local_bucket():
+    redis = ScriptRedis(["0", "2.5"])
+    limiter = RateLimiter(redis=redis, user=(1, 5), room=(0, 0), overall=(0, 0))
+
+    async def test():
+        assert await limiter.check("a", "r") == 2.5
+        assert limiter.levels["a"][0] == 0.0
+
+        # the rejection is remembered, so the retry doesn't go to Redis
+        assert await limiter.check("a", "r") > 2
+        assert len(redis.calls) == 1
+        assert limiter.levels["a"][0] == 0.0
+
+    asyncio.run(test())
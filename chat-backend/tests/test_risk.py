@@ -0,0 +1,50 @@
+import random
+
+import moderation.risk as risk
+from moderation.risk import RiskStore
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def time(self):
+        return self.now
+
+
+def test_benign_chatter_never_raises_the_level(with_redis, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(risk, "time", clock)
+    scores = random.Random(0)
+
+    async def test(redis):
+        store = RiskStore(redis=redis)
+
+        # a very active, clean user: 2 messages a minute for a day
+        for _ in range(2 * 60 * 24):
+            state = await store.record("a", scores.uniform(0.0, store.toxic_at - 0.01))
+            assert state["level"] == "normal"
+            clock.now += 30
+
+        assert (await store.get_many(["a"]))["a"]["score"] == 0.0
+
+    with_redis(test)
+
+
+def test_toxic_messages_raise_the_level(with_redis, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(risk, "time", clock)
+
+    async def test(redis):
+        store = RiskStore(redis=redis)
+
+        levels = []
+        for _ in range(6):
+            levels.append((await store.record("a", 0.9))["level"])
+            clock.now += 30
+
+        assert levels[0] == "normal"
+        assert levels[-1] == "high"
+        assert (await store.get_many(["a"]))["a"]["level"] == "high"
+
+    with_redis(test)
@@ -0,0 +1,224 @@
+"""
+chat/serialization.py and chat/pubsub.py override private python-socketio
+methods. These fail when an upgrade changes one of them, or when the
+overrides stop doing their job (msgpack clients, shard routing), instead
+of either breaking silently; re-check the overrides against the new
+release before raising the pins in requirements.txt.
+"""
+import asyncio
+import inspect
+import json
+import uuid
+
+import msgpack
+import socketio
+from socketio import base_server, packet
+from socketio.async_pubsub_manager import AsyncPubSubManager
+
+from chat.pubsub import ShardedRedisManager
+from chat.serialization import NegotiatingServer
+from conftest import TEST_REDIS_URL
+
+MANAGER_OVERRIDES = {
+    "_publish": "(self, data)",
+    "_redis_listen_with_retries": "(self)",
+    "_listen": "(self)",
+    "connect": "(self, eio_sid, namespace)",
+    "basic_enter_room": "(self, sid, namespace, room, eio_sid=None)",
+    "basic_leave_room": "(self, sid, namespace, room)",
+    "enter_room": "(self, sid, namespace, room, eio_sid=None)",
+    "leave_room": "(self, sid, namespace, room)",
+    "disconnect": "(self, sid, namespace, **kwargs)",
+    "close_room": "(self, room, namespace=None)",
+    "_handle_enter_room": "(self, message)",
+    "_handle_leave_room": "(self, message)",
+    "_handle_close_room": "(self, message)",
+}
+
+
+def signature(cls, name):
+    return str(inspect.signature(getattr(cls, name)))
+
+
+def check(cls, expected):
+    for name, params in expected.items():
+        assert hasattr(cls, name), f"{cls.__name__}.{name} is gone"
+        assert signature(cls, name) == params, f"{cls.__name__}.{name}{signature(cls, name)} changed"
+
+
+def test_server_internals_used_by_negotiating_server():
+    check(socketio.AsyncServer, {
+        "_handle_eio_connect": "(self, eio_sid, environ)",
+        "_handle_eio_disconnect": "(self, eio_sid, reason)",
+        "_send_packet": "(self, eio_sid, pkt)",
+        "_send_eio_packet": "(self, eio_sid, eio_pkt)",
+    })
+    assert "serializer" in inspect.signature(base_server.BaseServer.__init__).parameters
+
+
+def test_packet_internals_used_by_negotiated_packet():
+    check(packet.Packet, {
+        "encode": "(self)",
+        "decode": "(self, encoded_packet)",
+        "_to_dict": "(self)",
+    })
+
+
+def test_negotiating_server_overrides_match():
+    # every override still has the base signature
+    for name in ("_handle_eio_connect", "_handle_eio_disconnect", "_send_packet", "_send_eio_packet"):
+        assert signature(NegotiatingServer, name) == signature(socketio.AsyncServer, name)
+
+
+def test_manager_internals_used_by_sharded_manager():
+    check(socketio.AsyncRedisManager, {**MANAGER_OVERRIDES, "_redis_connect": "(self)"})
+    assert inspect.isasyncgenfunction(socketio.AsyncRedisManager._redis_listen_with_retries)
+    assert inspect.isasyncgenfunction(socketio.AsyncRedisManager._listen)
+
+
+def test_sharded_manager_overrides_match():
+    for name in MANAGER_OVERRIDES:
+        assert name in vars(ShardedRedisManager), f"{name} is no longer overridden"
+        assert signature(ShardedRedisManager, name) == signature(socketio.AsyncRedisManager, name)
+
+
+def test_manager_state_used_by_sharded_manager():
+    manager = ShardedRedisManager("redis://localhost:6379/15")
+    assert isinstance(manager.host_id, str) and len(manager.host_id) >= 12
+    assert manager.channel == "socketio"
+    assert isinstance(manager.rooms, dict)
+
+    # what the publish / listen overrides reconnect with
+    manager._redis_connect()
+    assert manager.connected and manager.redis is not None and manager.pubsub is not None
+
+
+def test_published_messages_still_route():
+    # route() reads these fields from what the base manager publishes
+    manager = ShardedRedisManager("redis://localhost:6379/15", shards=16)
+    published = []
+
+    async def publish(data):
+        published.append(data)
+
+    manager._publish = publish
+    remote = f"{'a' * 12}.xyz"
+
+    async def main():
+        await AsyncPubSubManager.emit(manager, "new_message", {}, namespace="/", room="global")
+        await AsyncPubSubManager.enter_room(manager, remote, "/", "room_1")
+        await AsyncPubSubManager.leave_room(manager, remote, "/", "room_1")
+
+    asyncio.run(main())
+
+    assert [m["method"] for m in published] == ["emit", "enter_room", "leave_room"]
+    assert manager.route(published[0]) == manager.room_channel("/", "global")
+    assert manager.route(published[1]) == f"socketio:node:{'a' * 12}"
+    assert manager.route(published[2]) == f"socketio:node:{'a' * 12}"
+
+
+# ---------------------------------------------------
+# Behaviour the overrides exist for
+# ---------------------------------------------------
+MESSAGE = {"user": "a@example.com", "message": "hi", "toxicity": 0.01}
+
+
+async def server_with_clients(server, clients):
+    # clients: eio sid -> "msgpack" | "json"; frames: [(eio sid, what was sent)]
+    frames = []
+
+    async def send(eio_sid, data):
+        frames.append((eio_sid, data))
+
+    async def send_packet(eio_sid, eio_pkt):
+        frames.append((eio_sid, eio_pkt.data))
+
+    server.eio.send = send
+    server.eio.send_packet = send_packet
+
+    for eio_sid, codec in clients.items():
+        use_msgpack = codec == "msgpack"
+        await server._handle_eio_connect(eio_sid, {"QUERY_STRING": "serializer=msgpack" if use_msgpack else ""})
+        connect = packet.Packet(packet.CONNECT, namespace="/")
+        await server._handle_eio_message(eio_sid, msgpack.packb(connect._to_dict()) if use_msgpack else connect.encode())
+        await server.enter_room(server.manager.sid_from_eio_sid(eio_sid, "/"), "room_1")
+
+    frames.clear()
+    return frames
+
+
+def test_msgpack_client_round_trip():
+    received = []
+
+    async def main():
+        server = NegotiatingServer(async_mode="asgi", msgpack=True)
+
+        @server.on("chat_message")
+        async def chat_message(sid, data):
+            received.append(data)
+
+        frames = await server_with_clients(server, {"m": "msgpack", "j": "json"})
+
+        # client -> server: a msgpack frame is decoded like a JSON one
+        event = packet.Packet(packet.EVENT, data=["chat_message", MESSAGE], namespace="/")
+        await server._handle_eio_message("m", msgpack.packb(event._to_dict()))
+        await asyncio.sleep(0)   # handlers run as tasks
+
+        # server -> client: room fan-out and an emit to the sid
+        await server.emit("new_message", MESSAGE, room="room_1")
+        await server.emit("toxicity_update", {"toxicity": 0.01}, to=server.manager.sid_from_eio_sid("m", "/"))
+        return frames
+
+    frames = asyncio.run(main())
+
+    assert received == [MESSAGE]
+    to_msgpack = [data for eio_sid, data in frames if eio_sid == "m"]
+    assert [msgpack.unpackb(data) for data in to_msgpack] == [
+        {"type": packet.EVENT, "data": ["new_message", MESSAGE], "nsp": "/"},
+        {"type": packet.EVENT, "data": ["toxicity_update", {"toxicity": 0.01}], "nsp": "/"},
+    ]
+
+
+def test_json_clients_unaffected():
+    async def sent_to_json_client(server, clients):
+        frames = await server_with_clients(server, clients)
+        await server.emit("new_message", MESSAGE, room="room_1")
+        await server.emit("toxicity_update", {"toxicity": 0.01}, to=server.manager.sid_from_eio_sid("j", "/"))
+        return [str(data) for eio_sid, data in frames if eio_sid == "j"]
+
+    stock = asyncio.run(sent_to_json_client(socketio.AsyncServer(async_mode="asgi"), {"j": "json"}))
+    # the same frames, with a msgpack client sharing the room
+    negotiating = asyncio.run(sent_to_json_client(
+        NegotiatingServer(async_mode="asgi", msgpack=True), {"j": "json", "m": "msgpack"}
+    ))
+
+    assert negotiating == stock
+    assert packet.Packet(encoded_packet=stock[0]).data == ["new_message", MESSAGE]
+
+
+def test_room_emit_reaches_only_its_shard(with_redis):
+    async def test(redis):
+        channel = f"test-{uuid.uuid4().hex[:8]}"
+        manager = ShardedRedisManager(TEST_REDIS_URL, channel=channel, shards=16)
+        manager.json = json   # set by the server in initialize()
+        rooms = ["room_1", next(f"room_{i}" for i in range(2, 100)
+                                if manager.room_channel("/", f"room_{i}") != manager.room_channel("/", "room_1"))]
+
+        pubsub = redis.pubsub()
+        await pubsub.psubscribe(f"{channel}*")
+        await pubsub.get_message(timeout=1)   # psubscribe confirmation
+
+        try:
+            await AsyncPubSubManager.emit(manager, "new_message", MESSAGE, namespace="/", room=rooms[0])
+
+            seen = []
+            while (message := await pubsub.get_message(ignore_subscribe_messages=True, timeout=0.5)) is not None:
+                seen.append(message["channel"])
+        finally:
+            await pubsub.aclose()
+            await manager.redis.aclose()
+
+        assert seen == [manager.room_channel("/", rooms[0])]
+        assert manager.room_channel("/", rooms[1]) not in seen and channel not in seen
+
+    with_redis(test)
@@ -1,7 +1,8 @@
 "use client";
 
-import { useEffect, useState } from "react";
+import { useEffect, useRef, useState } from "react";
 import { createSocket } from "@/lib/socket";
+import { getEmail } from "@/lib/auth";
 import ToxicityMeter from "@/components/ToxicityMeter";
 import MessageBubble from "@/components/MessageBubble";
 import TypingIndicator from "@/components/TypingIndicator";
@@ -13,7 +14,8 @@ export default function Chat() {
   const [input, setInput] = useState("");
   const [toxicity, setToxicity] = useState(0);
 
-  const [typingUsers, setTypingUsers] = useState<string[]>([]);
+  const [typingByRoom, setTypingByRoom] = useState<Record<string, string[]>>({});
+  const lastTypingSent = useRef(0);
   const [onlineUsers, setOnlineUsers] = useState<string[]>([]);
 
   const [currentRoom, setCurrentRoom] = useState("global");
@@ -29,31 +31,75 @@ export default function Chat() {
     s.on("connect", () => {
       console.log("🟢 Connected to socket");
       s.emit("join_room", { room: "global" });
+
+      // full online list once; presence_delta keeps it current
+      s.emit("presence_snapshot", { room: "global" }, (data: any) => {
+        setOnlineUsers(data.users);
+      });
     });
 
     s.on("new_message", (msg: any) => {
       setMessages(prev => [...prev, msg]);
     });
 
+    // Optimistic rooms: pending messages get replaced once moderated
+    s.on("message_approved", (data: any) => {
+      setMessages(prev => prev.map(m =>
+        m.id === data.id ? { ...m, status: "approved", toxicity: data.toxicity } : m
+      ));
+    });
+
+    s.on("message_censored", (data: any) => {
+      setMessages(prev => prev.map(m =>
+        m.id === data.id
+          ? { ...m, status: "censored", toxicity: data.toxicity, moderated_text: data.moderated_text }
+          : m
+      ));
+    });
+
+    s.on("message_retracted", (data: any) => {
+      setMessages(prev => prev.filter(m => m.id !== data.id));
+    });
+
     s.on("moderation_notice", (data: any) => {
       alert(data.message);
       setToxicity(data.toxicity);
     });
 
+    s.on("rate_limited", (data: any) => {
+      setMessages(prev => [
+        ...prev,
+        { system: true, message: `⏳ Slow down, try again in ${Math.ceil(data.retry_after)}s` }
+      ]);
+    });
+
+    s.on("moderation_unavailable", (data: any) => {
+      setMessages(prev => [
+        ...prev,
+        { system: true, message: `⚠️ Message not sent, moderation is unavailable. Try again in ${Math.ceil(data.retry_after)}s` }
+      ]);
+    });
+
     s.on("toxicity_update", (data: any) => {
       setToxicity(data.toxicity);
     });
 
-    s.on("typing", (data: any) => {
-      setTypingUsers(prev => [...new Set([...prev, data.user])]);
-
-      setTimeout(() => {
-        setTypingUsers(prev => prev.filter(u => u !== data.user));
-      }, 2000);
+    // full "who is typing" list per room, sent by the server when it changes
+    const me = getEmail();
+    s.on("typing_users", (data: any) => {
+      setTypingByRoom(prev => ({
+        ...prev,
+        [data.room]: data.users.filter((u: string) => u !== me)
+      }));
     });
 
-    s.on("online_users", (users: string[]) => {
-      setOnlineUsers(users);
+    s.on("presence_delta", (data: any) => {
+      if (data.room !== "global") return;
+
+      setOnlineUsers(prev => [
+        ...prev.filter(u => !data.left.includes(u) && !data.joined.includes(u)),
+        ...data.joined
+      ]);
     });
 
     s.on("system", (data: any) => {
@@ -82,8 +128,7 @@ export default function Chat() {
 
     socket.emit("chat_message", {
       room: currentRoom,
-      message: input,
-      chat_id: 1
+      message: input
     });
 
     setInput("");
@@ -93,7 +138,10 @@ export default function Chat() {
   // ✍️ TYPING
   // -------------------------------------------------
   function handleTyping() {
-    if (socket) {
+    // the server coalesces anyway; no need to send more than once a second
+    const now = Date.now();
+    if (socket && now - lastTypingSent.current > 1000) {
+      lastTypingSent.current = now;
       socket.emit("typing", { room: currentRoom });
     }
   }
@@ -186,7 +234,7 @@ export default function Chat() {
           )}
         </div>
 
-        <TypingIndicator users={typingUsers} />
+        <TypingIndicator users={typingByRoom[currentRoom] || []} />
 
         <div className="p-4 border-t border-gray-800">
           <input
@@ -12,7 +12,9 @@ export default function MessageBubble({ msg }: any) {
       )}
 
       <div className="mt-2 text-xs text-gray-400">
-        Toxicity: {(msg.toxicity * 100).toFixed(1)}%
+        {msg.status === "pending"
+          ? "Checking…"
+          : `Toxicity: ${(msg.toxicity * 100).toFixed(1)}%`}
       </div>
     </div>
   );
@@ -6,6 +6,18 @@ export function getToken(){
     return localStorage.getItem("token")
 }
 
+// email (JWT "sub") of the signed-in user, without verifying the token
+export function getEmail(){
+    const token = getToken()
+    if (!token) return null
+
+    try {
+        return JSON.parse(atob(token.split(".")[1].replace(/-/g, "+").replace(/_/g, "/"))).sub
+    } catch {
+        return null
+    }
+}
+
 export function logout() {
     localStorage.removeItem("token")
 }
\ No newline at end of file
@@ -1,39 +1,207 @@
-from fastapi import FastAPI
-from pydantic import BaseModel
-import joblib
+import asyncio
+import hashlib
+import os
+import time
+import traceback
+from typing import List
+
+from fastapi import FastAPI, HTTPException, Response
+from pydantic import BaseModel, Field
 from preprocess import clean_text
+from batcher import MicroBatcher
+from compact import COMPACT_DIR, CompactModel, artifact_version
+from cascade import CASCADE_LOW, CASCADE_HIGH, escalate, with_tiers
+import metrics
 
 app = FastAPI(title="Toxicity Classification API")
 
-LABELS = ["toxic", "severe_toxic", "obscene", "threat", "insult", "identity_hate"]
+# tfidf (default, fast) | transformer (more accurate, see transformer.py)
+# | cascade (tfidf, transformer only for uncertain texts, see cascade.py)
+MODEL_BACKEND = os.getenv("MODEL_BACKEND", "tfidf")
+if MODEL_BACKEND not in ("tfidf", "transformer", "cascade"):
+    raise ValueError(f"unknown MODEL_BACKEND {MODEL_BACKEND!r} (tfidf | transformer | cascade)")
+
+# compact (mmap'd model_compact/, shared by all workers, see compact.py)
+# | pkl (joblib, one private copy per process); compact when exported
+MODEL_FORMAT = os.getenv("MODEL_FORMAT", "compact" if os.path.isdir(COMPACT_DIR) else "pkl")
+if MODEL_FORMAT not in ("compact", "pkl"):
+    raise ValueError(f"unknown MODEL_FORMAT {MODEL_FORMAT!r} (compact | pkl)")
+
+# Models load after the server is listening (see startup), so liveness
+# answers at once and /ready flips only when the models are warm
+vectorizer = classifier = transformer = None
+MODEL_VERSION = None
+readiness = {"ready": False, "load_seconds": None, "error": None}
+
+
+def load_models():
+    global vectorizer, classifier, transformer, MODEL_VERSION
+    versions = []
+
+    if MODEL_BACKEND in ("tfidf", "cascade"):
+        if MODEL_FORMAT == "compact":
+            # one object is both vectorizer and classifier; sklearn is never imported
+            vectorizer = classifier = CompactModel.load()
+            versions.append(classifier.version)
+        else:
+            import joblib
+            from fused import FusedClassifier
+
+            vectorizer = joblib.load("vectorizer.pkl")
+            classifier = FusedClassifier.load()
+            versions.append(artifact_version())
+
+    if MODEL_BACKEND in ("transformer", "cascade"):
+        # torch / onnxruntime are only imported when this backend is selected
+        from transformer import TransformerClassifier, TRANSFORMER_MODEL, TRANSFORMER_MAX_LENGTH
+
+        transformer = TransformerClassifier.load()
+        versions.append(f"{TRANSFORMER_MODEL}:{transformer.runtime}:{TRANSFORMER_MAX_LENGTH}")
+
+    if MODEL_BACKEND == "cascade":
+        versions.append(f"{CASCADE_LOW}:{CASCADE_HIGH}")
 
-# Load models once
-vectorizer = joblib.load("vectorizer.pkl")
-models = joblib.load("toxicity_models.pkl")
+    MODEL_VERSION = versions[0] if MODEL_BACKEND == "tfidf" else hashlib.sha1(":".join(versions).encode()).hexdigest()[:12]
+
+
+def warm_up():
+    started = time.perf_counter()
+    load_models()
+    # first inference pays for lazy imports, regex compiles and page faults
+    # on the mapped model; do it before taking traffic
+    score_texts(["warm up", "this is a warm up message"])
+    return time.perf_counter() - started
+
+
+async def load_in_background():
+    try:
+        seconds = await asyncio.get_running_loop().run_in_executor(None, warm_up)
+    except Exception as e:
+        # stays unready; /ready reports why
+        readiness["error"] = repr(e)
+        traceback.print_exc()
+        return
+    readiness["load_seconds"] = round(seconds, 3)
+    readiness["ready"] = True
+
+
+def require_ready():
+    if not readiness["ready"]:
+        raise HTTPException(status_code=503, detail="model is warming up")
+
+BATCH_SIZE = int(os.getenv("PREDICT_BATCH_SIZE", "64"))
+BATCH_WAIT_MS = float(os.getenv("PREDICT_BATCH_WAIT_MS", "5"))
+# /predict_batch scores a request in one go on an executor thread; bigger
+# requests are rejected (422) instead of holding a thread and the GIL
+BATCH_MAX_TEXTS = int(os.getenv("PREDICT_BATCH_MAX_TEXTS", "256"))
 
 # Request schema
 class TextRequest(BaseModel):
     text: str
 
+class BatchRequest(BaseModel):
+    texts: List[str] = Field(max_length=BATCH_MAX_TEXTS)
+
+
+def score_texts(texts):
+    metrics.BATCH_SIZE.observe(len(texts))
+    if metrics.MULTIPROC:
+        # function gauges are not shared between workers; publish the depth per batch
+        metrics.QUEUED.set(batcher.queue.qsize() if batcher.queue else 0)
+
+    if MODEL_BACKEND == "transformer":
+        # raw text in; tokenization is part of the model call
+        started = time.perf_counter()
+        probs = transformer.predict_proba(texts)
+        metrics.observe(metrics.stage["predict"], started)
+        return with_tiers(transformer.to_results(probs), [True] * len(texts))
+
+    started = time.perf_counter()
+    clean = [clean_text(t) for t in texts]
+    metrics.observe(metrics.stage["preprocess"], started)
+
+    started = time.perf_counter()
+    vec = vectorizer.transform(clean)
+    metrics.observe(metrics.stage["vectorize"], started)
+
+    started = time.perf_counter()
+    probs = classifier.predict_proba(vec)
+    metrics.observe(metrics.stage["predict"], started)
+
+    if MODEL_BACKEND == "tfidf":
+        return with_tiers(classifier.to_results(probs), [False] * len(texts))
+
+    # cascade: the transformer re-scores the uncertain band in one batch
+    started = time.perf_counter()
+    escalated = escalate(texts, probs, transformer)
+    metrics.observe(metrics.stage["escalate"], started)
+    metrics.ESCALATED.inc(int(escalated.sum()))
+
+    return with_tiers(classifier.to_results(probs), escalated)
+
+
+batcher = MicroBatcher(score_texts, max_batch_size=BATCH_SIZE, max_wait_ms=BATCH_WAIT_MS)
+if not metrics.MULTIPROC:
+    metrics.QUEUED.set_function(lambda: batcher.queue.qsize() if batcher.queue else 0)
+
+loader = None
+
+@app.on_event("startup")
+async def startup():
+    global loader
+    await batcher.start()
+    loader = asyncio.create_task(load_in_background())
+
+@app.on_event("shutdown")
+async def shutdown():
+    await batcher.stop()
+
 # Health check
 @app.get("/")
 async def root():
-    return {"status": "ok", "message": "Toxicity API running"}
+    return {
+        "status": "ok",
+        "message": "Toxicity API running",
+        "backend": MODEL_BACKEND,
+        "format": MODEL_FORMAT,
+        "model_version": MODEL_VERSION
+    }
 
-# Prediction endpoint
+# Readiness: 503 until the models are loaded and a warm-up inference ran
+@app.get("/ready")
+async def ready(response: Response):
+    if not readiness["ready"]:
+        response.status_code = 503
+    return {**readiness, "model_version": MODEL_VERSION}
+
+# Prediction endpoint (concurrent requests are micro-batched)
 @app.post("/predict")
 async def classify(req: TextRequest):
-    clean = clean_text(req.text)
-    vec = vectorizer.transform([clean])
+    require_ready()
+    started = time.perf_counter()
+    with metrics.IN_FLIGHT.track_inprogress():
+        result = await batcher.submit(req.text)
+    metrics.observe(metrics.request["predict"], started)
 
-    scores = {}
-    for label in LABELS:
-        prob = models[label].predict_proba(vec)[0][1]
-        scores[label] = float(prob)
+    return {**result, "model_version": MODEL_VERSION, "backend": MODEL_BACKEND}
 
-    toxicity = max(scores.values())
+# Batch prediction endpoint
+@app.post("/predict_batch")
+async def classify_batch(req: BatchRequest):
+    require_ready()
+    if not req.texts:
+        return {"results": [], "model_version": MODEL_VERSION, "backend": MODEL_BACKEND}
 
-    return {
-        "toxicity": toxicity,
-        "scores": scores
-    }
\ No newline at end of file
+    started = time.perf_counter()
+    loop = asyncio.get_running_loop()
+    with metrics.IN_FLIGHT.track_inprogress():
+        results = await loop.run_in_executor(None, score_texts, req.texts)
+    metrics.observe(metrics.request["predict_batch"], started)
+
+    return {"results": results, "model_version": MODEL_VERSION, "backend": MODEL_BACKEND}
+
+# Prometheus metrics
+@app.get("/metrics")
+async def prometheus_metrics():
+    body, content_type = metrics.render()
+    return Response(body, media_type=content_type)
@@ -0,0 +1,73 @@
+import asyncio
+
+
+class MicroBatcher:
+    """
+    Collects concurrent single-text requests and scores them together.
+
+    A batch is flushed when it reaches `max_batch_size` items or when the
+    oldest request has waited `max_wait_ms`, whichever comes first.
+    `score_fn` takes a list of texts and returns a list of results in the
+    same order; it runs in the default executor so the event loop keeps
+    accepting requests while a batch is being scored.
+    """
+
+    def __init__(self, score_fn, max_batch_size=64, max_wait_ms=5):
+        self.score_fn = score_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.queue = None
+        self.task = None
+
+    async def start(self):
+        self.queue = asyncio.Queue()
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    async def submit(self, text):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((text, future))
+        return await future
+
+    async def _collect(self):
+        # block for the first item, then gather more until full or timed out
+        batch = [await self.queue.get()]
+        deadline = asyncio.get_running_loop().time() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - asyncio.get_running_loop().time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+
+        while True:
+            batch = await self._collect()
+            texts = [text for text, _ in batch]
+
+            try:
+                results = await loop.run_in_executor(None, self.score_fn, texts)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
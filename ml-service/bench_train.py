@@ -0,0 +1,127 @@
+"""
+Wall time, peak memory and holdout ROC-AUC of train.py: the in-memory
+batch mode vs --streaming (vocab and hashing features).
+
+usage: python bench_train.py [--rows 160000] [--modes batch vocab hashing]
+
+Trains on data/train.csv when it exists. Otherwise on a synthetic corpus
+of --rows comments in the same format: words drawn from the current
+vectorizer's vocabulary (toxic rows lean on the terms with the largest
+weights) and labels sampled from the current model's probabilities.
+Each run writes to a temporary directory, never over the committed
+artifacts. Peak memory is the largest total RSS of train.py and its
+cleaning processes, sampled every 50 ms.
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+LABELS = ["toxic", "severe_toxic", "obscene", "threat", "insult", "identity_hate"]
+
+
+def synthetic_corpus(path, rows, seed=0):
+    import joblib
+    import pandas as pd
+    from fused import FusedClassifier
+
+    vectorizer = joblib.load("vectorizer.pkl")
+    classifier = FusedClassifier.load()
+    rng = np.random.default_rng(seed)
+
+    vocab = vectorizer.vocabulary_
+    words = np.array([t for t in vocab if " " not in t])
+    weight = np.array([classifier.coef[vocab[w]].max() for w in words])
+    toxic_words = words[np.argsort(weight)[-500:]]
+
+    texts = []
+    for _ in range(rows):
+        n = int(rng.integers(5, 60))
+        picked = list(rng.choice(words, n))
+        if rng.random() < 0.15:
+            k = max(2, n // 4)
+            picked[:k] = rng.choice(toxic_words, k)
+            rng.shuffle(picked)
+        texts.append(" ".join(picked))
+
+    probs = classifier.predict_proba(vectorizer.transform(texts))
+    y = (rng.random(probs.shape) < probs).astype(int)
+
+    df = pd.DataFrame(y, columns=LABELS)
+    df.insert(0, "comment_text", texts)
+    df.insert(0, "id", [f"{i:016x}" for i in range(rows)])
+    df.to_csv(path, index=False)
+
+
+def tree_rss_mb(pid):
+    # RSS of pid and all of its descendants
+    total = 0
+    stack = [pid]
+    while stack:
+        p = stack.pop()
+        try:
+            with open(f"/proc/{p}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1])
+            with open(f"/proc/{p}/task/{p}/children") as f:
+                stack.extend(int(c) for c in f.read().split())
+        except OSError:
+            pass
+    return total / 1024
+
+
+def run(mode, data, workdir):
+    cmd = [sys.executable, "train.py", "--data", data, "--output", workdir]
+    if mode == "batch":
+        cmd += ["--no-cache"]   # the cold path; prep_cache.py would skip cleaning and vectorizing
+    else:
+        cmd += ["--streaming", "--features", mode]
+
+    log = workdir + ".log"
+    started = time.perf_counter()
+    with open(log, "w") as out:
+        proc = subprocess.Popen(cmd, stdout=out, stderr=subprocess.STDOUT)
+        peak = 0
+        while proc.poll() is None:
+            peak = max(peak, tree_rss_mb(proc.pid))
+            time.sleep(0.05)
+    seconds = time.perf_counter() - started
+
+    with open(log) as f:
+        output = f.read()
+    if proc.returncode != 0:
+        raise RuntimeError(f"{mode} failed:\n{output[-3000:]}")
+
+    auc = [float(line.rsplit(":", 1)[1]) for line in output.splitlines() if line.startswith("Holdout ROC_AUC")]
+    print(f"{mode:<8} wall {seconds:7.1f} s  peak RSS {peak:7.1f} MB  mean holdout ROC-AUC {np.mean(auc):.4f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=160000, help="synthetic corpus size")
+    parser.add_argument("--modes", nargs="+", default=["batch", "vocab", "hashing"])
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="bench-train-")
+    try:
+        data = "data/train.csv"
+        if not os.path.exists(data):
+            data = os.path.join(tmp, "train.csv")
+            synthetic_corpus(data, args.rows)
+            print(f"data/train.csv not found: synthetic corpus of {args.rows} rows "
+                  f"({os.path.getsize(data) / 1e6:.0f} MB)\n")
+
+        for mode in args.modes:
+            run(mode, data, os.path.join(tmp, mode))
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Transformer latency / throughput: the fp32 one-at-a-time path in
+predict_transformer.py vs transformer.py runtimes (fp32, int8, onnx) with
+chat-length truncation and length-bucketed batches.
+
+usage: python bench_transformer.py [--messages 1000] [--runtimes fp32 int8 onnx]
+
+The corpus is fixed: comments of at most 300 characters from
+data/train.csv, sampled with random_state=0, so runs are comparable.
+Needs `pip install -r requirements-transformer.txt` (and
+`python transformer.py --export` for the onnx runtime).
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+
+def chat_corpus(n):
+    df = pd.read_csv("data/train.csv", usecols=["comment_text"])
+    texts = df["comment_text"].astype(str)
+    texts = texts[texts.str.len() <= 300]
+    return texts.sample(n=min(n, len(texts)), random_state=0).tolist()
+
+
+def latency_report(name, seconds, toxicity, reference, batch_seconds, n):
+    seconds = np.array(seconds) * 1000
+    diff = np.abs(np.array(toxicity) - np.array(reference))
+
+    bands = lambda t: np.digitize(t, [0.3, 0.7])   # approved / censored / blocked
+    agreement = (bands(np.array(toxicity)) == bands(np.array(reference))).mean()
+
+    print(f"{name:<28} p50 {np.percentile(seconds, 50):7.1f} ms  p95 {np.percentile(seconds, 95):7.1f} ms"
+          f"  batched {n / batch_seconds:7.1f} msg/s"
+          f"  |Δtox| max {diff.max():.3f}  same decision {agreement:.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=1000)
+    parser.add_argument("--latency-sample", type=int, default=200, help="messages timed one at a time")
+    parser.add_argument("--runtimes", nargs="+", default=["fp32", "int8", "onnx"])
+    args = parser.parse_args()
+
+    texts = chat_corpus(args.messages)
+    single = texts[:args.latency_sample]
+    print(f"{len(texts)} messages, {len(single)} timed individually\n")
+
+    # baseline: predict_transformer.py, fp32, max_length 512, one message per call
+    import predict_transformer
+
+    seconds, reference = [], []
+    for text in single:
+        started = time.perf_counter()
+        reference.append(predict_transformer.predict(text)["toxicity"])
+        seconds.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    for text in texts:
+        predict_transformer.predict(text)
+    latency_report("predict_transformer (fp32)", seconds, reference, reference,
+                   time.perf_counter() - started, len(texts))
+
+    from transformer import TransformerClassifier
+
+    for runtime in args.runtimes:
+        classifier = TransformerClassifier.load(runtime=runtime)
+
+        seconds, toxicity = [], []
+        for text in single:
+            started = time.perf_counter()
+            toxicity.append(float(classifier.predict_proba([text])[0].max()))
+            seconds.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        classifier.predict_proba(texts)
+        latency_report(f"transformer.py ({classifier.runtime})", seconds, toxicity, reference,
+                       time.perf_counter() - started, len(texts))
+
+
+if __name__ == "__main__":
+    main()
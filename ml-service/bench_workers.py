@@ -0,0 +1,108 @@
+"""
+Per-worker memory and cold start: MODEL_FORMAT=pkl vs compact.
+
+Starts `python serve.py` with ML_WORKERS workers for each format, waits
+until every worker answers, then reads RSS and PSS (proportional set size:
+shared pages are split between the processes mapping them, so PSS sums to
+the real footprint) from /proc/<pid>/smaps_rollup. Startup is the time from
+spawn until a /predict call succeeds.
+
+usage: python bench_workers.py [--workers 4] [--formats pkl compact]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+
+PORT = 8011
+
+
+def memory(pid):
+    # (rss, pss) in MB
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if parts[0] in ("Rss:", "Pss:"):
+                values[parts[0]] = int(parts[1]) / 1024
+    return values["Rss:"], values["Pss:"]
+
+
+def children(pid):
+    with open(f"/proc/{pid}/task/{pid}/children") as f:
+        return [int(p) for p in f.read().split()]
+
+
+def worker_pids(pid, workers):
+    # with one worker uvicorn serves in-process; otherwise the app lives in
+    # the children (skipping small helpers such as the resource tracker)
+    if workers == 1:
+        return [pid]
+    return [p for p in children(pid) if memory(p)[0] > 50]
+
+
+def wait_ready(proc, timeout=120):
+    body = json.dumps({"text": "hello there"}).encode()
+    deadline = time.perf_counter() + timeout
+
+    while time.perf_counter() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError("serve.py exited")
+        try:
+            request = urllib.request.Request(
+                f"http://127.0.0.1:{PORT}/predict", body, {"Content-Type": "application/json"}
+            )
+            urllib.request.urlopen(request, timeout=1).read()
+            return
+        except OSError:
+            time.sleep(0.05)
+
+    raise TimeoutError("service did not become ready")
+
+
+def run(model_format, workers):
+    env = {**os.environ, "MODEL_FORMAT": model_format, "ML_WORKERS": str(workers),
+           "ML_HOST": "127.0.0.1", "ML_PORT": str(PORT)}
+
+    started = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "serve.py"], env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_ready(proc)
+        first = time.perf_counter() - started
+
+        # the first answer only proves one worker is up; wait for the rest
+        deadline = time.perf_counter() + 120
+        while True:
+            loaded = worker_pids(proc.pid, workers)
+            if len(loaded) >= workers or time.perf_counter() > deadline:
+                break
+            time.sleep(0.1)
+        time.sleep(1)   # let the last worker finish importing
+        usage = [memory(p) for p in worker_pids(proc.pid, workers)]
+    finally:
+        proc.terminate()
+        proc.wait()
+
+    rss = sum(r for r, _ in usage) / len(usage)
+    pss = sum(p for _, p in usage) / len(usage)
+    total = sum(p for _, p in usage)
+    print(f"{model_format:<8} {len(usage)} workers  first ready {first:5.2f} s  "
+          f"RSS/worker {rss:6.1f} MB  PSS/worker {pss:6.1f} MB  PSS total {total:6.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--formats", nargs="+", default=["pkl", "compact"])
+    args = parser.parse_args()
+
+    for model_format in args.formats:
+        run(model_format, args.workers)
+
+
+if __name__ == "__main__":
+    main()
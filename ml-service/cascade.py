@@ -0,0 +1,38 @@
+"""
+Cascade scoring: TF-IDF scores every text, and only the texts it is unsure
+about are re-scored by the transformer.
+"""
+import os
+
+import numpy as np
+
+# TF-IDF toxicity inside [low, high] is close enough to the auto_moderator
+# 0.3 / 0.7 cut-offs to be worth a transformer call
+CASCADE_LOW = float(os.getenv("CASCADE_LOW", "0.2"))
+CASCADE_HIGH = float(os.getenv("CASCADE_HIGH", "0.8"))
+
+
+def uncertain(probs, low=CASCADE_LOW, high=CASCADE_HIGH):
+    # rows whose overall toxicity (max label score) is in the band
+    toxicity = probs.max(axis=1)
+    return (toxicity >= low) & (toxicity <= high)
+
+
+def escalate(texts, probs, transformer, low=CASCADE_LOW, high=CASCADE_HIGH):
+    """
+    Re-score the uncertain rows of `probs` (TF-IDF, modified in place) with
+    the transformer, as one batch. Returns the boolean mask of those rows.
+    """
+    escalated = uncertain(probs, low, high)
+
+    if escalated.any():
+        rows = np.flatnonzero(escalated)
+        probs[rows] = transformer.predict_proba([texts[i] for i in rows])
+
+    return escalated
+
+
+def with_tiers(results, escalated):
+    for result, slow in zip(results, escalated):
+        result["tier"] = "transformer" if slow else "tfidf"
+    return results
@@ -0,0 +1,206 @@
+"""
+Compact, memory-mapped TF-IDF model.
+
+vectorizer.pkl unpickles into a per-process Python dict (plus sklearn and
+pandas imports), so every extra uvicorn worker pays for its own copy. The
+compact format stores the same model as flat files that are mmap'd
+read-only, so all workers on a host share one copy in the page cache:
+
+  meta.json        labels, vectorizer settings, model version
+  terms.bin        UTF-8 terms, concatenated in feature order
+  offsets.npy      int64, term i is terms.bin[offsets[i]:offsets[i + 1]]
+  slots.npy        int32 open-addressing hash table (crc32, linear
+                   probing) from term to feature index, -1 = empty
+  idf.npy          float64 per feature
+  coef.npy         float64 (n_features, n_labels), the fused classifier
+  intercept.npy    float64 per label
+
+Scores match vectorizer.pkl + fused_classifier.pkl.
+
+usage: python compact.py [output_dir]    (export from the .pkl files)
+"""
+import hashlib
+import json
+import mmap
+import os
+import re
+import sys
+import zlib
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.special import expit
+
+COMPACT_DIR = os.getenv("MODEL_COMPACT_DIR", "model_compact")
+
+PKL_ARTIFACTS = ["vectorizer.pkl", "toxicity_models.pkl", "fused_classifier.pkl"]
+
+
+def artifact_version(paths=PKL_ARTIFACTS):
+    # content hash of the model files; lets clients invalidate cached scores
+    digest = hashlib.sha1()
+    for path in paths:
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                digest.update(f.read())
+    return digest.hexdigest()[:12]
+
+
+class CompactModel:
+    """
+    Vectorizer and classifier in one: transform() mirrors
+    TfidfVectorizer.transform, predict_proba() / to_results() mirror
+    FusedClassifier, so app.py can use it for both.
+    """
+
+    def __init__(self, meta, terms, offsets, slots, idf, coef, intercept):
+        self.meta = meta
+        self.labels = meta["labels"]
+        self.version = meta["version"]
+        self.token_re = re.compile(meta["token_pattern"])
+        self.lowercase = meta["lowercase"]
+        self.max_n = meta["ngram_range"][1]
+
+        self.terms = terms
+        self.offsets = offsets
+        self.slots = slots
+        self.mask = len(slots) - 1
+        # memoryview indexing returns plain ints, several times faster than numpy scalars
+        self.offset_view = memoryview(offsets)
+        self.slot_view = memoryview(slots)
+        self.idf = idf
+        self.coef = coef
+        self.intercept = intercept
+
+    @classmethod
+    def load(cls, path=COMPACT_DIR):
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+
+        with open(os.path.join(path, "terms.bin"), "rb") as f:
+            terms = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        def array(name):
+            # plain ndarray view of the mapping: same pages, faster indexing than np.memmap
+            return np.asarray(np.load(os.path.join(path, name), mmap_mode="r"))
+
+        return cls(meta, terms, array("offsets.npy"), array("slots.npy"),
+                   array("idf.npy"), array("coef.npy"), array("intercept.npy"))
+
+    def lookup(self, term):
+        key = term.encode()
+        slots, offsets, terms, mask = self.slot_view, self.offset_view, self.terms, self.mask
+        slot = zlib.crc32(key) & mask
+        while True:
+            index = slots[slot]
+            if index < 0:
+                return -1
+            if terms[offsets[index]:offsets[index + 1]] == key:
+                return index
+            slot = (slot + 1) & mask
+
+    def transform(self, texts):
+        # word uni/bigram counts -> tf-idf -> l2 rows, as a CSR matrix
+        indptr = [0]
+        indices = []
+        data = []
+        lookup = self.lookup
+
+        for text in texts:
+            if self.lowercase:
+                text = text.lower()
+            tokens = self.token_re.findall(text)
+            grams = list(tokens)
+            if self.max_n >= 2:
+                grams += [" ".join(pair) for pair in zip(tokens, tokens[1:])]
+
+            counts = {}
+            for gram in grams:
+                index = lookup(gram)
+                if index >= 0:
+                    counts[index] = counts.get(index, 0) + 1
+
+            if counts:
+                ids = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+                values = np.fromiter(counts.values(), dtype=np.float64, count=len(counts)) * self.idf[ids]
+                values /= np.sqrt(values @ values)
+                indices.extend(ids.tolist())
+                data.extend(values.tolist())
+
+            indptr.append(len(indices))
+
+        return csr_matrix(
+            (np.asarray(data, dtype=np.float64), np.asarray(indices, dtype=np.int64), np.asarray(indptr)),
+            shape=(len(indptr) - 1, len(self.idf))
+        )
+
+    def predict_proba(self, X):
+        return expit(X @ self.coef + self.intercept)
+
+    def to_results(self, probs):
+        results = []
+        for row in probs:
+            scores = {label: float(p) for label, p in zip(self.labels, row)}
+            results.append({
+                "toxicity": max(scores.values()),
+                "scores": scores
+            })
+        return results
+
+
+def export(vectorizer, classifier, output=COMPACT_DIR, version=None):
+    params = vectorizer.get_params()
+    if params["analyzer"] != "word" or params["tokenizer"] or params["preprocessor"] or params["stop_words"]:
+        raise ValueError("compact export only supports plain word analyzers")
+    if params["sublinear_tf"] or params["norm"] != "l2" or not params["use_idf"] or params["strip_accents"]:
+        raise ValueError("compact export only supports l2-normalized tf-idf")
+    if params["ngram_range"][0] != 1 or params["ngram_range"][1] > 2:
+        raise ValueError("compact export only supports uni/bigrams")
+
+    os.makedirs(output, exist_ok=True)
+
+    vocab = vectorizer.vocabulary_
+    terms = sorted(vocab, key=vocab.get)
+    encoded = [t.encode() for t in terms]
+
+    offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(b) for b in encoded])
+
+    # power-of-two table at most half full keeps probe chains short
+    size = 1
+    while size < 2 * len(terms):
+        size *= 2
+    slots = np.full(size, -1, dtype=np.int32)
+    for index, key in enumerate(encoded):
+        slot = zlib.crc32(key) & (size - 1)
+        while slots[slot] >= 0:
+            slot = (slot + 1) & (size - 1)
+        slots[slot] = index
+
+    with open(os.path.join(output, "terms.bin"), "wb") as f:
+        f.write(b"".join(encoded))
+    np.save(os.path.join(output, "offsets.npy"), offsets)
+    np.save(os.path.join(output, "slots.npy"), slots)
+    np.save(os.path.join(output, "idf.npy"), np.asarray(vectorizer.idf_, dtype=np.float64))
+    np.save(os.path.join(output, "coef.npy"), np.ascontiguousarray(classifier.coef, dtype=np.float64))
+    np.save(os.path.join(output, "intercept.npy"), np.asarray(classifier.intercept, dtype=np.float64))
+
+    with open(os.path.join(output, "meta.json"), "w") as f:
+        json.dump({
+            "labels": classifier.labels,
+            "version": version,
+            "token_pattern": params["token_pattern"],
+            "lowercase": params["lowercase"],
+            "ngram_range": list(params["ngram_range"]),
+            "n_features": len(terms)
+        }, f, indent=2)
+
+    print(f"Exported {len(terms)} features to {output}/")
+
+
+if __name__ == "__main__":
+    import joblib
+    from fused import FusedClassifier
+
+    output = sys.argv[1] if len(sys.argv) > 1 else COMPACT_DIR
+    export(joblib.load("vectorizer.pkl"), FusedClassifier.load(), output, artifact_version())
@@ -0,0 +1,10 @@
+import os
+
+
+def available_cores():
+    # CPUs this process may run on; sched_getaffinity (which honours
+    # taskset / cgroup cpusets) is Linux-only, so fall back elsewhere (macOS)
+    affinity = getattr(os, "sched_getaffinity", None)
+    if affinity is not None:
+        return len(affinity(0))
+    return os.cpu_count() or 1
@@ -1,27 +1,133 @@
-import pandas as pd
-from sklearn.metrics import classification_report, roc_auc_score
-import joblib
-from preprocess import clean_text
+"""
+usage: python evaluate.py [--data data/train.csv] [--sample N] [--cascade] [--workers N] [--no-cache]
 
-df = pd.read_csv("data/train.csv")
-labels = ["toxic", "severe_toxic", "obscene", "threat", "insult", "identity_hate"]
+Cleaned text and the TF-IDF matrix come from prep_cache.py, keyed by the
+CSV, the preprocessing code and vectorizer.pkl, so re-running after a
+classifier change skips both. All labels are scored in one pass through
+the fused classifier; the per-label reports are computed on a process
+pool from that one probability matrix.
 
-df["clean_text"] = df["comment_text"].astype(str).apply(clean_text)
+--cascade also scores the texts with the transformer (transformer.py) and
+compares TF-IDF only, transformer only and the cascade at several
+uncertainty bands: escalation rate, accuracy and cost per message.
+It defaults to a 5000-row sample, since every row is run through the
+transformer once.
+"""
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor
 
-X = df["clean_text"]
-y = df[labels]
+import numpy as np
+from sklearn.metrics import classification_report, f1_score, roc_auc_score
+from fused import FusedClassifier
+from compact import artifact_version
+from cpu import available_cores
+from prep_cache import cleaning_key, cleaned, make_key, matrices
 
-vectorizer = joblib.load("vectorizer.pkl")
-models = joblib.load("toxicity_models.pkl")
+LABELS = ["toxic", "severe_toxic", "obscene", "threat", "insult", "identity_hate"]
 
-X_vec = vectorizer.transform(X)
 
-print("\nEvaluation Results:\n")
+def label_report(label, y, probs):
+    preds = (probs > 0.5).astype(int)
+    return f"\nLabel: {label}\n{classification_report(y, preds)}\nROC_AUC: {roc_auc_score(y, probs)}"
 
-for label in labels:
-    preds = models[label].predict(X_vec)
-    probs = models[label].predict_proba(X_vec)[:, 1]
 
-    print(f"\nLabel: {label}")
-    print(classification_report(y[label], preds))
-    print("ROC_AUC:", roc_auc_score(y[label], probs))
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data", default="data/train.csv")
+    parser.add_argument("--sample", type=int, default=None)
+    parser.add_argument("--cascade", action="store_true")
+    parser.add_argument("--workers", type=int, default=None, help="processes for cleaning and metrics")
+    parser.add_argument("--no-cache", action="store_true")
+    args = parser.parse_args()
+
+    if args.cascade and args.sample is None:
+        args.sample = 5000
+
+    workers = args.workers or available_cores()
+    started = time.perf_counter()
+
+    key = None if args.no_cache else cleaning_key(args.data, LABELS)
+    texts, y = cleaned(args.data, LABELS, key, workers)
+
+    rows = np.arange(len(texts))
+    if args.sample:
+        # the rows DataFrame.sample(n, random_state=0) picks
+        rows = np.random.RandomState(0).choice(len(texts), size=min(args.sample, len(texts)), replace=False)
+    y = y[rows]
+
+    def vectorize():
+        import joblib
+        vectorizer = joblib.load("vectorizer.pkl")
+        return {"X": vectorizer.transform([texts[i] for i in rows])}
+
+    vec_key = key and make_key("eval-tfidf", key, artifact_version(["vectorizer.pkl"]), args.sample)
+    X_vec = matrices(vec_key, vectorize)["X"]
+
+    classifier = FusedClassifier.load()
+
+    # score every label in one pass
+    all_probs = classifier.predict_proba(X_vec)
+    print(f"Prepared and scored {len(rows)} rows in {time.perf_counter() - started:.1f} s")
+
+    print("\nEvaluation Results:\n")
+
+    columns = [(label, y[:, i], all_probs[:, i]) for i, label in enumerate(classifier.labels)]
+    if workers > 1:
+        with ProcessPoolExecutor(min(workers, len(columns))) as pool:
+            reports = list(pool.map(label_report, *zip(*columns)))
+    else:
+        reports = [label_report(*column) for column in columns]
+
+    for report in reports:
+        print(report)
+
+    if args.cascade:
+        cascade_report(args.data, rows, y, all_probs)
+
+
+def cascade_report(path, rows, y, all_probs):
+    import pandas as pd
+    import joblib
+    from preprocess import clean_texts
+    from transformer import TransformerClassifier
+    from cascade import CASCADE_LOW, CASCADE_HIGH, uncertain
+
+    texts = pd.read_csv(path, usecols=["comment_text"])["comment_text"].astype(str).iloc[rows].tolist()
+    toxic = y.max(axis=1) > 0   # any label
+
+    # TF-IDF cost from raw text, so a cache hit above doesn't make it look free
+    vectorizer = joblib.load("vectorizer.pkl")
+    classifier = FusedClassifier.load()
+    started = time.perf_counter()
+    classifier.predict_proba(vectorizer.transform(clean_texts(texts)))
+    tfidf_seconds = time.perf_counter() - started
+
+    transformer = TransformerClassifier.load()
+    started = time.perf_counter()
+    slow_probs = transformer.predict_proba(texts)
+    transformer_seconds = time.perf_counter() - started
+
+    tfidf_ms = tfidf_seconds / len(texts) * 1000
+    transformer_ms = transformer_seconds / len(texts) * 1000
+
+    def report(name, probs, escalated):
+        toxicity = probs.max(axis=1)
+        rate = escalated.mean()
+        cost = (0 if rate == 1 else tfidf_ms) + rate * transformer_ms
+        print(f"{name:<26} escalated {rate:6.1%}  ROC_AUC {roc_auc_score(toxic, toxicity):.4f}"
+              f"  F1@0.5 {f1_score(toxic, toxicity > 0.5):.4f}  cost {cost:7.3f} ms/msg")
+
+    print(f"\nCascade on {len(texts)} messages ({transformer.runtime} transformer, 'toxic' = any label):\n")
+    report("tfidf only", all_probs, np.zeros(len(texts), dtype=bool))
+    report("transformer only", slow_probs, np.ones(len(texts), dtype=bool))
+
+    bands = sorted({(0.3, 0.7), (0.2, 0.8), (0.1, 0.9), (0.05, 0.95), (CASCADE_LOW, CASCADE_HIGH)})
+    for low, high in bands:
+        escalated = uncertain(all_probs, low, high)
+        probs = np.where(escalated[:, None], slow_probs, all_probs)
+        report(f"cascade [{low}, {high}]", probs, escalated)
+
+
+if __name__ == "__main__":
+    main()
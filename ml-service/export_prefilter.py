@@ -0,0 +1,66 @@
+"""
+Export the TF-IDF + fused linear model as plain JSON for the chat-backend
+pre-filter (chat-backend/moderation/prefilter.py), which scores messages
+in-process without sklearn.
+
+usage: python export_prefilter.py [output.json] [--top-k N]
+
+--top-k keeps only the N features with the largest absolute weight
+(smaller file, approximate scores). By default every feature is kept and
+local scores match the ML service.
+"""
+import argparse
+import json
+import joblib
+import numpy as np
+from compact import artifact_version
+from fused import FusedClassifier
+from preprocess import STOPWORDS
+
+
+def export(output, top_k=None):
+    vectorizer = joblib.load("vectorizer.pkl")
+    classifier = FusedClassifier.load()
+
+    params = vectorizer.get_params()
+    if params["sublinear_tf"] or params["norm"] != "l2" or not params["use_idf"]:
+        raise ValueError("pre-filter export only supports l2-normalized tf-idf")
+    if params["token_pattern"] != r"(?u)\b\w\w+\b" or params["ngram_range"][1] > 2:
+        raise ValueError("pre-filter export only supports default word uni/bigrams")
+
+    vocab = vectorizer.vocabulary_
+    terms = sorted(vocab, key=vocab.get)
+    idf = vectorizer.idf_
+    coef = classifier.coef
+
+    keep = np.arange(len(terms))
+    if top_k is not None and top_k < len(terms):
+        weight = np.abs(coef).max(axis=1)
+        keep = np.sort(np.argsort(weight)[-top_k:])
+
+    features = {
+        terms[i]: [round(float(idf[i]), 5)] + [round(float(c), 5) for c in coef[i]]
+        for i in keep
+    }
+
+    with open(output, "w") as f:
+        json.dump({
+            # ml-service's model_version for these artifacts; the backend only
+            # uses the pre-filter while ml-service reports the same one
+            "version": artifact_version(),
+            "labels": classifier.labels,
+            "intercept": [float(b) for b in classifier.intercept],
+            "stopwords": sorted(STOPWORDS),
+            "features": features
+        }, f, separators=(",", ":"))
+
+    print(f"Exported {len(features)} features to {output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("output", nargs="?", default="../chat-backend/moderation/prefilter_model.json")
+    parser.add_argument("--top-k", type=int, default=None)
+    args = parser.parse_args()
+
+    export(args.output, args.top_k)
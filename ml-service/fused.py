@@ -0,0 +1,62 @@
+import os
+import joblib
+import numpy as np
+from scipy.special import expit
+
+LABELS = ["toxic", "severe_toxic", "obscene", "threat", "insult", "identity_hate"]
+
+FUSED_PATH = "fused_classifier.pkl"
+MODELS_PATH = "toxicity_models.pkl"
+
+
+class FusedClassifier:
+    """
+    All per-label LogisticRegression models folded into one weight matrix.
+
+    coef has shape (n_features, n_labels) so a TF-IDF batch of any size is
+    scored for every label with a single sparse-dense product.
+    """
+
+    def __init__(self, labels, coef, intercept):
+        self.labels = list(labels)
+        self.coef = np.ascontiguousarray(coef)
+        self.intercept = np.asarray(intercept)
+
+    @classmethod
+    def from_models(cls, models, labels=LABELS):
+        coef = np.vstack([models[label].coef_[0] for label in labels]).T
+        intercept = np.array([models[label].intercept_[0] for label in labels])
+        return cls(labels, coef, intercept)
+
+    @classmethod
+    def load(cls, path=FUSED_PATH, models_path=MODELS_PATH):
+        # fall back to fusing the per-label models if the artifact is missing
+        if not os.path.exists(path):
+            return cls.from_models(joblib.load(models_path))
+
+        data = joblib.load(path)
+        return cls(data["labels"], data["coef"], data["intercept"])
+
+    def save(self, path=FUSED_PATH):
+        joblib.dump({
+            "labels": self.labels,
+            "coef": self.coef,
+            "intercept": self.intercept
+        }, path)
+
+    def predict_proba(self, X):
+        # (n_samples, n_labels) positive-class probabilities
+        return expit(X @ self.coef + self.intercept)
+
+    def predict(self, X):
+        return (self.predict_proba(X) > 0.5).astype(int)
+
+    def to_results(self, probs):
+        results = []
+        for row in probs:
+            scores = {label: float(p) for label, p in zip(self.labels, row)}
+            results.append({
+                "toxicity": max(scores.values()),
+                "scores": scores
+            })
+        return results
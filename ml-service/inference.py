@@ -1,8 +1,9 @@
 import joblib
 from preprocess import clean_text
+from fused import FusedClassifier
 
 vectorizer = joblib.load("vectorizer.pkl")
-models = joblib.load("toxicity_models.pkl")
+classifier = FusedClassifier.load()
 
 LABELS = ["toxic", "severe_toxic", "obscene", "threat", "insult", "identity_hate"]
 
@@ -10,10 +11,8 @@ def predict(text: str):
     clean = clean_text(text)
     vec = vectorizer.transform([clean])
 
-    scores = {}
-    for label in LABELS:
-        prob = models[label].predict_proba(vec)[0][1]
-        scores[label] = float(prob)
+    probs = classifier.predict_proba(vec)[0]
+    scores = {label: float(prob) for label, prob in zip(classifier.labels, probs)}
 
     toxicity = max(scores.values())
 
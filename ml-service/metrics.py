@@ -0,0 +1,47 @@
+import os
+import time
+
+from prometheus_client import (
+    CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, generate_latest, multiprocess, CONTENT_TYPE_LATEST
+)
+
+# set by serve.py when running several workers: each worker writes its
+# samples to files there and /metrics aggregates all of them
+MULTIPROC = bool(os.getenv("PROMETHEUS_MULTIPROC_DIR"))
+
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+STAGE_SECONDS = Histogram(
+    "ml_stage_seconds", "Time per scoring stage, per batch", ["stage"], buckets=BUCKETS
+)
+REQUEST_SECONDS = Histogram(
+    "ml_request_seconds", "End-to-end request time", ["endpoint"], buckets=BUCKETS
+)
+BATCH_SIZE = Histogram(
+    "ml_batch_size", "Texts scored together", buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512)
+)
+IN_FLIGHT = Gauge(
+    "ml_in_flight_requests", "Requests currently being scored", multiprocess_mode="livesum"
+)
+ESCALATED = Counter(
+    "ml_escalated_total", "Texts the cascade sent on to the transformer"
+)
+QUEUED = Gauge(
+    "ml_batcher_queued", "Texts waiting for the micro-batcher", multiprocess_mode="livesum"
+)
+
+# resolve label children once, not on every observation
+stage = {name: STAGE_SECONDS.labels(name) for name in ("preprocess", "vectorize", "predict", "escalate")}
+request = {name: REQUEST_SECONDS.labels(name) for name in ("predict", "predict_batch")}
+
+
+def observe(histogram, started):
+    histogram.observe(time.perf_counter() - started)
+
+
+def render():
+    if MULTIPROC:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
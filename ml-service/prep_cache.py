@@ -0,0 +1,134 @@
+"""
+Content-addressed cache of the slow preprocessing steps shared by
+train.py and evaluate.py: cleaning every comment and vectorizing it.
+
+Entries live in PREP_CACHE_DIR/<key>/ where the key hashes everything
+the result depends on -- the CSV's bytes, preprocess.py and the stopword
+list for cleaned text; additionally the vectorizer (its params or its
+.pkl bytes) and the row selection for matrices. Change any of them and the
+key changes; nothing is ever invalidated by hand.
+
+  cleaned text   texts.txt (one document per line; clean_text never
+                 leaves a newline) + labels.npy
+  matrices       <name>.npz (scipy.sparse) + any extra .pkl objects
+
+Entries are written to a temp dir and renamed into place, so an
+interrupted run never leaves a half-written entry behind.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import joblib
+import numpy as np
+from scipy import sparse
+
+import preprocess
+from cpu import available_cores
+
+PREP_CACHE_DIR = os.getenv("PREP_CACHE_DIR", ".cache/prep")
+
+
+def file_digest(path, digest=None):
+    digest = digest or hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest
+
+
+def make_key(*parts):
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(json.dumps(part, sort_keys=True, default=str).encode())
+        digest.update(b"\0")
+    return digest.hexdigest()[:24]
+
+
+def cleaning_key(path, labels):
+    # input bytes + everything clean_text's output depends on
+    digest = file_digest(path)
+    file_digest(preprocess.__file__, digest)
+    file_digest(preprocess.STOPWORDS_PATH, digest)
+    return make_key("cleaned", digest.hexdigest(), labels)
+
+
+def _entry(key):
+    return os.path.join(PREP_CACHE_DIR, key)
+
+
+def _store(key, write):
+    os.makedirs(PREP_CACHE_DIR, exist_ok=True)
+    tmp = tempfile.mkdtemp(dir=PREP_CACHE_DIR, prefix=".tmp-")
+    try:
+        write(tmp)
+        os.rename(tmp, _entry(key))
+    except OSError:
+        # another run stored the same key first; theirs is identical
+        if not os.path.isdir(_entry(key)):
+            raise
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def cleaned(path, labels, key=None, workers=None):
+    """
+    (cleaned texts, labels as an int8 array) for the CSV at `path`,
+    cleaned on a process pool on a miss. key=None bypasses the cache.
+    """
+    if key and os.path.isdir(_entry(key)):
+        y = np.load(os.path.join(_entry(key), "labels.npy"))
+        with open(os.path.join(_entry(key), "texts.txt"), encoding="utf-8") as f:
+            texts = f.read().split("\n") if len(y) else []
+        return texts, y
+
+    from streaming import cleaned_chunks, read_chunks
+
+    started = time.perf_counter()
+    workers = workers or available_cores()
+    texts, y = [], []
+    for chunk_texts, chunk_y in cleaned_chunks(read_chunks(path, labels, 20000), workers):
+        texts.extend(chunk_texts)
+        y.append(chunk_y)
+    y = np.concatenate(y) if y else np.zeros((0, len(labels)), dtype=np.int8)
+    print(f"Cleaned {len(texts)} rows in {time.perf_counter() - started:.1f} s ({workers} processes)")
+
+    if key:
+        def write(tmp):
+            with open(os.path.join(tmp, "texts.txt"), "w", encoding="utf-8") as f:
+                f.write("\n".join(texts))
+            np.save(os.path.join(tmp, "labels.npy"), y)
+        _store(key, write)
+
+    return texts, y
+
+
+def matrices(key, build):
+    """
+    Cached {name: sparse matrix or any picklable object} from build().
+    Sparse matrices are stored as .npz (uncompressed: loading is the point),
+    everything else with joblib. key=None bypasses the cache.
+    """
+    if key and os.path.isdir(_entry(key)):
+        result = {}
+        for name in os.listdir(_entry(key)):
+            stem, ext = os.path.splitext(name)
+            path = os.path.join(_entry(key), name)
+            result[stem] = sparse.load_npz(path) if ext == ".npz" else joblib.load(path)
+        return result
+
+    result = build()
+
+    if key:
+        def write(tmp):
+            for name, value in result.items():
+                if sparse.issparse(value):
+                    sparse.save_npz(os.path.join(tmp, f"{name}.npz"), value.tocsr(), compressed=False)
+                else:
+                    joblib.dump(value, os.path.join(tmp, f"{name}.pkl"))
+        _store(key, write)
+
+    return result
@@ -1,14 +1,39 @@
+import os
 import re
-import nltk
-from nltk.corpus import stopwords
 
-nltk.download("stopwords")
-STOPWORDS = set(stopwords.words("english"))
+# English stopword list from nltk, bundled so importing this module never
+# touches the network
+STOPWORDS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "stopwords_english.txt")
+
+with open(STOPWORDS_PATH) as f:
+    STOPWORDS = frozenset(w.strip() for w in f if w.strip())
+
+LINK_RE = re.compile(r"http\S+")       #remove links
+MENTION_RE = re.compile(r"@\w+")       #remove mentions
+NON_ALPHA_RE = re.compile(r"[^a-z\s]") #keep only letters
+
+# ASCII fast path for NON_ALPHA_RE: delete every ASCII char that is neither
+# a lowercase letter nor whitespace (str.isspace matches regex \s)
+ASCII_NON_ALPHA = {
+    c: None for c in range(128)
+    if not ("a" <= chr(c) <= "z" or chr(c).isspace())
+}
 
 def clean_text(text):
     text = text.lower()
-    text = re.sub(r"http\S+", "", text)     #remove links
-    text = re.sub(r"@\w+", "", text)        #remove mentuions
-    text = re.sub(r"[^a-z\s]", "", text)    #keep only letters
-    text = " ".join([w for w in text.split() if w not in STOPWORDS])
-    return text
+    if "http" in text:
+        text = LINK_RE.sub("", text)
+    if "@" in text:
+        text = MENTION_RE.sub("", text)
+    if text.isascii():
+        text = text.translate(ASCII_NON_ALPHA)
+    else:
+        text = NON_ALPHA_RE.sub("", text)
+    return " ".join([w for w in text.split() if w not in STOPWORDS])
+
+def clean_texts(texts):
+    # batch variant: pandas Series in -> Series out, any other iterable -> list
+    if hasattr(texts, "map"):
+        return texts.map(clean_text)
+    return [clean_text(t) for t in texts]
+
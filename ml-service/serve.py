@@ -0,0 +1,40 @@
+"""
+Multi-process serving: ML_WORKERS uvicorn workers on one port.
+
+Every worker imports app.py and loads its own model objects, but with the
+compact format (compact.py) the model arrays are mmap'd read-only files,
+so the workers share one copy in the page cache instead of holding N.
+
+usage: python serve.py    (ML_WORKERS, ML_HOST, ML_PORT)
+"""
+import os
+import shutil
+import tempfile
+
+import uvicorn
+
+from cpu import available_cores
+
+ML_WORKERS = int(os.getenv("ML_WORKERS", str(available_cores())))
+ML_HOST = os.getenv("ML_HOST", "0.0.0.0")
+ML_PORT = int(os.getenv("ML_PORT", "8001"))
+
+
+def main():
+    # the workers size their transformer thread pools by it (transformer.py)
+    os.environ["ML_WORKERS"] = str(ML_WORKERS)
+
+    if ML_WORKERS > 1:
+        # per-worker metric files, aggregated by /metrics (see metrics.py);
+        # must be set before the workers import prometheus_client
+        path = os.environ.setdefault(
+            "PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "ml-service-metrics")
+        )
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path)
+
+    uvicorn.run("app:app", host=ML_HOST, port=ML_PORT, workers=ML_WORKERS)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+"""
+Out-of-core training for train.py --streaming.
+
+Memory is bounded by the chunk size, not the corpus:
+
+  pass 1  read the CSV in chunks, clean them on a process pool, split off
+          the holdout rows, count document frequencies and spool the
+          cleaned text to disk (one document per line; clean_text never
+          leaves a newline)
+  pass 2  vectorize each spooled chunk and partial_fit one SGD logistic
+          regression per label on it, the six labels in parallel threads
+          (sklearn's SGD releases the GIL), for `epochs` passes
+
+Features are either
+  vocab    a TfidfVectorizer with the same settings as the batch mode,
+           whose vocabulary and idf come from streamed counts. Saved as a
+           regular vectorizer.pkl, so compact.py / export_prefilter.py
+           work unchanged. The counts are exact until `max_entries` distinct
+           n-grams are tracked; past that, entries below min_df are
+           dropped, which can undercount terms that are rare early on.
+  hashing  HashingVectorizer + idf, no vocabulary at all (constant memory,
+           any corpus size), but not exportable to the compact format or
+           the pre-filter.
+"""
+import os
+import shutil
+import tempfile
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import Pool
+
+import numpy as np
+import pandas as pd
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfTransformer, TfidfVectorizer
+from sklearn.linear_model import SGDClassifier
+from sklearn.pipeline import make_pipeline
+
+from cpu import available_cores
+from preprocess import clean_texts
+from fused import FusedClassifier
+
+# same settings as the batch TfidfVectorizer in train.py
+MAX_FEATURES = 30000
+NGRAM_RANGE = (1, 2)
+MIN_DF = 5
+
+
+def read_chunks(path, labels, chunk_size):
+    for chunk in pd.read_csv(path, chunksize=chunk_size, usecols=["comment_text", *labels]):
+        yield chunk["comment_text"].astype(str).tolist(), chunk[labels].to_numpy(dtype=np.int8)
+
+
+def _clean(chunk):
+    texts, y = chunk
+    return clean_texts(texts), y
+
+
+def cleaned_chunks(chunks, workers):
+    """
+    Clean chunks on `workers` processes, in order. At most 2 * workers
+    chunks are in flight, so the reader never runs ahead of the cleaners
+    (Pool.imap would pull the whole file into its task queue).
+    """
+    if workers <= 1:
+        yield from map(_clean, chunks)
+        return
+
+    with Pool(workers) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.apply_async(_clean, (chunk,)))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+
+
+class VocabularyCounter:
+    def __init__(self, max_entries=5_000_000):
+        self.analyzer = TfidfVectorizer(ngram_range=NGRAM_RANGE).build_analyzer()
+        self.max_entries = max_entries
+        self.df = Counter()
+        self.tf = Counter()
+        self.docs = 0
+
+    def update(self, texts):
+        for text in texts:
+            grams = self.analyzer(text)
+            self.tf.update(grams)
+            self.df.update(set(grams))
+        self.docs += len(texts)
+
+        if len(self.df) > self.max_entries:
+            for term in [t for t, n in self.df.items() if n < MIN_DF]:
+                del self.df[term]
+                del self.tf[term]
+
+    def vectorizer(self):
+        # what TfidfVectorizer.fit does with min_df / max_features: drop rare
+        # terms, keep the most frequent, index them alphabetically
+        terms = [t for t, n in self.df.items() if n >= MIN_DF]
+        terms = sorted(terms, key=lambda t: -self.tf[t])[:MAX_FEATURES]
+        terms.sort()
+
+        vectorizer = TfidfVectorizer(
+            max_features=MAX_FEATURES, ngram_range=NGRAM_RANGE, min_df=MIN_DF,
+            vocabulary={t: i for i, t in enumerate(terms)}
+        )
+        df = np.array([self.df[t] for t in terms], dtype=np.float64)
+        vectorizer.idf_ = np.log((1 + self.docs) / (1 + df)) + 1   # smooth_idf
+        return vectorizer
+
+
+class HashingCounter:
+    def __init__(self, n_features=2 ** 20):
+        self.hasher = HashingVectorizer(
+            ngram_range=NGRAM_RANGE, n_features=n_features, alternate_sign=False, norm=None
+        )
+        self.df = np.zeros(n_features, dtype=np.int64)
+        self.docs = 0
+
+    def update(self, texts):
+        X = self.hasher.transform(texts)
+        self.df += np.bincount(X.indices, minlength=len(self.df))
+        self.docs += len(texts)
+
+    def vectorizer(self):
+        tfidf = TfidfTransformer()
+        tfidf.idf_ = np.log((1 + self.docs) / (1 + self.df)) + 1
+        return make_pipeline(self.hasher, tfidf)
+
+
+def spool_chunks(path, chunk_size):
+    with open(path, encoding="utf-8") as f:
+        while True:
+            texts = [line.rstrip("\n") for _, line in zip(range(chunk_size), f)]
+            if not texts:
+                return
+            yield texts
+
+
+def train_streaming(path, labels, chunk_size=20000, workers=None, features="vocab",
+                    n_features=2 ** 20, epochs=3, alpha=1e-5, holdout=0.2):
+    """
+    Returns (vectorizer, {label: SGDClassifier}, holdout probabilities,
+    holdout labels); the spooled text is deleted afterwards.
+    """
+    workers = workers or available_cores()
+    spool = tempfile.mkdtemp(prefix="train-spool-")
+    try:
+        return _train(path, labels, chunk_size, workers, features, n_features, epochs, alpha, holdout, spool)
+    finally:
+        shutil.rmtree(spool, ignore_errors=True)
+
+
+def _train(path, labels, chunk_size, workers, features, n_features, epochs, alpha, holdout, spool):
+    counter = VocabularyCounter() if features == "vocab" else HashingCounter(n_features)
+    rng = np.random.default_rng(42)
+    train_path = os.path.join(spool, "train.txt")
+    holdout_path = os.path.join(spool, "holdout.txt")
+    y_train, y_holdout = [], []
+
+    print(f"Pass 1: cleaning and counting ({workers} processes)...")
+    with open(train_path, "w", encoding="utf-8") as train_file, \
+            open(holdout_path, "w", encoding="utf-8") as holdout_file:
+        for texts, y in cleaned_chunks(read_chunks(path, labels, chunk_size), workers):
+            test = rng.random(len(texts)) < holdout
+            train_texts = [t for t, h in zip(texts, test) if not h]
+
+            counter.update(train_texts)
+            train_file.writelines(t + "\n" for t in train_texts)
+            holdout_file.writelines(t + "\n" for t, h in zip(texts, test) if h)
+            y_train.append(y[~test])
+            y_holdout.append(y[test])
+
+    y_train = np.concatenate(y_train)
+    vectorizer = counter.vectorizer()
+    del counter
+
+    models = {
+        label: SGDClassifier(loss="log_loss", alpha=alpha, random_state=0)
+        for label in labels
+    }
+
+    def fit(X, y, label):
+        models[label].partial_fit(X, y, classes=[0, 1])
+
+    print(f"Pass 2: {epochs} epoch(s) of partial_fit, {len(labels)} labels in parallel...")
+    with ThreadPoolExecutor(len(labels)) as pool:
+        for epoch in range(epochs):
+            start = 0
+            for texts in spool_chunks(train_path, chunk_size):
+                X = vectorizer.transform(texts)
+                y = y_train[start:start + len(texts)]
+                start += len(texts)
+                list(pool.map(fit, [X] * len(labels), [y[:, i] for i in range(len(labels))], labels))
+
+    classifier = FusedClassifier.from_models(models, labels)
+    probs = [classifier.predict_proba(vectorizer.transform(texts)) for texts in spool_chunks(holdout_path, chunk_size)]
+    probs = np.vstack(probs) if probs else np.zeros((0, len(labels)))
+
+    return vectorizer, models, probs, np.concatenate(y_holdout)
@@ -0,0 +1,71 @@
+"""
+clean_text must stay equivalent to the original three-pass regex version
+(below): the models were trained on that output.
+"""
+import csv
+import os
+import re
+import sys
+from itertools import islice
+
+import pytest
+
+from preprocess import STOPWORDS, clean_text, clean_texts
+
+TRAIN_CSV = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "train.csv")
+
+CASES = [
+    "",
+    "   ",
+    "Hello World",
+    "You are SO dumb!!! go away",
+    "check http://example.com/x?y=1 and https://t.co/abc now",
+    "httpnotalink and http",
+    "@someone hey @other_user, what's up?",
+    "email me at a@b.com",
+    "tabs\tand\nnewlines\r\nand\x0bvertical\x0cfeeds\x1c\x1d\x1e\x1fseparators",
+    "numbers 123 and 4th place",
+    "café naïve résumé",
+    "ÀÉÎ upper non-ascii",
+    "emoji 😀 in the middle",
+    "non breaking spaces　too",
+    "ǅungla İstanbul ß",
+    "I'm the one who's NOT going",
+]
+
+
+def clean_text_reference(text):
+    # the original implementation
+    text = text.lower()
+    text = re.sub(r"http\S+", "", text)
+    text = re.sub(r"@\w+", "", text)
+    text = re.sub(r"[^a-z\s]", "", text)
+    return " ".join([w for w in text.split() if w not in STOPWORDS])
+
+
+@pytest.mark.parametrize("text", CASES)
+def test_matches_reference(text):
+    assert clean_text(text) == clean_text_reference(text)
+
+
+def test_every_ascii_char_matches_reference():
+    for c in range(128):
+        text = f"a{chr(c)}b {chr(c)} x"
+        assert clean_text(text) == clean_text_reference(text), repr(chr(c))
+
+
+def test_batch_matches_single():
+    assert clean_texts(CASES) == [clean_text(t) for t in CASES]
+
+
+@pytest.mark.skipif(not os.path.exists(TRAIN_CSV), reason="no data/train.csv")
+def test_training_data_matches_reference():
+    csv.field_size_limit(sys.maxsize)
+    limit = int(os.getenv("PREPROCESS_CHECK_ROWS", "20000"))   # 0 = every row
+
+    with open(TRAIN_CSV, newline="", encoding="utf-8") as f:
+        rows = csv.DictReader(f)
+        texts = [row["comment_text"] for row in (islice(rows, limit) if limit else rows)]
+
+    mismatches = [t[:80] for t in texts if clean_text(t) != clean_text_reference(t)]
+    assert not mismatches, f"{len(mismatches)} of {len(texts)} rows differ, e.g. {mismatches[:3]}"
@@ -1,46 +1,120 @@
-import pandas as pd
-from sklearn.model_selection import train_test_split
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.linear_model import LogisticRegression
+"""
+usage: python train.py [--data data/train.csv] [--output .] [--streaming ...]
+
+Default: the whole CSV in memory, TfidfVectorizer + one LogisticRegression
+per label. --streaming trains out of core (see streaming.py): chunked CSV,
+multiprocess cleaning, streamed vocabulary (or --features hashing) and
+SGD logistic regression fitted chunk by chunk, all labels in parallel.
+Both write the same artifacts and report ROC-AUC on a 20% holdout.
+
+The batch mode reuses cleaned text and the fitted vectorizer + matrices
+from prep_cache.py while the CSV and settings are unchanged (--no-cache
+to bypass).
+"""
+import argparse
+import os
+import shutil
+
+import numpy as np
 import joblib
-from preprocess import clean_text
+from sklearn.metrics import roc_auc_score
+from fused import FusedClassifier
+from compact import COMPACT_DIR, artifact_version, export
 
-print("Loading dataset...")
-df = pd.read_csv("data/train.csv")
+parser = argparse.ArgumentParser()
+parser.add_argument("--data", default="data/train.csv")
+parser.add_argument("--output", default=".", help="directory for the model artifacts")
+parser.add_argument("--streaming", action="store_true")
+parser.add_argument("--no-cache", action="store_true", help="ignore the preprocessing cache (prep_cache.py)")
+parser.add_argument("--chunk-size", type=int, default=20000)
+parser.add_argument("--workers", type=int, default=None, help="cleaning processes (default: cores)")
+parser.add_argument("--features", choices=["vocab", "hashing"], default="vocab")
+parser.add_argument("--n-features", type=int, default=2 ** 20, help="hashing dimensions")
+parser.add_argument("--epochs", type=int, default=3)
+parser.add_argument("--alpha", type=float, default=1e-5, help="SGD regularization")
+args = parser.parse_args()
 
 labels = ["toxic", "severe_toxic", "obscene", "threat", "insult", "identity_hate"]
 
-print("Cleaning text...")
-df["clean_text"] = df["comment_text"].astype(str).apply(clean_text)
 
-X = df["clean_text"]
-y = df[labels]
+def holdout_report(probs, y):
+    for i, label in enumerate(labels):
+        if len(np.unique(y[:, i])) == 2:
+            print(f"Holdout ROC_AUC {label}: {roc_auc_score(y[:, i], probs[:, i]):.4f}")
+
+
+if args.streaming:
+    from streaming import train_streaming
+
+    vectorizer, models, holdout_probs, y_holdout = train_streaming(
+        args.data, labels, chunk_size=args.chunk_size, workers=args.workers, features=args.features,
+        n_features=args.n_features, epochs=args.epochs, alpha=args.alpha
+    )
+    holdout_report(holdout_probs, y_holdout)
 
-X_train, X_test, y_train, y_test = train_test_split(
-    X, y, test_size=0.2, random_state=42
-)
+else:
+    from sklearn.model_selection import train_test_split
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.linear_model import LogisticRegression
+    from prep_cache import cleaning_key, cleaned, make_key, matrices
 
-print("Vectorizing...")
-vectorizer = TfidfVectorizer(
-    max_features=30000,
-    ngram_range=(1,2),
-    min_df=5
-)
+    vectorizer_params = {"max_features": 30000, "ngram_range": (1, 2), "min_df": 5}
 
-X_train_vec = vectorizer.fit_transform(X_train)
-X_test_vec = vectorizer.transform(X_test)
+    print("Loading and cleaning dataset...")
+    key = None if args.no_cache else cleaning_key(args.data, labels)
+    texts, y = cleaned(args.data, labels, key, args.workers)
 
-models = {}
+    def vectorize():
+        print("Vectorizing...")
+        train_rows, test_rows = train_test_split(
+            np.arange(len(texts)), test_size=0.2, random_state=42
+        )
+        vectorizer = TfidfVectorizer(**vectorizer_params)
+        return {
+            "vectorizer": vectorizer,
+            "X_train": vectorizer.fit_transform([texts[i] for i in train_rows]),
+            "X_test": vectorizer.transform([texts[i] for i in test_rows]),
+            "train_rows": train_rows,
+            "test_rows": test_rows
+        }
 
-print("Training models...")
-for label in labels:
-    print(f"Training for label: {label}")
-    clf = LogisticRegression(max_iter=1000, n_jobs=-1)
-    clf.fit(X_train_vec, y_train[label])
-    models[label] = clf
+    # fitted vectorizer + both matrices, reused while data and settings are unchanged
+    prepared = matrices(key and make_key("train-tfidf", key, vectorizer_params, 0.2, 42), vectorize)
+    vectorizer = prepared["vectorizer"]
+    y_train, y_test = y[prepared["train_rows"]], y[prepared["test_rows"]]
+
+    models = {}
+
+    print("Training models...")
+    for i, label in enumerate(labels):
+        print(f"Training for label: {label}")
+        clf = LogisticRegression(max_iter=1000, n_jobs=-1)
+        clf.fit(prepared["X_train"], y_train[:, i])
+        models[label] = clf
+
+    holdout_report(FusedClassifier.from_models(models, labels).predict_proba(prepared["X_test"]), y_test)
 
 print("Saving models...")
-joblib.dump(vectorizer, "vectorizer.pkl")
-joblib.dump(models, "toxicity_models.pkl")
+os.makedirs(args.output, exist_ok=True)
+paths = [os.path.join(args.output, name) for name in ("vectorizer.pkl", "toxicity_models.pkl", "fused_classifier.pkl")]
+
+joblib.dump(vectorizer, paths[0])
+joblib.dump(models, paths[1])
+
+# single coef matrix + intercept vector used by every inference path
+fused = FusedClassifier.from_models(models, labels)
+fused.save(paths[2])
+
+# mmap-able copy for the multi-worker service (see compact.py)
+compact_dir = os.path.join(args.output, COMPACT_DIR)
+if args.streaming and args.features == "hashing":
+    print("Hashing features have no vocabulary: skipping the compact export (serving from the pkl files)")
+    # app.py serves model_compact/ whenever it exists; an older export there
+    # would keep serving the previous model
+    if os.path.isdir(compact_dir):
+        shutil.rmtree(compact_dir)
+        print(f"Removed the stale {compact_dir}/")
+else:
+    export(vectorizer, fused, compact_dir, version=artifact_version(paths))
 
-print("Training complete!")
\ No newline at end of file
+print("Training complete!")
@@ -0,0 +1,198 @@
+"""
+CPU-optimized transformer backend (unitary/unbiased-toxic-roberta).
+
+Runtimes (TRANSFORMER_RUNTIME):
+  onnx  -- ONNX Runtime on the int8-quantized export (default; falls back
+           to int8 if no export exists)
+  int8  -- PyTorch with dynamic int8 quantization of the Linear layers
+  fp32  -- plain PyTorch, the reference path (predict_transformer.py)
+
+Texts are truncated to TRANSFORMER_MAX_LENGTH tokens (chat messages are
+short; 512 mostly bought padding), sorted by length and scored in
+batches that are only padded to their own longest member.
+
+export the ONNX model once (needs `pip install -r requirements-transformer.txt`):
+    python transformer.py --export
+"""
+import argparse
+import os
+
+import numpy as np
+from scipy.special import expit
+
+from cpu import available_cores
+
+LABELS = ["toxic", "severe_toxic", "obscene", "threat", "insult", "identity_hate"]
+
+TRANSFORMER_MODEL = os.getenv("TRANSFORMER_MODEL", "unitary/unbiased-toxic-roberta")
+TRANSFORMER_RUNTIME = os.getenv("TRANSFORMER_RUNTIME", "onnx")
+TRANSFORMER_ONNX_DIR = os.getenv("TRANSFORMER_ONNX_DIR", "transformer_onnx")
+TRANSFORMER_MAX_LENGTH = int(os.getenv("TRANSFORMER_MAX_LENGTH", "128"))
+TRANSFORMER_BATCH_SIZE = int(os.getenv("TRANSFORMER_BATCH_SIZE", "32"))
+
+# every serve.py worker runs its own session: split the cores between them
+# (ML_WORKERS, which serve.py exports to its workers) rather than N x N threads
+ML_WORKERS = int(os.getenv("ML_WORKERS", "1"))
+TRANSFORMER_THREADS = int(os.getenv("TRANSFORMER_THREADS", str(max(1, available_cores() // ML_WORKERS))))
+
+# model head name -> our label (unbiased-toxic-roberta has 16 heads,
+# including identity mentions we don't use)
+HEAD_NAMES = {
+    "toxicity": "toxic",
+    "severe_toxicity": "severe_toxic",
+    "obscene": "obscene",
+    "threat": "threat",
+    "insult": "insult",
+    "identity_attack": "identity_hate",
+}
+
+
+def label_columns(id2label):
+    # column of each of our LABELS in the model's logits
+    by_name = {HEAD_NAMES.get(name, name): int(i) for i, name in id2label.items()}
+    return [by_name[label] for label in LABELS]
+
+
+class TransformerClassifier:
+    """
+    Same interface as FusedClassifier (predict_proba / to_results) but takes
+    raw texts, so app.py can switch backends without other changes.
+    """
+
+    def __init__(self, tokenizer, run, columns, runtime,
+                 max_length=TRANSFORMER_MAX_LENGTH, batch_size=TRANSFORMER_BATCH_SIZE):
+        self.tokenizer = tokenizer
+        self.run = run              # (input_ids, attention_mask) -> logits ndarray
+        self.columns = columns
+        self.runtime = runtime
+        self.max_length = max_length
+        self.batch_size = batch_size
+        self.labels = list(LABELS)
+
+    @classmethod
+    def load(cls, runtime=TRANSFORMER_RUNTIME, threads=TRANSFORMER_THREADS):
+        from transformers import AutoTokenizer
+
+        onnx_path = os.path.join(TRANSFORMER_ONNX_DIR, "model.int8.onnx")
+        if runtime == "onnx" and os.path.exists(onnx_path):
+            import onnxruntime as ort
+            from transformers import AutoConfig
+
+            options = ort.SessionOptions()
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+            options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+            session = ort.InferenceSession(onnx_path, options, providers=["CPUExecutionProvider"])
+
+            def run(input_ids, attention_mask):
+                return session.run(["logits"], {"input_ids": input_ids, "attention_mask": attention_mask})[0]
+
+            tokenizer = AutoTokenizer.from_pretrained(TRANSFORMER_ONNX_DIR)
+            config = AutoConfig.from_pretrained(TRANSFORMER_ONNX_DIR)
+            return cls(tokenizer, run, label_columns(config.id2label), "onnx")
+
+        if runtime == "onnx":
+            print(f"⚠️ {onnx_path} missing (run `python transformer.py --export`), using torch int8")
+            runtime = "int8"
+
+        import torch
+        from transformers import AutoModelForSequenceClassification
+
+        torch.set_num_threads(threads)
+        model = AutoModelForSequenceClassification.from_pretrained(TRANSFORMER_MODEL)
+        model.eval()
+
+        if runtime == "int8":
+            model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+        def run(input_ids, attention_mask):
+            with torch.inference_mode():
+                return model(
+                    input_ids=torch.from_numpy(input_ids),
+                    attention_mask=torch.from_numpy(attention_mask)
+                ).logits.numpy()
+
+        tokenizer = AutoTokenizer.from_pretrained(TRANSFORMER_MODEL)
+        return cls(tokenizer, run, label_columns(model.config.id2label), runtime)
+
+    def predict_proba(self, texts):
+        # (n_texts, n_labels) probabilities, in input order
+        encoded = self.tokenizer(list(texts), truncation=True, max_length=self.max_length)["input_ids"]
+        order = np.argsort([len(ids) for ids in encoded], kind="stable")
+        probs = np.empty((len(encoded), len(self.columns)), dtype=np.float32)
+
+        pad_id = self.tokenizer.pad_token_id
+        for start in range(0, len(order), self.batch_size):
+            bucket = order[start:start + self.batch_size]
+            width = max(len(encoded[i]) for i in bucket)
+
+            input_ids = np.full((len(bucket), width), pad_id, dtype=np.int64)
+            attention_mask = np.zeros((len(bucket), width), dtype=np.int64)
+            for row, i in enumerate(bucket):
+                ids = encoded[i]
+                input_ids[row, :len(ids)] = ids
+                attention_mask[row, :len(ids)] = 1
+
+            logits = self.run(input_ids, attention_mask)
+            probs[bucket] = expit(logits[:, self.columns])
+
+        return probs
+
+    def to_results(self, probs):
+        results = []
+        for row in probs:
+            scores = {label: float(p) for label, p in zip(self.labels, row)}
+            results.append({
+                "toxicity": max(scores.values()),
+                "scores": scores
+            })
+        return results
+
+
+def export(output=TRANSFORMER_ONNX_DIR, opset=17):
+    """Export to ONNX and write a dynamic int8-quantized copy next to it."""
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from transformers import AutoModelForSequenceClassification, AutoTokenizer
+
+    os.makedirs(output, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(TRANSFORMER_MODEL)
+    model = AutoModelForSequenceClassification.from_pretrained(TRANSFORMER_MODEL)
+    model.eval()
+
+    sample = tokenizer(["export sample"], return_tensors="pt")
+    fp32_path = os.path.join(output, "model.onnx")
+
+    torch.onnx.export(
+        model,
+        (sample["input_ids"], sample["attention_mask"]),
+        fp32_path,
+        input_names=["input_ids", "attention_mask"],
+        output_names=["logits"],
+        dynamic_axes={
+            "input_ids": {0: "batch", 1: "tokens"},
+            "attention_mask": {0: "batch", 1: "tokens"},
+            "logits": {0: "batch"}
+        },
+        opset_version=opset
+    )
+    quantize_dynamic(fp32_path, os.path.join(output, "model.int8.onnx"), weight_type=QuantType.QInt8)
+
+    tokenizer.save_pretrained(output)
+    model.config.save_pretrained(output)
+    print(f"Exported {TRANSFORMER_MODEL} to {output}/model.onnx and model.int8.onnx")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--export", action="store_true")
+    parser.add_argument("--output", default=TRANSFORMER_ONNX_DIR)
+    args = parser.parse_args()
+
+    if args.export:
+        export(args.output)
+    else:
+        classifier = TransformerClassifier.load()
+        print(classifier.runtime, classifier.to_results(classifier.predict_proba(
+            ["you are a disgusting idiot and should die", "see you at lunch"]
+        )))